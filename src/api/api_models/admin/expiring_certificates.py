@@ -0,0 +1,25 @@
+from typing import List, Optional
+from src.api.api_models.bases import BaseOutput, BaseModel
+from src.api.api_models.pagination import PaginationOutput
+
+
+class ExpiringCertificate(BaseModel):
+    certificateNumber: str
+    certificateName: str
+    expirationDate: str
+    daysLeft: int
+    userId: str
+    firstName: Optional[str]
+    lastName: Optional[str]
+    email: Optional[str]
+    phoneNumber: Optional[str]
+    notifiedWindows: List[int]
+
+
+class Payload(BaseModel):
+    certificates: List[ExpiringCertificate]
+    pagination: PaginationOutput
+
+
+class Output(BaseOutput):
+    payload: Optional[Payload]
@@ -12,3 +12,4 @@ class Input(BaseInput):
     certificateName: Optional[str] = None
     userIds: List[str]
     expirationDate: Optional[str] = None
+    render: Optional[bool] = False
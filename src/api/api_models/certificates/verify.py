@@ -0,0 +1,18 @@
+from typing import Optional
+from src.api.api_models.bases import BaseOutput, BaseModel
+
+
+class Verification(BaseModel):
+    certificateNumber: str
+    certificateName: str
+    holder: str
+    completionDate: Optional[str]
+    expirationDate: Optional[str]
+    valid: bool
+    status: str
+    issuer: Optional[str]
+    verifyUrl: str
+
+
+class Output(BaseOutput):
+    payload: Optional[Verification]
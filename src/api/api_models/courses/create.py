@@ -63,6 +63,8 @@ class Series(BaseModel):
     firstClassDtm: str
     classesInSeries: int
     classFrequency: ClassFrequency
+    exclusions: Optional[List[str]] = None
+    skipHolidays: bool = False
 
 
 class Content(BaseModel):
@@ -12,9 +12,15 @@ class Event(BaseModel):
     complete: bool
 
 
+class PeriodCount(BaseModel):
+    period: str
+    classes: int
+
+
 class SchedulePayload(BaseOutput):
     schedule: List[Optional[Event]]
     pagination: Optional[pagination.PaginationOutput]
+    counts: Optional[List[PeriodCount]]
 
 
 class Output(BaseOutput):
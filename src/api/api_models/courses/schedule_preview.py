@@ -0,0 +1,22 @@
+from typing import List, Optional
+from src.api.api_models.bases import BaseOutput, BaseInput, BaseModel
+from src.api.api_models.courses.create import Series
+
+
+class Input(BaseInput):
+    series: Series
+    duration: int = 60
+
+
+class ScheduledClass(BaseModel):
+    seriesNumber: int
+    startTime: str
+    endTime: str
+
+
+class Payload(BaseModel):
+    schedule: List[ScheduledClass]
+
+
+class Output(BaseOutput):
+    payload: Optional[Payload]
@@ -14,9 +14,24 @@ class Schedule(BaseModel):
     courseId: str
 
 
+class Session(BaseModel):
+    courseId: str
+    courseName: str
+    seriesNumber: int
+    startTime: str
+    endTime: str
+
+
+class Conflict(BaseModel):
+    first: Session
+    second: Session
+
+
 class Payload(BaseModel):
-    schedule: List[Optional[Schedule]]
+    schedule: Optional[List[Optional[Schedule]]]
     pagination: Optional[pagination.PaginationOutput]
+    courses: Optional[List[Session]]
+    conflicts: Optional[List[Conflict]]
 
 
 class Output(BaseOutput):
@@ -9,3 +9,4 @@ class Output(BaseOutput):
 class Input(BaseInput):
     courseName: Optional[str] = None
     courseBundle: Optional[str] = None
+    query: Optional[str] = None
@@ -0,0 +1,30 @@
+from typing import List, Optional
+from src.api.api_models.bases import BaseOutput, BaseModel
+
+
+class ChoiceStats(BaseModel):
+    choicePosition: int
+    count: int
+    percent: float
+
+
+class QuestionStats(BaseModel):
+    questionId: str
+    answered: int
+    correct: Optional[int]
+    correctRate: Optional[float]
+    choices: List[ChoiceStats]
+
+
+class FormStats(BaseModel):
+    formId: str
+    formType: str
+    submissions: int
+    passed: Optional[int]
+    passRate: Optional[float]
+    averageScore: Optional[float]
+    questions: List[QuestionStats]
+
+
+class Output(BaseOutput):
+    payload: Optional[FormStats]
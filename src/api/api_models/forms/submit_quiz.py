@@ -18,7 +18,7 @@ class Answer(BaseModel):
 class Questions(BaseModel):
     questionId: str
     questionNumber: int
-    description: int
+    description: Optional[str]
     answerType: str
     answer: Optional[Answer]
 
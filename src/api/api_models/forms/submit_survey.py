@@ -15,9 +15,9 @@ class Answer(BaseModel):
 class Questions(BaseModel):
     questionId: str
     questionNumber: int
-    description: int
+    description: Optional[str]
     answerType: str
-    answer: Answer
+    answer: Optional[Answer]
 
 
 class Input(BaseInput):
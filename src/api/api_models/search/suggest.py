@@ -0,0 +1,16 @@
+from typing import List, Optional
+from src.api.api_models.bases import BaseOutput, BaseModel
+
+
+class Suggestion(BaseModel):
+    type: str
+    id: str
+    label: str
+
+
+class Payload(BaseModel):
+    suggestions: List[Suggestion]
+
+
+class Output(BaseOutput):
+    payload: Optional[Payload]
@@ -0,0 +1,9 @@
+from src.api.api_models.bases import BaseOutput, BaseInput
+
+
+class Output(BaseOutput):
+    ...
+
+
+class Input(BaseInput):
+    enabled: bool
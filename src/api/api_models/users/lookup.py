@@ -7,7 +7,8 @@ from src.api.api_models import pagination
 class Input(BaseModel):
     firstName: Optional[str] = None
     lastName: Optional[str] = None
-    _id: Optional[str] = None
+    otherId: Optional[str] = None
+    phoneNumber: Optional[str] = None
 
 
 class User(BaseModel):
@@ -18,6 +19,7 @@ class User(BaseModel):
     email: str
     phoneNumber: str
     headShot: str
+    score: Optional[float]
 
 
 class StudentsPayload(BaseModel):
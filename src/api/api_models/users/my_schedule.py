@@ -17,6 +17,8 @@ class Schedule(BaseModel):
 class SchedulePayload(BaseModel):
     schedule: List[Optional[Schedule]]
     pagination: Optional[pagination.PaginationOutput]
+    nextCursor: Optional[str]
+    hasMore: bool = False
 
 
 class Output(BaseOutput):
@@ -1,14 +1,15 @@
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi import Request
 from fastapi.responses import JSONResponse
-import uvicorn
 import asyncio
+import uvicorn
 
 from src import log
 from src.api import app, APP_VERSION
-from src.api.routers import users, courses, data, forms, admin
+from src.api.routers import users, courses, data, forms, admin, search, certificates
 from src.api.lib.base_responses import successful_response
-from src.modules.training_connect import TrainingConnect
+from src.database.mongo import mongo_client, MONGO_INDEXES
+from src.modules.typeahead import rebuild_typeahead
 
 origins = [
     # "http://localhost:port",
@@ -28,18 +29,16 @@ app.include_router(courses.router)
 app.include_router(data.router)
 app.include_router(forms.router)
 app.include_router(admin.router)
-
-
-async def run_training_connect():
-    training_connect_object = TrainingConnect()
-    await training_connect_object.start_system()
+app.include_router(search.router)
+app.include_router(certificates.router)
 
 
 @app.on_event("startup")
 async def startup():
     log.info("Starting the API")
-    # Start the TrainingConnect system in the background
-    asyncio.create_task(run_training_connect())
+    await mongo_client.ensure_indexes(MONGO_INDEXES)
+    # only builds when redis has no typeahead indexes yet, after that they are kept up to date on write
+    asyncio.create_task(rebuild_typeahead())
 
 
 @app.on_event("shutdown")
@@ -75,7 +74,11 @@ async def catch_all(request: Request, path_name: str) -> JSONResponse:
 
 @app.post("/health-status")
 async def health_status():
-    return successful_response()
+    return successful_response(
+        payload={
+            "mongo": mongo_client.metrics()
+        }
+    )
 
 
 if __name__ == '__main__':
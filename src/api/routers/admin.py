@@ -1,5 +1,5 @@
 import datetime
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, BackgroundTasks, Depends
 from passlib.hash import pbkdf2_sha256
 import json
 
@@ -14,7 +14,7 @@ from src.database.sql.user_functions import (
     update_user,
     get_user,
     delete_user_certificates,
-    find_certificate
+    get_expiring_certificates
 )
 from src.database.sql.course_functions import (
     get_course,
@@ -22,12 +22,19 @@ from src.database.sql.course_functions import (
 )
 from src.database.sql.audit_log_functions import submit_audit_record
 from src.api.lib.base_responses import successful_response, server_error, user_error
-from src.api.api_models.admin import roles, assign, activate, user_delete_model, delete_certificates, gen_certificate
+from src.api.api_models.admin import (
+    roles,
+    assign,
+    activate,
+    user_delete_model,
+    delete_certificates,
+    gen_certificate,
+    expiring_certificates
+)
 from src.api.api_models.pagination import PaginationOutput
 from src.api.api_models import global_models
 from src.api.api_models.users import update
-from src.utils.certificate_generation import generate_certificate, save_user_certificate
-from src.utils.generate_random_code import generate_random_code
+from src.utils.certificate_generation import issue_certificates, render_certificates
 
 router = APIRouter(
     prefix="/admin",
@@ -101,15 +108,16 @@ async def roles_manage(userId: str, content: assign.Input, user: global_models.U
         )
 
 
-# TODO: needs response model
 @router.post(
     "/users/certificates/generate",
     description="Route to generate a certificate for course",
-    response_model=gen_certificate.Output,
-    dependencies=[Depends(AuthClient(use_auth=True))]
+    response_model=gen_certificate.Output
 )
-async def generate_certificate_route(content: gen_certificate.Input):
-    failed_users = []
+async def generate_certificate_route(
+    content: gen_certificate.Input,
+    background_tasks: BackgroundTasks,
+    user: global_models.User = Depends(AuthClient(use_auth=True))
+):
     try:
         if not content.courseId and not content.certificateName:
             return user_error(message="Either courseId or certificateName must be provided")
@@ -122,69 +130,58 @@ async def generate_certificate_route(content: gen_certificate.Input):
             if not course[0]:
                 return user_error(message="Course does not exist")
 
-        if content.courseId:
             certificate = await get_course_certificate(course_id=content.courseId)
+            issued, failed_users = await issue_certificates(
+                content.userIds,
+                course=course[0],
+                certificate=certificate
+            )
+        else:
+            expiration_date = None
+            if content.expirationDate:
+                try:
+                    expiration_date = datetime.datetime.strptime(
+                        content.expirationDate, "%m/%d/%Y")
+                except Exception:
+                    return user_error(message=f"Invalid date format {content.expirationDate} must be mm/dd/yyyy")
+
+            issued, failed_users = await issue_certificates(
+                content.userIds,
+                certificate_name=content.certificateName,
+                expiration_date=expiration_date
+            )
 
-        for user_id in content.userIds:
-            user = await get_user(user_id=user_id)
-            if not user:
-                failed_users.append(
-                    f"User not found for user id {user_id}"
-                )
+        if issued is None:
+            return server_error(
+                message="Failed to generate certificates"
+            )
 
-            # TODO: check if user already has a certificate for this course
-            if content.courseId:
-                found = await find_certificate(user_id=user_id, course_id=content.courseId)
-                if found:
-                    failed_users.append(
-                        f"User {user.firstName} {user.lastName} already has a certificate for {course[0]['courseName']}"
-                    )
-                    continue
-
-                cert = await generate_certificate(user=user, course=course[0], certificate=certificate)
-                if not cert:
-                    failed_users.append(
-                        f"Failed to generate certificate for user {user.firstName} {user.lastName}"
-                    )
-                    continue
-            else:
-                expiration_date = None
-                if content.expirationDate:
-                    try:
-                        expiration_date = datetime.datetime.strptime(
-                            content.expirationDate, "%m/%d/%Y")
-                    except Exception:
-                        failed_users.append(
-                            f"Invalid date format {content.expirationDate} must be mm/dd/yyyy"
-                        )
-                        continue
-
-                found = await find_certificate(user_id=user_id, certificate_name=content.certificateName)
-                if found:
-                    failed_users.append(
-                        f"User {user.firstName} {user.lastName} already has a certificate for {content.certificateName}"
-                    )
-                    continue
-                await save_user_certificate(
-                    certificate_number=generate_random_code(15),
-                    completion_date=datetime.datetime.utcnow(),
-                    user=user,
-                    expiration_date=expiration_date,
-                    certificate_name=content.certificateName
-                )
+        if issued and content.render:
+            background_tasks.add_task(render_certificates, issued)
+
+        if issued:
+            await submit_audit_record(
+                route="admin/users/certificates/generate",
+                details=(f"User {user.firstName} {user.lastName} generated certificate" +
+                         f" for users {', '.join(c['userId'] for c in issued)}" +
+                         f" for {f'course {content.courseId}' if content.courseId else content.certificateName}"),
+                user_id=user.userId
+            )
 
+        certificates = [
+            {
+                "userId": c["userId"],
+                "certificateNumber": c["certificateNumber"]
+            }
+            for c in issued
+        ]
         if not failed_users:
-            return successful_response()
+            return successful_response(payload={"certificates": certificates})
 
-        await submit_audit_record(
-            route="users/update/userId",
-            details=(f"User {user.firstName} {user.lastName} generated certificate" +
-                     f" for users {', '.join(content.userIds)} for course {content.courseId}"),
-            user_id=user.userId
-        )
         return successful_response(
             success=False,
             payload={
+                "certificates": certificates,
                 "students": failed_users
             }
         )
@@ -221,6 +218,58 @@ async def delete_certificate_route(content: delete_certificates.Input, user: glo
         return server_error(message="Failed to delete user certificates")
 
 
+@router.get(
+    "/certificates/expiring",
+    description="Route to list certificates expiring in the next given days, soonest first",
+    response_model=expiring_certificates.Output,
+    dependencies=[Depends(AuthClient(use_auth=True))]
+)
+async def expiring_certificates_route(days: int = 90, page: int = None, pageSize: int = None):
+    if days <= 0:
+        return user_error(message="Days must be greater than 0")
+    if isinstance(page, int) and page <= 0:
+        page = 1
+    try:
+        now = datetime.datetime.utcnow()
+        certificates, total_pages = await get_expiring_certificates(
+            now,
+            now + datetime.timedelta(days=days),
+            page=page,
+            pageSize=pageSize
+        )
+
+        pagination = PaginationOutput(
+            curPage=page,
+            totalPages=total_pages,
+            pageSize=pageSize
+        )
+        return successful_response(
+            payload={
+                "certificates": [
+                    {
+                        "certificateNumber": certificate["certificateNumber"],
+                        "certificateName": certificate["certificateName"],
+                        "expirationDate": certificate["expirationDate"].strftime("%m/%d/%Y %-I:%M %p"),
+                        "daysLeft": (certificate["expirationDate"] - now).days,
+                        "userId": certificate["userId"],
+                        "firstName": certificate["firstName"],
+                        "lastName": certificate["lastName"],
+                        "email": certificate["email"],
+                        "phoneNumber": certificate["phoneNumber"],
+                        "notifiedWindows": certificate["notifiedWindows"]
+                    }
+                    for certificate in certificates
+                ],
+                "pagination": pagination.dict()
+            }
+        )
+    except Exception:
+        log.exception("Failed to get expiring certificates")
+        return server_error(
+            message="Failed to get expiring certificates"
+        )
+
+
 @router.post(
     "/users/delete/{userId}",
     description="Route to delete users from system",
@@ -228,8 +277,8 @@ async def delete_certificate_route(content: delete_certificates.Input, user: glo
 )
 async def delete_user_route(userId: str, user: global_models.User = Depends(AuthClient(use_auth=True))):
     try:
-        failed_deletes = await delete_users(user_ids=[userId])
-        if failed_deletes:
+        failed_deletes, err = await delete_users(user_ids=[userId])
+        if failed_deletes or err:
             return server_error(
                 message="Failed to delete user"
             )
@@ -0,0 +1,41 @@
+import os
+from fastapi import APIRouter, Request
+
+from src import log
+from src.api.lib.base_responses import successful_response, server_error, user_error
+from src.api.api_models.certificates import verify
+from src.modules.certificate_verification import verify_certificate
+from src.utils.rate_limit import client_address, is_rate_limited
+
+VERIFY_RATE = int(os.getenv("CERTIFICATE_VERIFY_RATE", 60))
+
+router = APIRouter(
+    prefix="/certificates",
+    tags=["Certificates"],
+    responses={404: {"description": "Details not found"}}
+)
+
+
+@router.get(
+    "/verify/{certificateNumber}",
+    description="Public route to verify a certificate by its number, e.g. from the qr code printed on it",
+    response_model=verify.Output
+)
+async def verify_certificate_route(request: Request, certificateNumber: str):
+    if is_rate_limited("certificate_verify", client_address(request), VERIFY_RATE):
+        return user_error(status_code=429, message="Too many verification requests, try again in a minute")
+
+    try:
+        verification = await verify_certificate(certificateNumber)
+        if not verification:
+            return user_error(status_code=404, message="Certificate does not exist")
+
+        response = successful_response(payload=verification)
+        response.headers["Cache-Control"] = "public, max-age=60"
+        return response
+
+    except Exception:
+        log.exception(f"Failed to verify certificate {certificateNumber}")
+        return server_error(
+            message="Failed to verify certificate"
+        )
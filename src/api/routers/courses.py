@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, UploadFile, File
+from fastapi import APIRouter, Depends, UploadFile, File, Query
 from fastapi.responses import FileResponse, Response
 import os
 import uuid
@@ -6,6 +6,8 @@ import datetime
 from typing import List, Union, Optional
 from io import BytesIO
 import json
+import pytz
+import dateutil.parser
 
 from src import log, img_handler
 from src.api.lib.auth.auth import AuthClient
@@ -21,17 +23,21 @@ from src.database.sql.course_functions import (
     create_bundle,
     get_bundle,
     get_total_course_schedule,
+    get_schedule_counts,
     update_course,
     update_bundle,
     get_content,
     find_class_time,
     update_schedule,
+    get_course_sessions,
+    session_output,
+    find_instructor_conflicts,
     check_course_registration,
     check_bundle_registration,
     validate_prerequisites,
     update_enrollment,
     unenroll_user,
-    assign_bundle,
+    bulk_enroll,
     set_course_picture,
     upload_course_content,
     publish_content,
@@ -66,6 +72,7 @@ from src.api.api_models.courses import (
     content_list,
     schedule_verify,
     schedule_update,
+    schedule_preview,
     list_all,
     enroll_update,
     unenroll_course,
@@ -81,7 +88,7 @@ from src.api.api_models.courses import (
 from src.modules.create_frequency import create_frequency
 from src.modules.create_schedule import create_schedule
 from src.modules.save_content import save_content
-from src.utils.check_overlap import check_overlap
+from src.utils.check_overlap import find_overlaps
 from src.modules.notifications import (
     instructor_enroll_notification,
     student_enroll_notification,
@@ -141,7 +148,13 @@ async def course_search(content: search.Input, page: int = None, pageSize: int =
     if isinstance(page, int) and page <= 0:
         page = 1
     try:
-        found, total_pages = await search_courses(course_bundle=content.courseBundle, course_name=content.courseName, page=page, pageSize=pageSize)
+        found, total_pages = await search_courses(
+            course_bundle=content.courseBundle,
+            course_name=content.courseName,
+            search_term=content.query,
+            page=page,
+            pageSize=pageSize
+        )
         pg = pagination.PaginationOutput(
             curPage=page,
             totalPages=total_pages,
@@ -150,10 +163,13 @@ async def course_search(content: search.Input, page: int = None, pageSize: int =
         payload = {
             "pagination": pg.dict()
         }
-        if content.courseBundle:
+        if content.query:
+            payload["results"] = found
+
+        elif content.courseBundle:
             payload["bundles"] = found
 
-        if content.courseName:
+        elif content.courseName:
             payload["courses"] = found
         return successful_response(
             payload=payload
@@ -180,6 +196,7 @@ async def course_catalog_search(content: search.Input, page: int = None, pageSiz
         found, total_pages = await search_courses(
             course_bundle=content.courseBundle,
             course_name=content.courseName,
+            search_term=content.query,
             catalog=True, page=page,
             pageSize=pageSize
         )
@@ -191,10 +208,13 @@ async def course_catalog_search(content: search.Input, page: int = None, pageSiz
         payload = {
             "pagination": pg.dict()
         }
-        if content.courseBundle:
+        if content.query:
+            payload["results"] = found
+
+        elif content.courseBundle:
             payload["bundles"] = found
 
-        if content.courseName:
+        elif content.courseName:
             payload["courses"] = found
         return successful_response(
             payload=payload
@@ -218,6 +238,17 @@ async def assign_instructors(
     user: global_models.User = Depends(AuthClient(use_auth=True))
 ):
     try:
+        conflicts = await find_instructor_conflicts(course_id=courseId, instructor_ids=content.instructors)
+        if conflicts is None:
+            return server_error(message="Failed to assign instructors to course")
+
+        if conflicts:
+            return successful_response(
+                success=False,
+                message="Instructors are already teaching at the time of this course",
+                payload={"conflicts": conflicts}
+            )
+
         assigned = await assign_course(course_id=courseId, instructors=content.instructors)
         if not assigned:
             return server_error(message="Failed to assign instructors to course")
@@ -225,10 +256,10 @@ async def assign_instructors(
         instructors = []
         user_ids = []
         for instructor in content.instructors:
-            found_user = await get_user(user_id=instructor.userId)
+            found_user = await get_user(user_id=instructor)
             if found_user:
                 instructors.append(found_user)
-                user_ids.append(instructor.userId)
+                user_ids.append(instructor)
 
         await instructor_enroll_notification(users=instructors, course_id=courseId)
 
@@ -245,6 +276,37 @@ async def assign_instructors(
         )
 
 
+def enrollment_results(results: list, target: str) -> tuple:
+    """Function to split bulk enrollment results into failure messages and the students that were registered
+
+    Args:
+        results (list): results from bulk_enroll
+        target (str): course or bundle, used in the messages
+
+    Returns:
+        tuple: failure messages, registered users and their user ids
+    """
+    failed = []
+    students = []
+    user_ids = []
+    for result in results:
+        found_student = result["user"]
+        if not found_student:
+            failed.append(
+                f" Unable to find student with user_id {result['userId']}")
+            continue
+
+        if not result["registered"]:
+            failed.append(
+                f" {found_student.firstName} {found_student.lastName} is already registered for {target}")
+            continue
+
+        students.append(found_student)
+        user_ids.append(result["userId"])
+
+    return failed, students, user_ids
+
+
 @router.post(
     "/enroll/student/{courseId}",
     description="Route to enroll students in a course",
@@ -256,25 +318,13 @@ async def enroll_students(
     user: global_models.User = Depends(AuthClient(use_auth=True))
 ):
     try:
-        failed = []
-        students = []
-        user_ids = []
-        for student in content.students:
-            found_student = await get_user(student.userId)
-            if not found_student:
-                failed.append(
-                    f" Unable to find student with user_id {student.userId}")
-                continue
-            assigned = await assign_course(course_id=courseId, students=[student])
-            if not assigned:
-                failed.append(
-                    f" Unable to register {found_student.firstName} {found_student.lastName} for course")
-                continue
-
-            students.append(found_student)
-            user_ids.append(student.userId)
+        results = await bulk_enroll(students=content.students, course_id=courseId)
+        if results is None:
+            return server_error(message="Failed to enroll students to course")
 
-        await student_enroll_notification(users=students, course_id=courseId)
+        failed, students, user_ids = enrollment_results(results, "course")
+        if students:
+            await student_enroll_notification(users=students, course_id=courseId)
 
         await submit_audit_record(
             route="courses/enroll/students/courseId",
@@ -342,10 +392,16 @@ async def enroll_bundle_self(
             denialReason=None
         )
 
-        assigned = await assign_bundle(bundle_id=bundleId, students=[student])
-        if not assigned:
+        results = await bulk_enroll(students=[student], bundle_id=bundleId, check_prerequisites=True)
+        if results is None:
             return server_error(message=f"Failed to assign {student.userId} to enroll in bundle")
 
+        if results[0]["missingPrerequisites"]:
+            return user_error(message="Prerequisites for this bundle have not been completed")
+
+        if not results[0]["registered"]:
+            return user_error(message="User already enrolled")
+
         await self_bundle_enroll_notification(users=[user], bundle_id=bundleId)
 
         return successful_response()
@@ -406,10 +462,16 @@ async def enroll_self(
             denialReason=None
         )
 
-        assigned = await assign_course(course_id=courseId, students=[student])
-        if not assigned:
+        results = await bulk_enroll(students=[student], course_id=courseId, check_prerequisites=True)
+        if results is None:
             return server_error(message=f"Failed to assign {student.userId} to enroll in course")
 
+        if results[0]["missingPrerequisites"]:
+            return user_error(message="Prerequisites for this course have not been completed")
+
+        if not results[0]["registered"]:
+            return user_error(message="User already enrolled")
+
         await self_enroll_notification(user=user, course_id=courseId, registration_status=registration_status)
         return successful_response()
     except Exception:
@@ -466,7 +528,7 @@ async def course_delete(
                 os.remove(
                     f'/source/src/content/courses/{course["coursePicture"]}')
 
-            canceled_course_notification(
+            await canceled_course_notification(
                 course=course,
                 students=students,
                 instructors=instructors,
@@ -536,7 +598,7 @@ async def bundle_delete(
                     os.remove(
                         f'/source/src/content/courses/{course["coursePicture"]}')
 
-                canceled_course_notification(
+                await canceled_course_notification(
                     course=course,
                     students=students,
                     instructors=instructors,
@@ -616,12 +678,20 @@ async def course_create(content: create.Input, user: global_models.User = Depend
             message="unable to build frequency"
         )
 
-    schedule = create_schedule(
-        frequency=frequency,
-        first_class_dtm=content.series.firstClassDtm,
-        classes_in_series=content.series.classesInSeries,
-        class_duration=content.general.duration
-    )
+    try:
+        schedule = create_schedule(
+            frequency=frequency,
+            first_class_dtm=content.series.firstClassDtm,
+            classes_in_series=content.series.classesInSeries,
+            class_duration=content.general.duration,
+            exclusions=content.series.exclusions,
+            skip_holidays=content.series.skipHolidays
+        )
+    except (KeyError, ValueError):
+        log.exception("Invalid schedule")
+        return user_error(
+            message="Invalid class frequency"
+        )
     if not schedule:
         log.exception("Failed to build schedule")
         return server_error(
@@ -847,27 +917,103 @@ async def load_bundle_route(bundleId: str = None, user: global_models.User = Dep
     response_model=schedule_list.Output,
     dependencies=[Depends(AuthClient(use_auth=True))]
 )
-async def complete_schedule(page: int = None, pageSize: int = None):
+async def complete_schedule(
+    page: int = None,
+    pageSize: int = None,
+    start: Optional[str] = Query(None, alias="from"),
+    end: Optional[str] = Query(None, alias="to"),
+    groupBy: Optional[str] = None
+):
     if isinstance(page, int) and page <= 0:
         page = 1
     try:
-        schedule, total_pages = await get_total_course_schedule(page=page, pageSize=pageSize)
+        tz_in = pytz.timezone('America/New_York')
+        try:
+            # times without a timezone are taken as the time the classes are held in
+            start_date, end_date = [
+                tz_in.localize(dtm) if dtm and not dtm.tzinfo else dtm
+                for dtm in [dateutil.parser.isoparse(value) if value else None for value in [start, end]]
+            ]
+        except ValueError:
+            return user_error(message="from and to must be ISO 8601 dates")
+
+        if groupBy and groupBy not in ["day", "week"]:
+            return user_error(message="groupBy must be day or week")
+
+        schedule, total_pages = await get_total_course_schedule(
+            start_date=start_date,
+            end_date=end_date,
+            page=page,
+            pageSize=pageSize
+        )
         pg = pagination.PaginationOutput(
             curPage=page,
             totalPages=total_pages,
             pageSize=pageSize
         )
+        payload = {
+            "schedule": schedule,
+            "pagination": pg.dict()
+        }
+
+        if groupBy:
+            counts = await get_schedule_counts(start_date=start_date, end_date=end_date, group_by=groupBy)
+            if counts is None:
+                return server_error(message="Failed to count schedule")
+            payload["counts"] = counts
+
+        return successful_response(payload=payload)
+
+    except Exception:
+        log.exception("Failed to fetch complete schedule")
+        return server_error(
+            message="Failed to fetch complete schedule"
+        )
+
+
+@router.post(
+    "/schedule/preview",
+    description="Route to preview the classes a series would create",
+    response_model=schedule_preview.Output,
+    dependencies=[Depends(AuthClient(use_auth=True))]
+)
+async def schedule_preview_route(content: schedule_preview.Input):
+    try:
+        frequency = create_frequency(content=content.series)
+        if not frequency:
+            return user_error(message="Invalid class frequency")
+
+        schedule = create_schedule(
+            frequency=frequency,
+            first_class_dtm=content.series.firstClassDtm,
+            classes_in_series=content.series.classesInSeries,
+            class_duration=content.duration,
+            exclusions=content.series.exclusions,
+            skip_holidays=content.series.skipHolidays
+        )
+        if not schedule:
+            return user_error(message="Series does not have any classes")
+
+        tz_out = pytz.timezone('America/New_York')
         return successful_response(
             payload={
-                "schedule": schedule,
-                "pagination": pg.dict()
+                "schedule": [
+                    {
+                        "seriesNumber": idx + 1,
+                        "startTime": start.astimezone(tz_out).strftime("%m/%d/%Y %-I:%M %p"),
+                        "endTime": end.astimezone(tz_out).strftime("%m/%d/%Y %-I:%M %p")
+                    }
+                    for idx, (start, end) in enumerate(schedule)
+                ]
             }
         )
-
+    except (KeyError, ValueError):
+        log.exception("Invalid schedule")
+        return user_error(message="Invalid class frequency")
     except Exception:
-        log.exception("Failed to fetch complete schedule")
+        log.exception("Failed to preview schedule")
         return server_error(
-            message="Failed to fetch complete schedule"
+            message="Failed to preview schedule"
         )
 
 
@@ -879,33 +1025,30 @@ async def complete_schedule(page: int = None, pageSize: int = None):
 )
 async def schedule_verify_route(content: schedule_verify.Input):
     try:
-        scheduled_times = []
+        sessions = await get_course_sessions(course_ids=content.courseIds)
+        if sessions is None:
+            return server_error(message="Failed to verify course schedules")
 
-        for id in content.courseIds:
-            course = await get_course(course_id=id)
-            if not course[0] or not course[0].get("courseName"):
-                return user_error(message="A course does not exist with one of the ID's provided.")
-
-            schedule = course[1]
-            course_sched = {
-                "startTime": schedule[0]["startTime"],
-                "endTime": schedule[0]["endTime"],
-                "courseName": course[0]["courseName"],
-                "courseId": course[0]["courseId"]
-            }
-            scheduled_times.append(course_sched)
+        if set(content.courseIds) - {session["courseId"] for session in sessions}:
+            return user_error(message="A course does not exist with one of the ID's provided.")
 
         overlapping = []
-        for schedule1 in scheduled_times:
-            for schedule2 in scheduled_times:
-                if schedule1 != schedule2 and check_overlap(schedule1, schedule2):
-                    overlapping.append(schedule1)
+        conflicts = []
+        for first, second in find_overlaps(sessions):
+            if first["courseId"] == second["courseId"]:
+                continue
+            conflict = {"first": session_output(first), "second": session_output(second)}
+            conflicts.append(conflict)
+            for session in conflict.values():
+                if session not in overlapping:
+                    overlapping.append(session)
 
         if overlapping:
             return successful_response(
                 success=False,
                 payload={
-                    "courses": overlapping
+                    "courses": overlapping,
+                    "conflicts": conflicts
                 }
             )
 
@@ -1172,7 +1315,7 @@ async def enroll_update_route(
             return server_error(message="Could not update users enrollment")
 
         if content.registrationStatus:
-            enrollment_update_notification(
+            await enrollment_update_notification(
                 user=user,
                 course=course[0],
                 new_status=content.registrationStatus
@@ -1225,7 +1368,7 @@ async def enroll_bundle_update_route(
                 return server_error(message="Could not update users enrollment")
 
         if content.registrationStatus:
-            enrollment_update_notification(
+            await enrollment_update_notification(
                 user=user,
                 bundle=bundle[0],
                 new_status=content.registrationStatus
@@ -1271,6 +1414,17 @@ async def schedule_update_route(content: schedule_update.Input, user: global_mod
             "start_dtm": start_dtm,
             "end_dtm": end_dtm
         }
+        conflicts = await find_instructor_conflicts(course_id=content.courseId, new_class=new_class)
+        if conflicts is None:
+            return server_error(message="Failed to update scheduled class")
+
+        if conflicts:
+            return successful_response(
+                success=False,
+                message="Instructors are already teaching at the new time of this class",
+                payload={"conflicts": conflicts}
+            )
+
         updated = await update_schedule(new_class=new_class)
         if not updated:
             return server_error(message="Failed to update scheduled class")
@@ -1285,7 +1439,7 @@ async def schedule_update_route(content: schedule_update.Input, user: global_mod
 
         course = await get_course(course_id=content.courseId)
         course = course[0]
-        scheduled_class_update_notifcation(
+        await scheduled_class_update_notifcation(
             users=users, new_class=new_class, original_class=found_class, course=course)
 
         await submit_audit_record(
@@ -1322,7 +1476,7 @@ async def unenroll_course_route(courseId: str, userId: str, executer: global_mod
         if not unenrolled:
             return server_error(message="Failed to unenroll user from course")
 
-        remove_enrollment_update_notification(user=user, course=course[0])
+        await remove_enrollment_update_notification(user=user, course=course[0])
         await submit_audit_record(
             route="courses/unenroll/courseId/userId",
             details=f"User {executer.firstName} {executer.lastName} unenrolled user {userId} from course {courseId}",
@@ -1357,7 +1511,7 @@ async def unenroll_bundle_route(bundleId: str, userId: str, executer: global_mod
         if not unenrolled:
             return server_error(message="Failed to unenroll user from bundle")
 
-        remove_enrollment_update_notification(user=user, bundle=bundle[0])
+        await remove_enrollment_update_notification(user=user, bundle=bundle[0])
         await submit_audit_record(
             route="courses/bundle/unenroll/courseId/userId",
             details=f"User {executer.firstName} {executer.lastName} unenrolled user {userId} from bundle {bundleId}",
@@ -1378,29 +1532,16 @@ async def unenroll_bundle_route(bundleId: str, userId: str, executer: global_mod
 )
 async def enroll_bundle_students(bundleId: str, content: enroll.StudentBundleInput, user: global_models.User = Depends(AuthClient(use_auth=True))):
     try:
-        failed = []
-        students = []
-        user_ids = []
-        for student in content.students:
-            found_student = await get_user(student.userId)
-            if not found_student:
-                failed.append(
-                    f" Unable to find student with user_id {student.userId}")
-                continue
-
-            assigned = await assign_bundle(bundle_id=bundleId, students=content.students)
-            if not assigned:
-                failed.append(
-                    f" Unable to register {found_student.firstName} {found_student.lastName} for bundle")
-                continue
+        results = await bulk_enroll(students=content.students, bundle_id=bundleId)
+        if results is None:
+            return server_error(message="Failed to enroll students to bundle")
 
-            students.append(found_student)
-            user_ids.append(student.userId)
-
-        await student_bundle_enroll_notification(users=students, bundle_id=bundleId)
+        failed, students, user_ids = enrollment_results(results, "bundle")
+        if students:
+            await student_bundle_enroll_notification(users=students, bundle_id=bundleId)
         await submit_audit_record(
             route="courses/bundle/enroll/student/bundleId",
-            details=f"User {user.firstName} {user.lastName} enrolled users {', '.join(content.students)} to bundle {bundleId}",
+            details=f"User {user.firstName} {user.lastName} enrolled users {', '.join(user_ids)} to bundle {bundleId}",
             user_id=user.userId
         )
 
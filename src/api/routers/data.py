@@ -4,14 +4,12 @@ import pandas as pd
 from passlib.hash import pbkdf2_sha256
 import numpy as np
 import uuid
-import json
 from io import BytesIO
 from datetime import datetime
 import os
 from zipfile import ZipFile
 from typing import List, Tuple
 
-from src import redis_client
 from src import log
 from src.api.lib.auth.auth import AuthClient
 from src.api.api_models import global_models
@@ -27,6 +25,7 @@ from src.api.lib.base_responses import server_error, user_error, successful_resp
 from src.utils.generate_random_code import generate_random_code
 from src.utils.certificate_generation import generate_certificate_func
 from src.api.api_models.users import lookup
+from src.modules.training_connect_queue import enqueue_upload, backlog
 
 router = APIRouter(
     prefix="/data",
@@ -61,12 +60,6 @@ async def export_role_route(roleName: str, content: export_users.Input, user: gl
         return server_error(message=f"Failed to generate {roleName} export")
 
 
-# Function to serialize datetime objects to strings
-def datetime_serializer(o):
-    if isinstance(o, datetime):
-        return o.__str__()
-
-
 @router.post(
     "/import/certificates",
     description="Route to import excel file certs to system",
@@ -118,23 +111,12 @@ async def import_certificates(file: UploadFile = File(None), user: global_models
                 message=f"Missing values in required columns: {', '.join(missing_values)}"
             )
 
-        # Prepare data for upload
-        max_length = len(json_data)
-        for idx, u in enumerate(json_data):
-            u['upload_info'] = {
-                "uploader": user.email,
-                "position": idx + 1,
-                "max": max_length,
-                "file_name": file.filename,
-                "upload_type": "certificate"
-            }
-
         if os.getenv("ENVIRONMENT", "prod").lower() == "prod":
-            json_data = json.dumps(json_data, default=datetime_serializer)
-
-            published = redis_client.publish(
-                os.getenv("TRAINING_CONNECT_QUEUE", 'training_connect_queue'),
-                json_data
+            published = enqueue_upload(
+                rows=json_data,
+                uploader=user.email,
+                file_name=file.filename,
+                upload_type="certificate"
             )
             if not published:
                 raise Exception("Failed to post data to redis")
@@ -155,6 +137,23 @@ async def import_certificates(file: UploadFile = File(None), user: global_models
         )
 
 
+@router.get(
+    "/import/status",
+    description="Route to get the training connect upload backlog",
+    dependencies=[Depends(AuthClient(use_auth=True))]
+)
+async def import_status():
+    try:
+        return successful_response(
+            payload=backlog()
+        )
+    except Exception:
+        log.exception("Failed to get training connect backlog")
+        return server_error(
+            message="Failed to get import status"
+        )
+
+
 @router.post(
     "/download/certificates",
     description="Route to import excel file certs to get an output of certificates",
@@ -510,7 +509,7 @@ async def __create_courses(courses: List[import_courses.Course], user: global_mo
                     firstName=instructor_name[0],
                     lastName=instructor_name[1]
                 )
-                found_instructors, _ = await get_user_type(user=to_lookup, roleName="instructor")
+                found_instructors, _ = await get_user_type(user=to_lookup, roleName="instructor", fuzzy=False)
                 if found_instructors:
                     instructors.append(found_instructors[0]["userId"])
         if not instructors:
@@ -995,12 +994,10 @@ async def import_students_route(file: UploadFile = File(None), user: global_mode
 )
 async def import_students_upload(content: import_students.Input, user: global_models.User = Depends(AuthClient(use_auth=True))):
     try:
-        # Prepare data for upload
-        max_length = len(content.students)
         failed_upload = []
 
         converted_students = []
-        for idx, student in enumerate(content.students):
+        for student in content.students:
             student_copy = camel_to_snake(student.dict())
             student_copy["apt_suite"] = str(student_copy.get(
                 "apt_suite")) if student_copy.get("apt_suite") else None
@@ -1016,23 +1013,14 @@ async def import_students_upload(content: import_students.Input, user: global_mo
                 })
                 continue
 
-            student_copy["upload_info"] = {
-                "uploader": user.email,
-                "position": idx + 1,
-                "max": max_length,
-                "upload_type": "student",
-                "file_name": content.fileName
-            }
-
             converted_students.append(student_copy)
 
-        if os.getenv("ENVIRONMENT", "prod").lower() == "prod":
-            converted_students = json.dumps(
-                converted_students, default=datetime_serializer)
-
-            published = redis_client.publish(
-                os.getenv("TRAINING_CONNECT_QUEUE", 'training_connect_queue'),
-                converted_students
+        if os.getenv("ENVIRONMENT", "prod").lower() == "prod" and converted_students:
+            published = enqueue_upload(
+                rows=converted_students,
+                uploader=user.email,
+                file_name=content.fileName,
+                upload_type="student"
             )
             if not published:
                 raise Exception("Failed to post data to redis")
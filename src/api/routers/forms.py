@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, BackgroundTasks, Depends
 import json
 
 from src import log
@@ -15,7 +15,8 @@ from src.api.api_models.forms import (
     quiz_load,
     survey_load,
     submit_quiz,
-    submit_survey
+    submit_survey,
+    form_stats
 )
 from src.database.sql.audit_log_functions import submit_audit_record
 from src.database.sql.form_functions import (
@@ -28,6 +29,8 @@ from src.database.sql.form_functions import (
 )
 from src.database.sql.user_functions import get_user_roles
 from src.database.mongo.mongo_functions import save_quiz_submission, save_survey_submission, get_form_from_mongo, update_survey_func, update_quiz_func
+from src.modules.quiz_grader import get_answer_key, grade_submission, regrade_submissions
+from src.modules.form_analytics import get_form_stats, backfill_form_stats
 
 
 router = APIRouter(
@@ -149,7 +152,11 @@ async def create_quiz_route(content: create_quiz.Input, user: global_models.User
     description="Route to update a quiz",
     response_model=update_quiz.Output
 )
-async def update_quiz_route(content: update_quiz.Input, user: global_models.User = Depends(AuthClient(use_auth=True))):
+async def update_quiz_route(
+    content: update_quiz.Input,
+    background_tasks: BackgroundTasks,
+    user: global_models.User = Depends(AuthClient(use_auth=True))
+):
     try:
         if not content.formId:
             return user_error(message="Quiz ID must be provided.")
@@ -162,11 +169,17 @@ async def update_quiz_route(content: update_quiz.Input, user: global_models.User
         if not form:
             return user_error(message="Form does not exist with this ID.")
 
+        old_key = await get_answer_key(content.formId)
         updatedQuiz = await update_quiz_func(content.formId, content, user_id=user.userId)
 
         if not updatedQuiz:
             return user_error(message="Quiz could not be updated")
 
+        # only re-grade past attempts when the grading actually changed
+        new_key = await get_answer_key(content.formId)
+        if old_key and new_key and old_key != new_key:
+            background_tasks.add_task(regrade_submissions, content.formId)
+
         await submit_audit_record(
             route="forms/quiz/update",
             details=f"User {user.firstName} {user.lastName} updated quiz {content.formId} with values {json.dumps(content.dict())}",
@@ -316,7 +329,7 @@ async def list_survey_route(page: int = None, pageSize: int = None):
 async def submit_quiz_route(courseId: str, quizId: str, content: submit_quiz.Input, user: global_models.User = Depends(AuthClient(use_auth=True))):
     try:
         # check to see if quiz is related to course and get all users quiz attempts
-        related, enrolled, user_attempts = await is_form_related(course_id=courseId, quiz_id=quizId, user_id=user.userId)
+        related, enrolled, user_attempts = await is_form_related(course_id=courseId, form_id=quizId, user_id=user.userId)
         # if not/nothing return error
         if not related:
             return user_error(
@@ -327,45 +340,25 @@ async def submit_quiz_route(courseId: str, quizId: str, content: submit_quiz.Inp
             return user_error(
                 message="User is not enrolled in course"
             )
-        # get quiz
-        quiz = await get_form_from_mongo("quiz", quizId)
-        if not quiz:
+        user_attempts = user_attempts or 0
+        # get compiled answer key of the quiz, only for quizzes that still exist
+        answer_key = await get_answer_key(quizId) if await get_form("quiz", quizId) else None
+        if not answer_key:
             return server_error(
                 message="failed to get quiz"
             )
 
         # check user attempts of quiz
         # if passed total amount return error
-        if quiz["attempts"] <= user_attempts:
+        if answer_key["attempts"] <= user_attempts:
             return user_error(
                 message="User has already exceeded max attempts"
             )
 
         # grade quiz
-        earned_points = 0
-        passing_score = quiz["passingPoints"]
-        possible_score = 0
+        passing_score = answer_key["passingPoints"]
         content = content.dict()
-        for submitted_question in content:
-            submitted_question["questionId"]
-            for question in quiz["questions"]:
-                if not question["questionId"] == submitted_question["questionId"] or not question["answerType"] == 'MC':
-                    continue
-                submitted_question["pointValue"] = question["pointValue"]
-                possible_score += question["pointValue"]
-                if not submitted_question.get("answer"):
-                    continue
-
-                for choice in question["choices"]:
-                    if (
-                        not choice["choicePosition"] == submitted_question["answer"]["choicePosition"] or
-                        not choice["description"] == submitted_question["answer"]["description"]
-                    ):
-                        continue
-                    if choice["isCorrect"]:
-                        earned_points += question["pointValue"]
-                        submitted_question.update({"correct": True})
-            quiz["questions"].remove(question)
+        earned_points, possible_score = grade_submission(answer_key, content["questions"])
 
         passing = True if earned_points >= passing_score else False
         # save attempt
@@ -375,7 +368,7 @@ async def submit_quiz_route(courseId: str, quizId: str, content: submit_quiz.Inp
             user_id=user.userId,
             passing=passing,
             score=earned_points,
-            possible_points=possible_score,
+            possible_score=possible_score,
             attempts=user_attempts
         )
         if not response_id:
@@ -398,9 +391,9 @@ async def submit_quiz_route(courseId: str, quizId: str, content: submit_quiz.Inp
         return successful_response(
             payload={
                 "passing": passing,
-                "retake": True if user_attempts + 1 < quiz["attempts"] else None,
-                "score": f"{((earned_points/passing_score)*100)}%",
-                "neededScore": f"{passing_score}%"
+                "retake": user_attempts + 1 < answer_key["attempts"],
+                "score": f"{round((earned_points / possible_score) * 100, 2) if possible_score else 0}%",
+                "neededScore": f"{round((passing_score / possible_score) * 100, 2) if possible_score else 0}%"
             }
         )
 
@@ -413,7 +406,7 @@ async def submit_quiz_route(courseId: str, quizId: str, content: submit_quiz.Inp
 
 # TODO: this needs to be tested
 @router.get(
-    "/survey/submit/{courseId}/{quizId}",
+    "/survey/submit/{courseId}/{surveyId}",
     description="Route to submit survey attempt",
     response_model=submit_survey.Output
 )
@@ -425,7 +418,7 @@ async def submit_survey_route(
 ):
     try:
         # check to see if quiz is related to course and get all users quiz attempts
-        related, enrolled, _ = await is_form_related(course_id=courseId, survey_id=surveyId, user_id=user.userId)
+        related, enrolled, _ = await is_form_related(course_id=courseId, form_id=surveyId, user_id=user.userId)
         # if not/nothing return error
         if not related:
             return user_error(
@@ -438,7 +431,7 @@ async def submit_survey_route(
             )
 
         response_id = await save_survey_submission(
-            content=content,
+            content=content.dict(),
             form_id=surveyId,
             user_id=user.userId
         )
@@ -492,3 +485,60 @@ async def list_course_forms_route(courseId: str, page: int = None, pageSize: int
         return server_error(
             message="Failed to get forms"
         )
+
+
+async def can_view_stats(user_id: str) -> bool:
+    roles = await get_user_roles(user_id=user_id)
+    return any(role["roleName"] in ["instructor", "admin", "superuser"] for role in roles)
+
+
+@router.get(
+    "/{formId}/stats",
+    description="Route to get the pass rate, per question difficulty and answer distribution of a form",
+    response_model=form_stats.Output
+)
+async def form_stats_route(formId: str, user: global_models.User = Depends(AuthClient(use_auth=True))):
+    try:
+        if not await can_view_stats(user.userId):
+            return user_error(message="User is not allowed to view form stats")
+
+        stats = await get_form_stats(formId)
+        if not stats:
+            return user_error(message="No submissions found for this form")
+
+        return successful_response(payload=stats)
+    except Exception:
+        log.exception(f"Failed to get stats for form {formId}")
+        return server_error(
+            message="Failed to get form stats"
+        )
+
+
+@router.post(
+    "/{formId}/stats/backfill",
+    description="Route to build the stats of a form that has none yet from its stored submissions",
+    response_model=form_stats.Output
+)
+async def backfill_form_stats_route(formId: str, user: global_models.User = Depends(AuthClient(use_auth=True))):
+    try:
+        if not await can_view_stats(user.userId):
+            return user_error(message="User is not allowed to view form stats")
+
+        form = await get_form(form_type="quiz", form_id=formId) or await get_form(form_type="survey", form_id=formId)
+        if not form:
+            return user_error(message="Form does not exist with this ID.")
+
+        if not await backfill_form_stats(formId, form["formType"]):
+            return server_error(message="Failed to backfill form stats")
+
+        await submit_audit_record(
+            route="forms/formId/stats/backfill",
+            details=f"User {user.firstName} {user.lastName} backfilled stats of form {formId}",
+            user_id=user.userId
+        )
+        return successful_response(payload=await get_form_stats(formId))
+    except Exception:
+        log.exception(f"Failed to backfill stats for form {formId}")
+        return server_error(
+            message="Failed to backfill form stats"
+        )
@@ -0,0 +1,37 @@
+from fastapi import APIRouter, Depends
+
+from src import log
+from src.api.lib.auth.auth import AuthClient
+from src.api.lib.base_responses import successful_response, server_error, user_error
+from src.api.api_models.search import suggest
+from src.modules.typeahead import suggest as get_suggestions, KINDS
+
+MAX_SUGGESTIONS = 50
+
+router = APIRouter(
+    prefix="/search",
+    tags=["Search"],
+    responses={404: {"description": "Details not found"}}
+)
+
+
+@router.get(
+    "/suggest",
+    description="Route to suggest users, courses and bundles whose name or code starts with what has been typed",
+    response_model=suggest.Output,
+    dependencies=[Depends(AuthClient(use_auth=True))]
+)
+async def suggest_route(q: str = "", types: str = None, limit: int = 10):
+    kinds = [kind.strip() for kind in types.split(",") if kind.strip()] if types else KINDS
+    unknown = [kind for kind in kinds if kind not in KINDS]
+    if unknown:
+        return user_error(message=f"Unknown suggestion types {', '.join(unknown)}, expected {', '.join(KINDS)}")
+
+    try:
+        suggestions = get_suggestions(q, kinds=kinds, limit=min(max(limit, 1), MAX_SUGGESTIONS))
+        return successful_response(payload={"suggestions": suggestions})
+    except Exception:
+        log.exception(f"Failed to get suggestions for {q}")
+        return server_error(
+            message="Failed to get suggestions"
+        )
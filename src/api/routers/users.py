@@ -1,5 +1,5 @@
 from passlib.hash import pbkdf2_sha256
-from fastapi import APIRouter, Depends, Request, UploadFile, File, Response, Form
+from fastapi import APIRouter, Depends, Request, UploadFile, File, Response, Form, Query
 from fastapi.responses import FileResponse
 import uuid
 import datetime
@@ -23,7 +23,8 @@ from src.api.api_models.users import (
     upload,
     list_certificates,
     load_certificate,
-    role
+    role,
+    digest
 )
 from src.api.lib.base_responses import successful_response, user_error, server_error
 from src.api.lib.auth.auth import AuthClient
@@ -48,6 +49,9 @@ from src.utils.camelCase import camelCase
 from src.utils.roles import roles as db_roles
 from src.modules.save_content import save_content
 from src.modules.notifications import self_register_notification, user_register_notification, password_reset_notification
+from src.modules.digest import set_digest_preference, get_digest_preference
+from src.modules.certificate_artifacts import ARTIFACT_FORMATS
+from src.utils.certificate_generation import get_certificate_artifact
 
 router = APIRouter(
     prefix="/users",
@@ -505,6 +509,44 @@ async def load_user_certificate_route(userId: str, certificateNumber: str):
         )
 
 
+@router.get(
+    "/certificates/download/{certificateNumber}",
+    description="Route to download a certificate as a png or pdf, rendered once and then served from storage",
+    dependencies=[Depends(AuthClient(use_auth=True))]
+)
+async def download_certificate_route(request: Request, certificateNumber: str, artifactFormat: str = Query("png", alias="format")):
+    if artifactFormat not in ARTIFACT_FORMATS:
+        return user_error(message=f"Format must be one of {', '.join(ARTIFACT_FORMATS)}")
+
+    try:
+        artifact = await get_certificate_artifact(certificateNumber, artifactFormat)
+        if not artifact:
+            return user_error(message="Certificate does not exist")
+
+        path, etag = artifact
+        headers = {
+            "ETag": f'"{etag}"',
+            # clients keep their copy but ask each time, a rename gives the certificate a new etag
+            "Cache-Control": "private, no-cache"
+        }
+        if_none_match = [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]
+        if headers["ETag"] in if_none_match or "*" in if_none_match:
+            return Response(status_code=304, headers=headers)
+
+        return FileResponse(
+            path,
+            media_type=ARTIFACT_FORMATS[artifactFormat],
+            filename=f"{certificateNumber}.{artifactFormat}",
+            headers=headers
+        )
+
+    except Exception:
+        log.exception(f"Failed to download certificate {certificateNumber}")
+        return server_error(
+            message="Failed to download certificate"
+        )
+
+
 @router.get(
     "/certificates/{userId}",
     description="Route to get another users certificates",
@@ -646,6 +688,49 @@ async def update_me_route(content: update.Input, user: global_models.User = Depe
         )
 
 
+@router.get(
+    "/notifications/digest",
+    description="Route to check if the user receives a daily notification digest",
+    response_model=digest.Output
+)
+async def get_digest_route(user: global_models.User = Depends(AuthClient(use_auth=True))):
+    try:
+        return successful_response(
+            payload={
+                "enabled": await get_digest_preference(user.userId)
+            }
+        )
+    except Exception:
+        log.exception(f"Failed to get digest preference for user {user.userId}")
+        return server_error(
+            message="Failed to get digest preference"
+        )
+
+
+@router.post(
+    "/notifications/digest",
+    description="Route to opt in or out of a daily notification digest",
+    response_model=digest.Output
+)
+async def set_digest_route(content: digest.Input, user: global_models.User = Depends(AuthClient(use_auth=True))):
+    try:
+        if not await set_digest_preference(user.userId, content.enabled):
+            return server_error(
+                message="Failed to update digest preference"
+            )
+
+        return successful_response(
+            payload={
+                "enabled": content.enabled
+            }
+        )
+    except Exception:
+        log.exception(f"Failed to set digest preference for user {user.userId}")
+        return server_error(
+            message="Failed to update digest preference"
+        )
+
+
 @router.get(
     "/courses/{userId}",
     description="Route to get a users courses",
@@ -688,11 +773,20 @@ async def courses_by_userid(
     description="Route to get a users course schedule",
     response_model=my_schedule.Output
 )
-async def my_schedule_route(user: global_models.User = Depends(AuthClient(use_auth=True)), page: int = None, pageSize: int = None):
+async def my_schedule_route(
+    user: global_models.User = Depends(AuthClient(use_auth=True)),
+    page: int = None,
+    pageSize: int = None,
+    cursor: str = None
+):
     if isinstance(page, int) and page <= 0:
         page = 1
     try:
-        schedule, total_pages = await get_schedule(user_id=user.userId, page=page, pageSize=pageSize)
+        try:
+            schedule, total_pages, next_cursor = await get_schedule(
+                user_id=user.userId, page=page, pageSize=pageSize, cursor=cursor)
+        except (ValueError, TypeError):
+            return user_error(message="Invalid cursor")
         pg = pagination.PaginationOutput(
             curPage=page,
             totalPages=total_pages,
@@ -702,7 +796,9 @@ async def my_schedule_route(user: global_models.User = Depends(AuthClient(use_au
         return successful_response(
             payload={
                 "schedule": schedule,
-                "pagination": pg.dict()
+                "pagination": pg.dict(),
+                "nextCursor": next_cursor,
+                "hasMore": next_cursor is not None
             }
         )
     except Exception:
@@ -717,11 +813,21 @@ async def my_schedule_route(user: global_models.User = Depends(AuthClient(use_au
     description="Route to get a users course schedule",
     response_model=my_schedule.Output
 )
-async def user_schedule_route(userId: str, user: global_models.User = Depends(AuthClient(use_auth=True)), page: int = None, pageSize: int = None):
+async def user_schedule_route(
+    userId: str,
+    user: global_models.User = Depends(AuthClient(use_auth=True)),
+    page: int = None,
+    pageSize: int = None,
+    cursor: str = None
+):
     if isinstance(page, int) and page <= 0:
         page = 1
     try:
-        schedule, total_pages = await get_schedule(user_id=userId, page=page, pageSize=pageSize)
+        try:
+            schedule, total_pages, next_cursor = await get_schedule(
+                user_id=userId, page=page, pageSize=pageSize, cursor=cursor)
+        except (ValueError, TypeError):
+            return user_error(message="Invalid cursor")
         pg = pagination.PaginationOutput(
             curPage=page,
             totalPages=total_pages,
@@ -730,7 +836,9 @@ async def user_schedule_route(userId: str, user: global_models.User = Depends(Au
         return successful_response(
             payload={
                 "schedule": schedule,
-                "pagination": pg.dict()
+                "pagination": pg.dict(),
+                "nextCursor": next_cursor,
+                "hasMore": next_cursor is not None
             }
         )
     except Exception:
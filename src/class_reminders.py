@@ -8,8 +8,10 @@ from src import log
 from src.database.sql import get_connection, acquire_connection
 from src.utils.mailer import send_email, class_calendar_invite
 from src.modules.notifications import load_template
+from src.modules.digest import queue_digest, flush_digests
 from src.database.sql.user_functions import get_instructors, get_students
 from src.database.sql.course_functions import get_course
+from src.modules.certificate_expiry import scan_expiring_certificates
 
 
 async def complete_previous_classes():
@@ -141,7 +143,7 @@ def build_notification(
     }
 
 
-def send_notifications(
+async def send_notifications(
     sender: str = "rmiller@doitsolutions.io",
     recipients: list = None,
     course_name: str = None,
@@ -173,6 +175,11 @@ def send_notifications(
             remote_link=course["remoteLink"] if course["remoteLink"] else None,
             name=recipient["first_name"]
         )
+        if recipient["email_allowed"] and await queue_digest(
+            recipient["email"], "class_reminder", content["email"], recipient["first_name"]
+        ):
+            continue
+
         if recipient["email_allowed"]:
             while True:
                 sent = send_email(
@@ -225,7 +232,7 @@ async def monitor_courses():
                     course=course
                 )
 
-                send_notifications(
+                await send_notifications(
                     recipients=recipients,
                     course_name=course["courseName"],
                     start_time=start_dtm,
@@ -241,7 +248,7 @@ async def monitor_courses():
                 course = course[0]
 
                 recipients = await build_recipients(course_id=course_id)
-                send_notifications(
+                await send_notifications(
                     recipients=recipients,
                     course_name=course["courseName"],
                     start_time=start_dtm,
@@ -264,7 +271,7 @@ async def monitor_courses():
                     },
                     course=course
                 )
-                send_notifications(
+                await send_notifications(
                     recipients=recipients,
                     course_name=course["courseName"],
                     start_time=start_dtm,
@@ -288,7 +295,7 @@ async def monitor_courses():
                     course=course
                 )
                 recipients = await build_recipients(course_id=course_id)
-                send_notifications(
+                await send_notifications(
                     recipients=recipients,
                     course_name=course["courseName"],
                     start_time=start_dtm,
@@ -309,7 +316,7 @@ async def monitor_courses():
                     day = ', today'
                 else:
                     day = ', tomorrow'
-                send_notifications(
+                await send_notifications(
                     recipients=recipients,
                     course_name=course["courseName"],
                     start_time=start_dtm,
@@ -320,6 +327,12 @@ async def monitor_courses():
 
                 continue
 
+    await scan_expiring_certificates()
+
+    # runs once a day from cron so this is the digest window
+    sent = flush_digests()
+    log.info(f"Sent {sent} notification digests")
+
 
 if __name__ == "__main__":
     asyncio.run(
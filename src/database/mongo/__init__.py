@@ -1,6 +1,22 @@
 import os
 
+from pymongo import ASCENDING, IndexModel
+
 from src.database.mongo.mongo import MongoConnect
 from src import log
 
 mongo_client = MongoConnect(log=log, database=os.getenv("MONGO_DATABASE"))
+
+# forms are looked up by formId, submissions by formId and user and by responseId when re-graded
+SUBMISSION_INDEXES = [
+    IndexModel([("responseId", ASCENDING)], name="responseId", unique=True),
+    IndexModel([("formId", ASCENDING), ("userId", ASCENDING)], name="formId_userId"),
+    IndexModel([("userId", ASCENDING)], name="userId")
+]
+MONGO_INDEXES = {
+    "quiz": [IndexModel([("formId", ASCENDING)], name="formId", unique=True)],
+    "survey": [IndexModel([("formId", ASCENDING)], name="formId", unique=True)],
+    "quiz_submissions": SUBMISSION_INDEXES,
+    "survey_submissions": SUBMISSION_INDEXES,
+    "form_stats": [IndexModel([("formId", ASCENDING)], name="formId", unique=True)]
+}
@@ -1,43 +1,58 @@
-import pymongo
 import os
-from bson.objectid import ObjectId
-import logging
 import time
+import random
+import asyncio
+import logging
+from typing import Union
+from contextlib import asynccontextmanager
+
+import bson
+import pymongo
+from pymongo.errors import BulkWriteError
+from motor.motor_asyncio import AsyncIOMotorClient
+from bson.objectid import ObjectId
+
+DUPLICATE_KEY = 11000
 
 
 class MongoConnect():
     """Class to handle mongo connection"""
 
+    RETRIES = int(os.getenv("MONGO_RETRIES", 5))
+    # base and cap of the backoff between retries in seconds
+    BACKOFF = float(os.getenv("MONGO_BACKOFF", 0.2))
+    BACKOFF_CAP = float(os.getenv("MONGO_BACKOFF_CAP", 5))
+    # bulk inserts are split so each batch stays well under mongos 48MB message limit
+    BATCH_DOCUMENTS = int(os.getenv("MONGO_BATCH_DOCUMENTS", 1000))
+    BATCH_BYTES = int(os.getenv("MONGO_BATCH_BYTES", 8 * 1024 * 1024))
+
     def __init__(self, log: logging.Logger, database: str = None):
         self.log = log
         self.client = self.__connect()
         self.database = self.__database(database=database)
+        self.latency = {}
 
-    def __connect(self) -> pymongo.MongoClient:
+    def __connect(self) -> AsyncIOMotorClient:
         """Function to connect to database
 
         Raises:
             ConnectionRefusedError: Raises error for no connection
 
         Returns:
-            MongoClient: Returns mongo client
+            AsyncIOMotorClient: Returns mongo client
         """
         try:
-            if self.client.server_info():
-                return self.client
-        except Exception:
-            pass
-        try:
-            client = pymongo.MongoClient(
-                host=os.getenv('MONGO_CONNECTION_URI')
+            return AsyncIOMotorClient(
+                host=os.getenv('MONGO_CONNECTION_URI'),
+                maxPoolSize=int(os.getenv("MONGO_POOL_SIZE", 50)),
+                serverSelectionTimeoutMS=int(os.getenv("MONGO_TIMEOUT", 5000))
             )
-            return client
         except Exception:
             self.log.exception(
                 "Unable to establish a connection to Mongo database")
             raise ConnectionRefusedError
 
-    def __database(self, database: str) -> pymongo.MongoClient:
+    def __database(self, database: str):
         """Initializes connection to database
 
         Args:
@@ -47,7 +62,7 @@ class MongoConnect():
             ConnectionRefusedError: If failed connection
 
         Returns:
-            MongoClient: Client for mongo connection to the database
+            AsyncIOMotorDatabase: Client for mongo connection to the database
         """
         try:
             return self.client[database]
@@ -69,7 +84,90 @@ class MongoConnect():
         """
         self.client.close()
 
-    def insert(self, collection: str, content: dict) -> bool:
+    @staticmethod
+    def projection(exclude: Union[dict, list, None]) -> Union[dict, None]:
+        """Function to turn exclude into a mongo projection
+
+        Args:
+            exclude (Union[dict, list, None]): fields not to return, either a list of names or a projection
+
+        Returns:
+            Union[dict, None]: projection for mongo
+        """
+        if not exclude:
+            return None
+        if isinstance(exclude, dict):
+            return exclude
+        return {field: 0 for field in exclude}
+
+    @staticmethod
+    def duplicate_id(error: Union[dict, None]) -> bool:
+        """Function to check if a write error is a duplicate _id, which only an earlier try of the same write causes
+
+        Args:
+            error (Union[dict, None]): details of the write error
+
+        Returns:
+            bool: true if the conflicting key is _id, false for any other unique index
+        """
+        if not error or error.get("code") != DUPLICATE_KEY:
+            return False
+        if error.get("keyPattern") is not None:
+            return list(error["keyPattern"]) == ["_id"]
+        if error.get("keyValue") is not None:
+            return list(error["keyValue"]) == ["_id"]
+        # servers before 4.4 only name the index in the message
+        return " index: _id_ " in error.get("errmsg", "")
+
+    async def backoff(self, retries: int):
+        # full jitter so retries from many requests do not land on mongo at the same time
+        await asyncio.sleep(random.uniform(0, min(self.BACKOFF_CAP, self.BACKOFF * 2 ** retries)))
+
+    @asynccontextmanager
+    async def timed(self, operation: str, collection: str):
+        """Records how long an operation took, failed attempts included
+
+        Args:
+            operation (str): name of the operation, insert, find, etc.
+            collection (str): collection the operation ran on
+        """
+        start = time.perf_counter()
+        failed = False
+        try:
+            yield
+        except Exception:
+            failed = True
+            raise
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            stats = self.latency.setdefault(f"{operation}:{collection}", {
+                "count": 0,
+                "errors": 0,
+                "totalMs": 0.0,
+                "maxMs": 0.0
+            })
+            stats["count"] += 1
+            stats["errors"] += 1 if failed else 0
+            stats["totalMs"] += elapsed
+            stats["maxMs"] = max(stats["maxMs"], elapsed)
+
+    def metrics(self) -> dict:
+        """Function to get per operation latency
+
+        Returns:
+            dict: count, errors, average and max latency in ms keyed by operation:collection
+        """
+        return {
+            key: {
+                "count": stats["count"],
+                "errors": stats["errors"],
+                "avgMs": round(stats["totalMs"] / stats["count"], 2) if stats["count"] else 0,
+                "maxMs": round(stats["maxMs"], 2)
+            }
+            for key, stats in self.latency.items()
+        }
+
+    async def insert(self, collection: str, content: dict) -> bool:
         """Function to insert single document into mongo
 
         Args:
@@ -86,22 +184,52 @@ class MongoConnect():
             raise ValueError("No collection supplied for insert")
         if not content:
             raise ValueError("No content supplied to be inserted")
+        content['_id'] = self.objectID()
         retries = 0
         while True:
             try:
-                content['_id'] = self.objectID()
-                self.database[collection].insert_one(content)
+                async with self.timed("insert", collection):
+                    await self.database[collection].insert_one(content)
                 return True
+            except pymongo.errors.DuplicateKeyError as e:
+                if self.duplicate_id(e.details):
+                    # already written by an earlier try that timed out
+                    return True
+                self.log.error(
+                    f"Failed to insert content into collection: {collection}, duplicate key {(e.details or {}).get('keyValue')}")
+                break
             except Exception:
-                if retries == 10:
+                if retries == self.RETRIES:
                     self.log.exception(
                         f"Failed to insert content into collection: {collection}")
                     break
+                await self.backoff(retries)
                 retries += 1
-                time.sleep(5)
         return False
 
-    def insert_bulk(self, collection: str, content: list) -> bool:
+    def batches(self, content: list):
+        """Splits documents into batches bounded by both document count and encoded size
+
+        Args:
+            content (list): documents to split
+
+        Yields:
+            list: documents of the next batch
+        """
+        batch = []
+        batch_bytes = 0
+        for item in content:
+            size = len(bson.encode(item))
+            if batch and (len(batch) >= self.BATCH_DOCUMENTS or batch_bytes + size > self.BATCH_BYTES):
+                yield batch
+                batch = []
+                batch_bytes = 0
+            batch.append(item)
+            batch_bytes += size
+        if batch:
+            yield batch
+
+    async def insert_bulk(self, collection: str, content: list) -> bool:
         """Function to insert bul document into mongo
 
         Args:
@@ -118,52 +246,116 @@ class MongoConnect():
             raise ValueError("No collection supplied for insert")
         if not content:
             raise ValueError("No content supplied to be inserted")
-        bulk_operations = []
-        chunk_index = 0
-        CHUNK_SIZE = 20
-
-        while True:
-            chunk = content[chunk_index:chunk_index+CHUNK_SIZE]
-            if not len(chunk):
-                break
-
-            operations = []
-            for item in chunk:
-                item['_id'] = self.objectID()
-                operations.append(pymongo.InsertOne(item))
-            bulk_operations.append(operations)
 
-            chunk_index += CHUNK_SIZE
+        for item in content:
+            item['_id'] = self.objectID()
 
-        for operations in bulk_operations:
+        inserted = True
+        for batch in self.batches(content):
+            pending = batch
             retries = 0
-            while True:
+            while pending:
                 try:
-                    self.database[collection].bulk_write(operations)
+                    async with self.timed("insert_bulk", collection):
+                        await self.database[collection].bulk_write(
+                            [pymongo.InsertOne(item) for item in pending], ordered=False)
                     break
+                except BulkWriteError as e:
+                    # unordered writes keep going past a failure, only retry what did not make it in.
+                    # a duplicate _id was written by an earlier try, any other duplicate key never will be
+                    errors = e.details.get("writeErrors", [])
+                    for error in errors:
+                        if error["code"] == DUPLICATE_KEY and not self.duplicate_id(error):
+                            self.log.error(
+                                f"Failed to insert document into collection: {collection}, duplicate key {error.get('keyValue')}")
+                            inserted = False
+                    failed = sorted(
+                        error["index"] for error in errors
+                        if error["code"] != DUPLICATE_KEY
+                    )
+                    pending = [pending[index] for index in failed]
+                    if not pending:
+                        break
                 except Exception:
-                    if retries == 10:
-                        self.log.exception(
-                            f"Failed to insert content into collection: {collection}")
-                        return False
-                    retries += 1
-                time.sleep(5)
-        return True
-
-    def find(self, collection: str, content: dict, exclude: dict = None) -> dict:
+                    # the whole batch is sent again, documents that made it in come back as duplicates
+                    pass
+
+                if retries == self.RETRIES:
+                    self.log.error(
+                        f"Failed to insert {len(pending)} documents into collection: {collection}")
+                    return False
+                await self.backoff(retries)
+                retries += 1
+        return inserted
+
+    async def ensure_indexes(self, indexes: dict) -> bool:
+        """Function to create any missing indexes, existing ones are left as they are
+
+        Args:
+            indexes (dict): collection to list of pymongo.IndexModel
+
+        Returns:
+            bool: true if every index exists
+        """
+        created = True
+        for collection, models in indexes.items():
+            try:
+                names = await self.database[collection].create_indexes(models)
+                self.log.info(f"Indexes on {collection}: {', '.join(names)}")
+            except Exception:
+                self.log.exception(f"Failed to create indexes on collection: {collection}")
+                created = False
+        return created
+
+    async def update_bulk(self, collection: str, updates: list) -> bool:
+        """Function to apply many single document updates in one round trip
+
+        Args:
+            collection (str): collection to update in
+            updates (list): list of (query, content) tuples
+
+        Raises:
+            ValueError: Missing values
+
+        Returns:
+            bool: true if worked, false if not
+        """
+        if not collection:
+            raise ValueError("No collection supplied for update")
+        if not updates:
+            raise ValueError("No updates supplied")
+
+        operations = [pymongo.UpdateOne(query, {"$set": content}) for query, content in updates]
+        retries = 0
+        while True:
+            try:
+                async with self.timed("update_bulk", collection):
+                    await self.database[collection].bulk_write(operations, ordered=False)
+                return True
+            except Exception:
+                if retries == self.RETRIES:
+                    self.log.exception(
+                        f"Failed to update content in collection: {collection}")
+                    break
+                await self.backoff(retries)
+                retries += 1
+        return False
+
+    async def find(self, collection: str, content: dict, exclude: Union[dict, list] = None, limit: int = 0) -> list:
         """function to find from db
 
         Args:
             collection (str): collection to find in
             content (dict): what to find based on
-            exclude (dict, optional): what not to return, aka _id, etc. Defaults to None.
+            exclude (Union[dict, list], optional): what not to return, aka _id, etc. Defaults to None.
+            limit (int, optional): max documents to return, 0 for all. Defaults to 0.
 
         Raises:
             ValueError: no collection given
             ValueError: no content given
 
         Returns:
-            dict: what was needed from the database
+            list: what was needed from the database
         """
 
         if not collection:
@@ -173,18 +365,19 @@ class MongoConnect():
         retries = 0
         while True:
             try:
-                if not exclude:
-                    return self.database[collection].find(content)
+                async with self.timed("find", collection):
+                    cursor = self.database[collection].find(content, self.projection(exclude), limit=limit)
+                    return await cursor.to_list(length=None)
             except Exception:
-                if retries == 10:
+                if retries == self.RETRIES:
                     self.log.exception(
                         f"Failed to find content from collection: {collection}")
                     break
+                await self.backoff(retries)
                 retries += 1
-                time.sleep(5)
         return False
 
-    def find_one(self, collection: str, content: dict, exclude: dict = None) -> dict:
+    async def find_one(self, collection: str, content: dict, exclude: Union[dict, list] = None) -> dict:
         if not collection:
             raise ValueError("No collection supplied for insert")
         if not content:
@@ -192,18 +385,131 @@ class MongoConnect():
         retries = 0
         while True:
             try:
-                if not exclude:
-                    return self.database[collection].find_one(content)
+                async with self.timed("find_one", collection):
+                    return await self.database[collection].find_one(content, self.projection(exclude))
             except Exception:
-                if retries == 10:
+                if retries == self.RETRIES:
                     self.log.exception(
                         f"Failed to find content from collection: {collection}")
                     break
+                await self.backoff(retries)
+                retries += 1
+        return False
+
+    async def aggregate(self, collection: str, pipeline: list) -> list:
+        """function to run an aggregation pipeline
+
+        Args:
+            collection (str): collection to aggregate
+            pipeline (list): stages of the pipeline
+
+        Raises:
+            ValueError: no collection given
+            ValueError: no pipeline given
+
+        Returns:
+            list: documents output by the pipeline
+        """
+
+        if not collection:
+            raise ValueError("No collection supplied for aggregate")
+        if not pipeline:
+            raise ValueError("No pipeline supplied to aggregate")
+        retries = 0
+        while True:
+            try:
+                async with self.timed("aggregate", collection):
+                    cursor = self.database[collection].aggregate(pipeline, allowDiskUse=True)
+                    return await cursor.to_list(length=None)
+            except Exception:
+                if retries == self.RETRIES:
+                    self.log.exception(
+                        f"Failed to aggregate collection: {collection}")
+                    break
+                await self.backoff(retries)
+                retries += 1
+        return False
+
+    async def increment(self, collection: str, query: dict, counts: dict, on_insert: dict = None, upsert: bool = True) -> bool:
+        """function to increment counters of a document, creating it if missing
+
+        Args:
+            collection (str): collection to update in
+            query (dict): query of the document to increment
+            counts (dict): field to amount to increment it by
+            on_insert (dict, optional): fields to set only when the document is created. Defaults to None.
+            upsert (bool, optional): whether to create the document when nothing matches. Defaults to True.
+
+        Raises:
+            ValueError: no collection given
+            ValueError: no query given
+            ValueError: no counts given
+
+        Returns:
+            bool: true if worked, false if not
+        """
+
+        if not collection:
+            raise ValueError("No collection supplied for increment")
+        if not query:
+            raise ValueError("No query supplied to increment")
+        if not counts:
+            raise ValueError("No counts supplied to increment")
+        update = {"$inc": counts}
+        if on_insert:
+            update["$setOnInsert"] = on_insert
+        # not retried, an increment that timed out may still have been applied
+        try:
+            async with self.timed("increment", collection):
+                await self.database[collection].update_one(query, update, upsert=upsert)
+            return True
+        except Exception:
+            self.log.exception(
+                f"Failed to increment content in collection: {collection}")
+        return False
+
+    async def insert_missing(self, collection: str, query: dict, content: dict) -> bool:
+        """function to insert a document only when none matches the query, a matching one is left untouched
+
+        Args:
+            collection (str): collection to insert in
+            query (dict): query of the document
+            content (dict): document to insert
+
+        Raises:
+            ValueError: no collection given
+            ValueError: no query given
+            ValueError: no content given
+
+        Returns:
+            bool: true if the document exists afterwards, false if not
+        """
+
+        if not collection:
+            raise ValueError("No collection supplied for insert")
+        if not query:
+            raise ValueError("No query supplied to insert")
+        if not content:
+            raise ValueError("No content supplied to be inserted")
+        retries = 0
+        while True:
+            try:
+                async with self.timed("insert_missing", collection):
+                    await self.database[collection].update_one(query, {"$setOnInsert": content}, upsert=True)
+                return True
+            except pymongo.errors.DuplicateKeyError:
+                # another writer created it between the match and the insert
+                return True
+            except Exception:
+                if retries == self.RETRIES:
+                    self.log.exception(
+                        f"Failed to insert content in collection: {collection}")
+                    break
+                await self.backoff(retries)
                 retries += 1
-                time.sleep(5)
         return False
 
-    def update(self, collection: str, content: dict, query: dict, many: bool = False):
+    async def update(self, collection: str, content: dict, query: dict, many: bool = False, upsert: bool = False):
         """function to update in db
 
         Args:
@@ -211,6 +517,7 @@ class MongoConnect():
             content (dict): what to update it with
             query (dict): query of what needs to be found to update
             many (bool, optional): whether multiple to update or not. Defaults to False.
+            upsert (bool, optional): whether to insert when nothing matches. Defaults to False.
 
         Raises:
             ValueError: no collection given
@@ -230,23 +537,24 @@ class MongoConnect():
         retries = 0
         while True:
             try:
-                if many:
-                    self.database[collection].update_many(
-                        query, {"$set": content})
-                else:
-                    self.database[collection].update_one(
-                        query, {"$set": content})
+                async with self.timed("update", collection):
+                    if many:
+                        await self.database[collection].update_many(
+                            query, {"$set": content}, upsert=upsert)
+                    else:
+                        await self.database[collection].update_one(
+                            query, {"$set": content}, upsert=upsert)
                 return True
             except Exception:
-                if retries == 10:
+                if retries == self.RETRIES:
                     self.log.exception(
                         f"Failed to update content in collection: {collection}")
                     break
+                await self.backoff(retries)
                 retries += 1
-                time.sleep(5)
         return False
 
-    def delete(self, collection: str, query: dict, many: bool = False):
+    async def delete(self, collection: str, query: dict, many: bool = False):
         """function to delete from mongodb
 
         Args:
@@ -269,16 +577,17 @@ class MongoConnect():
         retries = 0
         while True:
             try:
-                if many:
-                    self.database[collection].delete_many(query)
-                else:
-                    self.database[collection].delete_one(query)
+                async with self.timed("delete", collection):
+                    if many:
+                        await self.database[collection].delete_many(query)
+                    else:
+                        await self.database[collection].delete_one(query)
                 return True
             except Exception:
-                if retries == 10:
+                if retries == self.RETRIES:
                     self.log.exception(
                         f"Failed to delete content from collection: {collection}")
                     break
+                await self.backoff(retries)
                 retries += 1
-                time.sleep(5)
         return False
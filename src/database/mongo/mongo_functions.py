@@ -5,9 +5,11 @@ from src import log
 from src.database.mongo import mongo_client
 from src.database.sql.form_functions import get_form, update_form_postgres
 from src.api.api_models.forms import update_survey, update_quiz
+from src.modules.quiz_grader import invalidate_answer_key
+from src.modules.form_analytics import record_submission
 
 
-def save_survey_submission(
+async def save_survey_submission(
     content: dict,
     form_id: str,
     user_id: str,
@@ -21,14 +23,15 @@ def save_survey_submission(
                 "responseId": response_id
             }
         )
-        if mongo_client.insert(collection="survey_submissions", content=content):
+        if await mongo_client.insert(collection="survey_submissions", content=content):
+            await record_submission(form_id, "survey", content)
             return response_id
     except Exception:
         log.exception("Failed ot submit survey")
     return None
 
 
-def save_quiz_submission(
+async def save_quiz_submission(
     content: dict,
     form_id: str,
     user_id: str,
@@ -50,7 +53,8 @@ def save_quiz_submission(
                 "attempt": attempts + 1,
             }
         )
-        if mongo_client.insert(collection="quiz_submissions", content=content):
+        if await mongo_client.insert(collection="quiz_submissions", content=content):
+            await record_submission(form_id, "quiz", content)
             return response_id
     except Exception:
         log.exception("Failed ot submit quiz")
@@ -71,18 +75,15 @@ async def get_form_from_mongo(type: str = None, id: str = None):
     if not id:
         return None
 
-    formSQL = await get_form(type, id)
-
-    if not formSQL:
+    # postgres decides which forms exist, a form removed there can be left behind in mongo
+    if not await get_form(type, id):
         return None
 
-    form = mongo_client.find_one(type, {"formId": id})
+    form = await mongo_client.find_one(type, {"formId": id}, exclude=["_id"])
 
     if not form:
         return None
 
-    del form["_id"]
-
     return form
 
 
@@ -136,7 +137,7 @@ async def update_survey_func(id: str, data: update_survey.Input, user_id: str):
                 for choice in question["choices"]:
                     choice.update({"answerId": str(uuid.uuid4())})
 
-        surveyMongo = mongo_client.update(
+        surveyMongo = await mongo_client.update(
             collection="survey", content=content, query=query)
         surveyPostgresModel = {
             "form_id": id,
@@ -211,8 +212,9 @@ async def update_quiz_func(id: str, data: update_quiz.Input, user_id: str):
             if not question["answerType"] == 'multipleChoice':
                 continue
 
-        quizMongo = mongo_client.update(
+        quizMongo = await mongo_client.update(
             collection="quiz", content=content, query=query)
+        invalidate_answer_key(id)
         quizPostgresModel = {
             "form_id": id,
             "form_name": data.formName,
@@ -9,7 +9,6 @@ import asyncpg
 
 connection_pool = None
 
-
 async def connect():
     try:
         return await asyncpg.create_pool(
@@ -54,3 +53,4 @@ class acquire_connection:
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         await self.pool.release(self.conn)
+
@@ -1,12 +1,21 @@
 from typing import Union
 import datetime
+import pytz
+import math
 import os
+import json
+import base64
 
 from src import log
 from src.utils.snake_case import camel_to_snake
 from src.api.api_models import global_models
 from src.api.api_models.courses import course_update, create, bundle_update, bundle
 from src.database.sql import get_connection, acquire_connection
+from src.utils.check_overlap import find_overlaps
+from src.utils.like_pattern import escape_like
+from src.modules.typeahead import refresh_entity, forget_entity
+from src.modules.certificate_artifacts import invalidate_related_artifacts
+from src.modules.prerequisites import missing_prerequisites, invalidate_prerequisites
 
 
 async def list_courses(
@@ -546,21 +555,60 @@ async def check_bundle_registration(bundle_id: str = None, user_id: str = None):
     return None
 
 
-async def get_schedule(user_id: str = None, page: int = None, pageSize: int = None) -> list:
+def encode_schedule_cursor(event) -> str:
+    cursor = json.dumps([event['start_dtm'].isoformat(), event['course_id'], event['series_number']])
+    return base64.urlsafe_b64encode(cursor.encode()).decode()
+
+
+def decode_schedule_cursor(cursor: str) -> tuple:
+    start_dtm, course_id, series_number = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    return datetime.datetime.fromisoformat(start_dtm), course_id, series_number
+
+
+async def get_schedule(user_id: str = None, page: int = None, pageSize: int = None, cursor: str = None) -> list:
     """Get a schedule for a user
 
+    Pages are read after a cursor unless a page number is given, in which case they are
+    read with OFFSET and the total is counted for existing callers.
+
     Args:
         user_id (str, optional): User Id to get the schedule of. Defaults to None.
+        page (int, optional): page to get, ignored when a cursor is given. Defaults to None.
+        pageSize (int, optional): classes per page. Defaults to None.
+        cursor (str, optional): cursor of the last class of the previous page. Defaults to None.
 
     Returns:
-        list: A list of schedules
+        list: A list of schedules, total pages (only counted for page numbers) and the cursor of the next page
     """
 
     if not user_id:
-        return []
-    current_timestamp = datetime.datetime.now()
-
-    query = """
+        return [], 0, None
+
+    values = [user_id, datetime.datetime.utcnow()]
+    keyset = ""
+    if cursor:
+        values.extend(decode_schedule_cursor(cursor))
+        keyset = "AND (cd.start_dtm, cd.course_id, cd.series_number) > ($3, $4, $5)"
+
+    # counting every class of the user is only needed to number pages
+    numbered = bool(page and pageSize and not cursor)
+    paging = ""
+    if numbered:
+        values.extend([pageSize, (page-1)*pageSize])
+        paging = f"LIMIT ${len(values)-1} OFFSET ${len(values)}"
+    elif pageSize:
+        # one class past the page tells if there is a next page
+        values.append(pageSize + 1)
+        paging = f"LIMIT ${len(values)}"
+
+    # every course of the user comes from the user_id indexes, then each course
+    # is a single range read on the course_id, start_dtm index
+    query = f"""
+        WITH user_courses AS (
+            SELECT course_id FROM course_instructor WHERE user_id = $1
+            UNION
+            SELECT course_id FROM course_registration WHERE user_id = $1
+        )
         SELECT
             c.course_id,
             c.course_name,
@@ -568,499 +616,444 @@ async def get_schedule(user_id: str = None, page: int = None, pageSize: int = No
             cd.end_dtm,
             cd.series_number,
             cd.is_complete
-        FROM
-            courses c
-        JOIN
-            course_dates cd ON c.course_id = cd.course_id
-        WHERE
-            EXISTS (
-                SELECT 1
-                FROM course_instructor ci
-                WHERE ci.course_id = c.course_id AND ci.user_id = $1
-            )
-            OR EXISTS (
-                SELECT 1
-                FROM course_registration cr
-                WHERE cr.course_id = c.course_id AND cr.user_id = $1
-            )
-            AND cd.start_dtm > $2
-        ORDER BY
-            cd.start_dtm ASC;
+            {", COUNT(*) OVER() AS total" if numbered else ""}
+        FROM user_courses uc
+        JOIN course_dates cd
+        ON cd.course_id = uc.course_id
+        JOIN courses c
+        ON c.course_id = cd.course_id
+        WHERE cd.start_dtm > $2
+        {keyset}
+        ORDER BY cd.start_dtm ASC, cd.course_id ASC, cd.series_number ASC
+        {paging};
     """
-
-    if page and pageSize:
-        query = """
-            SELECT
-                c.course_id,
-                c.course_name,
-                cd.start_dtm,
-                cd.end_dtm,
-                cd.series_number,
-                cd.is_complete
-            FROM
-                courses c
-            JOIN
-                course_dates cd ON c.course_id = cd.course_id
-            WHERE
-                EXISTS (
-                    SELECT 1
-                    FROM course_instructor ci
-                    WHERE ci.course_id = c.course_id AND ci.user_id = $1
-                )
-                OR EXISTS (
-                    SELECT 1
-                    FROM course_registration cr
-                    WHERE cr.course_id = c.course_id AND cr.user_id = $1
-                )
-                AND cd.start_dtm > $2
-            ORDER BY
-                cd.start_dtm ASC
-            LIMIT $3 OFFSET $4;
-        """
     formatted_schedule = []
     total_pages = 0
+    next_cursor = None
     try:
         db_pool = await get_connection()
         async with acquire_connection(db_pool) as conn:
-            if page and pageSize:
-                schedule = await conn.fetch(query, user_id, current_timestamp, page, pageSize)
-                total_pages = await conn.fetchrow("""
-                    SELECT
-                        COUNT(*)
-                    FROM
-                        courses c
-                    JOIN
-                        course_dates cd ON c.course_id = cd.course_id
-                    WHERE
-                        EXISTS (
-                            SELECT 1
-                            FROM course_instructor ci
-                            WHERE ci.course_id = c.course_id AND ci.user_id = $1
-                        )
-                        OR EXISTS (
-                            SELECT 1
-                            FROM course_registration cr
-                            WHERE cr.course_id = c.course_id AND cr.user_id = $1
-                        )
-                        AND cd.start_dtm > $2;
-                """, user_id, current_timestamp)
-            else:
-                schedule = await conn.fetch(query, user_id, current_timestamp)
-            if schedule:
-                for course in schedule:
-                    formatted_schedule.append({
-                        "courseId": course[0],
-                        "courseName": course[1],
-                        "startTime": str(course[2]),
-                        "endTime": str(course[3]),
-                        "duration": (course[3] - course[2]).total_seconds() // 60,
-                        "seriesNumber": course[4],
-                        "complete": course[5]
-                    })
+            schedule = await conn.fetch(query, *values)
+
+        has_more = False
+        if numbered and schedule:
+            total_pages = math.ceil(schedule[0]['total']/pageSize)
+            has_more = schedule[0]['total'] > page*pageSize
+        elif pageSize and len(schedule) > pageSize:
+            schedule = schedule[:pageSize]
+            has_more = True
+
+        if has_more:
+            next_cursor = encode_schedule_cursor(schedule[-1])
+
+        for course in schedule:
+            formatted_schedule.append({
+                "courseId": course['course_id'],
+                "courseName": course['course_name'],
+                "startTime": str(course['start_dtm']),
+                "endTime": str(course['end_dtm']),
+                "duration": (course['end_dtm'] - course['start_dtm']).total_seconds() // 60,
+                "seriesNumber": course['series_number'],
+                "complete": course['is_complete']
+            })
 
     except Exception:
         log.exception(
             f"An error occured while getting courses related to {user_id}")
 
-    if total_pages:
-        total_pages = total_pages[0]/pageSize
-    return formatted_schedule, int(total_pages)
+    return formatted_schedule, int(total_pages), next_cursor
+
+
+# must match the expression indexes in migrations so searches are read off them
+COURSE_SEARCH_VECTOR = (
+    "to_tsvector('english', coalesce(c.course_name, '') || ' ' || "
+    "coalesce(c.course_code, '') || ' ' || coalesce(c.brief_description, ''))"
+)
+BUNDLE_SEARCH_VECTOR = (
+    "to_tsvector('english', coalesce(cb.bundle_name, '') || ' ' || coalesce(cb.brief_description, ''))"
+)
+# how close a misspelled word has to be to a word of a name to match, 0 to 1
+SEARCH_SIMILARITY = float(os.getenv("SEARCH_SIMILARITY", 0.4))
+
 
+async def search_courses(
+    course_name: str = None,
+    course_bundle: str = None,
+    catalog: bool = False,
+    page: int = None,
+    pageSize: int = None,
+    search_term: str = None
+) -> tuple:
+    """Function to search for courses and bundles ranked by relevance
 
-async def search_courses(course_name: str = None, course_bundle: str = None, catalog: bool = False, page: int = None, pageSize: int = None) -> tuple:
-    """Function to search for a course
+    Matches on a substring or a close misspelling of a word in the name or course code,
+    or on the words of the brief description.
 
     Args:
         course_name (str, optional): Course name needed to find the course. Defaults to None.
         course_bundle (str, optional): Bundle name needed to find the course bundle. Defaults to None.
         catalog (bool, optional): depicts whether not its for the catalog for students. Defaults to None.
+        page (int, optional): page to get. Defaults to None.
+        pageSize (int, optional): results per page. Defaults to None.
+        search_term (str, optional): term to search courses and bundles with at once. Defaults to None.
 
     Returns:
-        Tuple[list, list]: A list of courses
+        Tuple[list, int]: A list of courses and bundles, most relevant first, and total pages
     """
-
-    query = None
-    value = None
-
-    if course_name:
-        value = f'%{course_name}%'
-        query = """
-            SELECT
-                c.course_picture,
-                c.course_id,
-                c.course_name,
-                c.first_class_dtm,
-                c.brief_description,
-                c.classes_in_series,
-                c.active,
-                c.is_complete,
-                c.create_dtm
-            FROM courses AS c
-            where c.course_name LIKE $1
-            ORDER BY c.create_dtm DESC;
-        """
-        if page and pageSize:
-            query = """
-                SELECT
-                    c.course_picture,
-                    c.course_id,
-                    c.course_name,
-                    c.first_class_dtm,
-                    c.brief_description,
-                    c.classes_in_series,
-                    c.active,
-                    c.is_complete,
-                    c.create_dtm
-                FROM courses AS c
-                where c.course_name LIKE $1
-                ORDER BY c.create_dtm DESC
-                LIMIT $2 OFFSET $3;
-            """
-        if catalog:
-            query = """
-                SELECT
-                    c.course_picture,
-                    c.course_id,
-                    c.course_name,
-                    c.first_class_dtm,
-                    c.brief_description,
-                    c.classes_in_series,
-                    c.active,
-                    c.is_complete,
-                    c.create_dtm
-                FROM courses AS c
-                where c.course_name LIKE $1
-                and c.is_complete = false
-                and c.active = true
-                and c.is_full = false
-                and c.waitlist = true
-                and c.registration_expiration_dtm > CURRENT_TIMESTAMP
-                ORDER BY c.create_dtm DESC;
-            """
-            if page and pageSize:
-                query = """
-                    SELECT
-                        c.course_picture,
-                        c.course_id,
-                        c.course_name,
-                        c.first_class_dtm,
-                        c.brief_description,
-                        c.classes_in_series,
-                        c.active,
-                        c.is_complete,
-                        c.create_dtm
-                    FROM courses AS c
-                    where c.course_name LIKE $1
-                    and c.is_complete = false
-                    and c.active = true
-                    and c.is_full = false
-                    and c.waitlist = true
-                    and c.registration_expiration_dtm > CURRENT_TIMESTAMP
-                    ORDER BY c.create_dtm DESC
-                    LIMIT $2 OFFSET $3;
-                """
-    if course_bundle:
-        value = f'%{course_bundle}%'
-        query = """
-            SELECT
-            cb.bundle_photo,
-            cb.bundle_id,
-            cb.bundle_name,
+    term = (search_term or course_name or course_bundle or "").strip()
+    if not term:
+        return [], 0
+
+    include_courses = bool(search_term or course_name)
+    include_bundles = bool(search_term or course_bundle)
+
+    # the catalog only shows what students can still sign up for
+    course_catalog = """
+        AND c.is_complete = false
+        AND c.active = true
+        AND c.is_full = false
+        AND c.waitlist = true
+        AND c.registration_expiration_dtm > CURRENT_TIMESTAMP
+    """ if catalog else ""
+    bundle_catalog = """
+        AND cb.is_complete = false
+        AND cb.active = true
+        AND cb.is_full = false
+        AND cb.waitlist = true
+        AND cb.registration_expiration_dtm > CURRENT_TIMESTAMP
+    """ if catalog else ""
+
+    course_query = f"""
+        SELECT
+            'Course' AS course_type,
+            c.course_id AS id,
+            c.course_name AS name,
+            c.course_picture AS picture,
+            c.first_class_dtm,
+            c.brief_description,
+            c.classes_in_series AS total_classes,
+            c.active,
+            c.is_complete,
+            c.create_dtm,
+            GREATEST(
+                word_similarity($1, c.course_name),
+                word_similarity($1, coalesce(c.course_code, '')),
+                ts_rank({COURSE_SEARCH_VECTOR}, plainto_tsquery('english', $1))
+            ) + CASE WHEN c.course_name ILIKE $2 THEN 1 ELSE 0 END AS rank
+        FROM courses c
+        WHERE (
+            c.course_name ILIKE $2
+            OR $1 <% c.course_name
+            OR c.course_code ILIKE $2
+            OR {COURSE_SEARCH_VECTOR} @@ plainto_tsquery('english', $1)
+        )
+        {course_catalog}
+    """
+    bundle_query = f"""
+        SELECT
+            'Bundle' AS course_type,
+            cb.bundle_id AS id,
+            cb.bundle_name AS name,
+            cb.bundle_photo AS picture,
+            NULL::timestamp AS first_class_dtm,
+            cb.brief_description,
+            (
+                SELECT SUM(c.classes_in_series)
+                FROM bundled_courses bc
+                JOIN courses c ON c.course_id = bc.course_id
+                WHERE bc.bundle_id = cb.bundle_id
+            ) AS total_classes,
             cb.active,
             cb.is_complete,
-            SUM(c.classes_in_series) AS total_classes,
-            cb.create_dtm
-            FROM
-                course_bundles cb
-            JOIN
-                bundled_courses bc ON cb.bundle_id = bc.bundle_id
-            JOIN
-                courses c ON bc.course_id = c.course_id
-            where cb.bundle_name LIKE $1
-            and cb.is_complete = false
-            and cb.active = true
-            and cb.is_full = false
-            and cb.waitlist = true
-            and cb.registration_expiration_dtm > CURRENT_TIMESTAMP
-            GROUP BY
-                cb.bundle_id, cb.bundle_name, cb.brief_description, cb.bundle_photo, cb.active, cb.is_complete
-            ORDER BY
-                cb.create_dtm DESC;
-        """
-        if page and pageSize:
-            query = """
-                SELECT
-                cb.bundle_photo,
-                cb.bundle_id,
-                cb.bundle_name,
-                cb.active,
-                cb.is_complete,
-                SUM(c.classes_in_series) AS total_classes,
-                cb.create_dtm
-                FROM
-                    course_bundles cb
-                JOIN
-                    bundled_courses bc ON cb.bundle_id = bc.bundle_id
-                JOIN
-                    courses c ON bc.course_id = c.course_id
-                where cb.bundle_name LIKE $1
-                and cb.is_complete = false
-                and cb.active = true
-                and cb.is_full = false
-                and cb.waitlist = true
-                and cb.registration_expiration_dtm > CURRENT_TIMESTAMP
-                GROUP BY
-                    cb.bundle_id, cb.bundle_name, cb.brief_description, cb.bundle_photo, cb.active, cb.is_complete
-                ORDER BY
-                    cb.create_dtm DESC
-                LIMIT $2 OFFSET $3;
-            """
-        if catalog:
-            query = """
-                SELECT
-                cb.bundle_photo,
-                cb.bundle_id,
-                cb.bundle_name,
-                cb.active,
-                cb.is_complete,
-                SUM(c.classes_in_series) AS total_classes,
-                cb.create_dtm
-                FROM
-                    course_bundles cb
-                JOIN
-                    bundled_courses bc ON cb.bundle_id = bc.bundle_id
-                JOIN
-                    courses c ON bc.course_id = c.course_id
-                where cb.bundle_name LIKE $1
-                GROUP BY
-                    cb.bundle_id, cb.bundle_name, cb.brief_description, cb.bundle_photo, cb.active, cb.is_complete
-                ORDER BY
-                    cb.create_dtm DESC;
-            """
-            if page and pageSize:
-                query = """
-                    SELECT
-                    cb.bundle_photo,
-                    cb.bundle_id,
-                    cb.bundle_name,
-                    cb.active,
-                    cb.is_complete,
-                    SUM(c.classes_in_series) AS total_classes,
-                    cb.create_dtm
-                    FROM
-                        course_bundles cb
-                    JOIN
-                        bundled_courses bc ON cb.bundle_id = bc.bundle_id
-                    JOIN
-                        courses c ON bc.course_id = c.course_id
-                    where cb.bundle_name LIKE $1
-                    GROUP BY
-                        cb.bundle_id, cb.bundle_name, cb.brief_description, cb.bundle_photo, cb.active, cb.is_complete
-                    ORDER BY
-                        cb.create_dtm DESC
-                    LIMIT $2 OFFSET $3;
-                """
+            cb.create_dtm,
+            GREATEST(
+                word_similarity($1, cb.bundle_name),
+                ts_rank({BUNDLE_SEARCH_VECTOR}, plainto_tsquery('english', $1))
+            ) + CASE WHEN cb.bundle_name ILIKE $2 THEN 1 ELSE 0 END AS rank
+        FROM course_bundles cb
+        WHERE (
+            cb.bundle_name ILIKE $2
+            OR $1 <% cb.bundle_name
+            OR {BUNDLE_SEARCH_VECTOR} @@ plainto_tsquery('english', $1)
+        )
+        {bundle_catalog}
+    """
+
+    parts = []
+    if include_courses:
+        parts.append(course_query)
+    if include_bundles:
+        parts.append(bundle_query)
+
+    values = [term, f"%{escape_like(term)}%"]
+    paging = ""
+    if page and pageSize:
+        paging = "LIMIT $3 OFFSET $4"
+        values.extend([pageSize, (page-1)*pageSize])
+
+    query = f"""
+        SELECT
+            *,
+            COUNT(*) OVER() AS total
+        FROM ({" UNION ALL ".join(parts)}) AS results
+        ORDER BY rank DESC, create_dtm DESC
+        {paging};
+    """
+
     courses = []
     total_pages = 0
     try:
         db_pool = await get_connection()
         async with acquire_connection(db_pool) as conn:
-            if page and pageSize:
-                found_courses = await conn.fetch(query, value, pageSize, (page-1)*pageSize)
-                if course_name and not catalog:
-                    total_pages = await conn.fetchrow("""
-                        SELECT
-                            COUNT(*)
-                        FROM courses AS c
-                        where c.course_name LIKE $1;
-                    """, course_name)
-                if course_name and catalog:
-                    total_pages = await conn.fetchrow("""
-                        SELECT
-                            c.course_picture,
-                            c.course_id,
-                            c.course_name,
-                            c.first_class_dtm,
-                            c.brief_description,
-                            c.classes_in_series,
-                            c.active,
-                            c.is_complete,
-                            c.create_dtm
-                        FROM courses AS c
-                        where c.course_name LIKE $1
-                        and c.is_complete = false
-                        and c.active = true
-                        and c.is_full = false
-                        and c.waitlist = true
-                        and c.registration_expiration_dtm > CURRENT_TIMESTAMP;
-                    """, course_name)
-                if course_bundle and not catalog:
-                    total_pages = await conn.fetchrow("""
-                        SELECT
-                        COUNT(*)
-                        FROM
-                            course_bundles cb
-                        JOIN
-                            bundled_courses bc ON cb.bundle_id = bc.bundle_id
-                        JOIN
-                            courses c ON bc.course_id = c.course_id
-                        where cb.bundle_name LIKE $1
-                        and cb.is_complete = false
-                        and cb.active = true
-                        and cb.is_full = false
-                        and cb.waitlist = true
-                        and cb.registration_expiration_dtm > CURRENT_TIMESTAMP
-                        GROUP BY
-                            cb.bundle_id, cb.bundle_name, cb.brief_description, cb.bundle_photo, cb.active, cb.is_complete
-                        ORDER BY
-                            cb.create_dtm DESC;
-                    """, course_bundle)
-                if course_bundle and catalog:
-                    total_pages = await conn.fetchrow("""
-                        SELECT
-                        cb.bundle_photo,
-                        cb.bundle_id,
-                        cb.bundle_name,
-                        cb.active,
-                        cb.is_complete,
-                        SUM(c.classes_in_series) AS total_classes,
-                        cb.create_dtm
-                        FROM
-                            course_bundles cb
-                        JOIN
-                            bundled_courses bc ON cb.bundle_id = bc.bundle_id
-                        JOIN
-                            courses c ON bc.course_id = c.course_id
-                        where cb.bundle_name LIKE $1
-                        GROUP BY
-                            cb.bundle_id, cb.bundle_name, cb.brief_description, cb.bundle_photo, cb.active, cb.is_complete
-                        ORDER BY
-                            cb.create_dtm DESC;
-                    """, course_bundle)
+            async with conn.transaction():
+                await conn.execute(f"SET LOCAL pg_trgm.word_similarity_threshold = {SEARCH_SIMILARITY};")
+                found_courses = await conn.fetch(query, *values)
+
+        for course in found_courses:
+            if course['course_type'] == "Course":
+                courses.append({
+                    "coursePicture": course['picture'],
+                    "courseId": course['id'],
+                    "courseName": course['name'],
+                    "startDate": datetime.datetime.strftime(course['first_class_dtm'], "%m/%d/%Y %-I:%M %p") if course['first_class_dtm'] else None,
+                    "briefDescription": course['brief_description'],
+                    "totalClasses": course['total_classes'],
+                    "courseType": "Course",
+                    "active": course['active'],
+                    "complete": course['is_complete'],
+                    "score": round(course['rank'], 3)
+                })
             else:
-                found_courses = await conn.fetch(query, value)
-            if found_courses:
-                if course_name:
-                    for course in found_courses:
-                        courses.append({
-                            "coursePicture": course['course_picture'],
-                            "courseId": course['course_id'],
-                            "courseName": course['course_name'],
-                            "startDate": datetime.datetime.strftime(course['first_class_dtm'], "%m/%d/%Y %-I:%M %p"),
-                            "briefDescription": course['brief_description'],
-                            "totalClasses": course['classes_in_series'],
-                            "courseType": "Course",
-                            "active": course['active'],
-                            "complete": course['is_complete']
-                        })
-
-                if course_bundle:
-                    for course in found_courses:
-                        courses.append({
-                            "bundlePicture": course['bundle_photo'],
-                            "bundleId": course['bundle_id'],
-                            "bundleName": course['bundle_name'],
-                            "active": course['active'],
-                            "complete": course['is_complete'],
-                            "totalClasses": course['total_classes'],
-                            "courseType": "Bundle"
-                        })
+                courses.append({
+                    "bundlePicture": course['picture'],
+                    "bundleId": course['id'],
+                    "bundleName": course['name'],
+                    "active": course['active'],
+                    "complete": course['is_complete'],
+                    "totalClasses": course['total_classes'],
+                    "courseType": "Bundle",
+                    "score": round(course['rank'], 3)
+                })
+
+        if found_courses and page and pageSize:
+            total_pages = math.ceil(found_courses[0]['total']/pageSize)
 
     except Exception:
         log.exception(
-            f"An error occured while getting courses related to {value}")
-
-    if total_pages:
-        total_pages = total_pages[0]/pageSize
+            f"An error occured while searching courses for {term}")
 
     return courses, int(total_pages)
 
 
-async def assign_course(course_id: str = None, students: list = None, instructors: list = None):
-    """Function to assign a course to students or instructors
+# enrolls every student in every course of the target in one statement. existing registrations are
+# skipped in sql and the seat flags of the courses and bundle are updated from the same snapshot
+BULK_ENROLL_QUERY = """
+    WITH input AS (
+        SELECT *
+        FROM unnest($2::text[], $3::text[], $4::text[], $5::boolean[], $6::boolean[], $7::text[])
+            AS s(user_id, registration_status, denial_reason, user_paid, user_paying_cash, notes)
+    ),
+    targets AS (
+        {targets}
+    ),
+    inserted AS (
+        INSERT INTO course_registration (
+            course_id,
+            user_id,
+            registration_status,
+            student_registration_date,
+            enroll_date,
+            denial_reason,
+            user_paid,
+            user_paying_cash,
+            notes
+        )
+        SELECT
+            t.course_id,
+            i.user_id,
+            i.registration_status,
+            $8::timestamp,
+            CASE WHEN i.registration_status = 'enrolled' THEN $8::timestamp END,
+            i.denial_reason,
+            i.user_paid,
+            i.user_paying_cash,
+            i.notes
+        FROM input i
+        JOIN users u ON u.user_id = i.user_id
+        CROSS JOIN targets t
+        WHERE NOT EXISTS (
+            SELECT 1 FROM course_registration cr
+            WHERE cr.course_id = t.course_id AND cr.user_id = i.user_id
+        )
+        ON CONFLICT DO NOTHING
+        RETURNING course_id, user_id, registration_status
+    ),
+    seats AS (
+        SELECT
+            course_id,
+            COUNT(*) FILTER (WHERE registration_status = 'enrolled') as enrolled,
+            COUNT(*) FILTER (WHERE registration_status = 'waitlist') as waitlisted
+        FROM (
+            SELECT cr.course_id, cr.registration_status
+            FROM course_registration cr
+            JOIN targets t ON t.course_id = cr.course_id
+            UNION ALL
+            SELECT course_id, registration_status FROM inserted
+        ) as registrations
+        GROUP BY course_id
+    ),
+    course_seats AS (
+        UPDATE courses c
+        SET
+            is_full = c.is_full OR COALESCE(s.enrolled >= c.max_students, false),
+            waitlist = c.waitlist AND NOT COALESCE(s.waitlisted >= c.waitlist_limit, false)
+        FROM seats s
+        WHERE c.course_id = s.course_id AND s.course_id IN (SELECT course_id FROM inserted)
+        RETURNING c.course_id
+    ){bundle_seats}
+    SELECT
+        i.user_id,
+        u.first_name,
+        u.last_name,
+        u.email,
+        u.phone_number,
+        u.text_notif,
+        u.email_notif,
+        ARRAY(SELECT ins.course_id FROM inserted ins WHERE ins.user_id = i.user_id) as registered
+    FROM input i
+    LEFT JOIN users u ON u.user_id = i.user_id;
+"""
+
+# every student of a bundle takes each of its courses, so the fullest course is how full the bundle is
+BULK_ENROLL_BUNDLE_SEATS = """,
+    bundle_seats AS (
+        UPDATE course_bundles b
+        SET
+            is_full = b.is_full OR COALESCE(s.enrolled >= b.max_students, false),
+            waitlist = b.waitlist AND NOT COALESCE(s.waitlisted >= b.waitlist_limit, false)
+        FROM (SELECT MAX(enrolled) as enrolled, MAX(waitlisted) as waitlisted FROM seats) s
+        WHERE b.bundle_id = $1 AND EXISTS (SELECT 1 FROM inserted)
+        RETURNING b.bundle_id
+    )"""
 
-    Args:
-        course_id (str, optional): Course Id to assign to user. Defaults to None.
-        students (list, optional): List of students to be assigned to course. Defaults to None.
-        instructors (list, optional): List of students to be assigned to course. Defaults to None.
 
-    Raises:
-        ValueError: If students and instructors are both provided
+def bundle_missing_prerequisites(missing: dict, course_ids: list) -> dict:
+    """Function to leave out the prerequisites a bundle itself covers from what students are missing
+
+    Args:
+        missing (dict): user id to course id to the prerequisites they have no certificate for
+        course_ids (list): courses of the bundle
 
     Returns:
-        boolean: True if it was assigned, false if it failed
+        dict: the same, with only prerequisites from outside the bundle, and only users still missing one
     """
-    query = None
-    value_type = None
-    values = None
+    bundled = set(course_ids)
+    outside = {}
+    for user_id, courses in missing.items():
+        for course_id, lacking in courses.items():
+            lacking = [prerequisite for prerequisite in lacking if prerequisite not in bundled]
+            if lacking:
+                outside.setdefault(user_id, {})[course_id] = lacking
+    return outside
 
-    if students and instructors:
-        raise ValueError(
-            "Can only assign one type of user to a course not both")
 
-    if students:
-        value_type = "students"
-        query = """
-            INSERT INTO course_registration (
-                course_id,
-                user_id,
-                registration_status,
-                student_registration_date,
-                enroll_date,
-                denial_reason,
-                user_paid,
-                user_paying_cash,
-                notes
-            )
-            VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9);
-        """
-        values = []
-        for student in students:
-            values.append((
-                course_id,
-                student.userId,
-                student.registrationStatus,
-                datetime.datetime.utcnow(),
-                datetime.datetime.utcnow() if student.registrationStatus == "enrolled" else None,
-                student.denialReason,
-                student.userPaid,
-                student.usingCash,
-                student.notes
-            ))
+async def bulk_enroll(students: list, course_id: str = None, bundle_id: str = None, check_prerequisites: bool = False) -> Union[list, None]:
+    """Function to enroll students in a course or every course of a bundle with a single statement
 
-    if instructors:
-        value_type = "instructors"
-        query = """
-            INSERT INTO course_instructor (
-                course_id,
-                user_id
-            )
-            VALUES ($1, $2);
-        """
-        values = []
-        for instructor in instructors:
-            values.append((
-                course_id,
-                instructor
-            ))
+    Args:
+        students (list): StudentPayloads of the students to enroll
+        course_id (str, optional): Course to enroll the students in. Defaults to None.
+        bundle_id (str, optional): Bundle to enroll the students in. Defaults to None.
+        check_prerequisites (bool, optional): Skip students missing a prerequisite of any course, prerequisites
+            that are courses of the bundle count as met. Defaults to False.
+
+    Returns:
+        Union[list, None]: result of each student with the user, the course ids they were registered for
+            and the prerequisites they are missing, None if it failed
+    """
+    # a student listed twice is only enrolled with their first payload
+    unique = {}
+    for student in students:
+        unique.setdefault(student.userId, student)
+    students = list(unique.values())
+
+    if bundle_id:
+        targets = "SELECT course_id FROM bundled_courses WHERE bundle_id = $1"
+    else:
+        targets = "SELECT course_id FROM courses WHERE course_id = $1"
 
     try:
+        missing = {}
+        if check_prerequisites and students:
+            course_ids = [course_id]
+            if bundle_id:
+                db_pool = await get_connection()
+                async with acquire_connection(db_pool) as conn:
+                    found = await conn.fetch(f"{targets};", bundle_id)
+                course_ids = [row['course_id'] for row in found]
+
+            missing = await missing_prerequisites([
+                (student.userId, target)
+                for student in students
+                for target in course_ids
+            ])
+            if bundle_id:
+                # a bundle is taken as a whole, so a course of it can require another course of it
+                missing = bundle_missing_prerequisites(missing, course_ids)
+
+        enrolling = [student for student in students if student.userId not in missing]
         db_pool = await get_connection()
         async with acquire_connection(db_pool) as conn:
-            await conn.executemany(query, values)
-        return True
+            found = await conn.fetch(
+                BULK_ENROLL_QUERY.format(
+                    targets=targets,
+                    bundle_seats=BULK_ENROLL_BUNDLE_SEATS if bundle_id else ""
+                ),
+                bundle_id or course_id,
+                [student.userId for student in enrolling],
+                [student.registrationStatus for student in enrolling],
+                [student.denialReason for student in enrolling],
+                [student.userPaid for student in enrolling],
+                [student.usingCash for student in enrolling],
+                [student.notes for student in enrolling],
+                datetime.datetime.utcnow()
+            )
+
+        enrolled = {row['user_id']: row for row in found}
+        results = []
+        for student in students:
+            row = enrolled.get(student.userId)
+            user = None
+            if row and row['first_name'] is not None:
+                user = global_models.User(
+                    userId=row['user_id'],
+                    firstName=row['first_name'],
+                    lastName=row['last_name'],
+                    email=row['email'],
+                    phoneNumber=row['phone_number'],
+                    textNotifications=row['text_notif'],
+                    emailNotifications=row['email_notif']
+                )
+            results.append({
+                "userId": student.userId,
+                "user": user,
+                "registered": list(row['registered']) if row else [],
+                "missingPrerequisites": missing.get(student.userId, {})
+            })
+        return results
 
     except Exception:
         log.exception(
-            f"An error occured while assigning {value_type} to course_id {course_id}")
-    return False
+            f"An error occured while enrolling {len(students)} students in {'bundle' if bundle_id else 'course'} {bundle_id or course_id}")
+
+    return None
 
 
-async def assign_bundle(bundle_id: str = None, students: list = None):
+async def assign_course(course_id: str = None, students: list = None, instructors: list = None):
     """Function to assign a course to students or instructors
 
     Args:
-        bundle_id (str, optional): Bundle Id to assign to user. Defaults to None.
+        course_id (str, optional): Course Id to assign to user. Defaults to None.
         students (list, optional): List of students to be assigned to course. Defaults to None.
         instructors (list, optional): List of students to be assigned to course. Defaults to None.
 
@@ -1070,48 +1063,26 @@ async def assign_bundle(bundle_id: str = None, students: list = None):
     Returns:
         boolean: True if it was assigned, false if it failed
     """
-    query = None
-    value_type = None
-    values = None
-
-    bundle, _ = await get_bundle(bundle_id=bundle_id)
-    if not bundle[0]:
-        return "user", "Bundle does not exist"
-
-    bundled_courses = []
-    for course in bundle["courses"]:
-        bundled_courses.append(course["courseId"])
+    if students and instructors:
+        raise ValueError(
+            "Can only assign one type of user to a course not both")
 
     if students:
-        value_type = "students"
-        query = """
-            INSERT INTO course_registration (
-                course_id,
-                user_id,
-                registration_status,
-                student_registration_date,
-                enroll_date,
-                denial_reason,
-                user_paid,
-                user_paying_cash,
-                notes
-            )
-            VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9);
-        """
-        values = []
-        for student in students:
-            for course_id in bundled_courses:
-                values.append((
-                    course_id,
-                    student.userId,
-                    student.registrationStatus,
-                    datetime.datetime.utcnow(),
-                    datetime.datetime.utcnow() if student.registrationStatus == "enrolled" else None,
-                    student.denialReason,
-                    student.userPaid,
-                    student.usingCash,
-                    student.notes
-                ))
+        return await bulk_enroll(students=students, course_id=course_id) is not None
+
+    query = """
+        INSERT INTO course_instructor (
+            course_id,
+            user_id
+        )
+        VALUES ($1, $2);
+    """
+    values = []
+    for instructor in instructors or []:
+        values.append((
+            course_id,
+            instructor
+        ))
 
     try:
         db_pool = await get_connection()
@@ -1121,7 +1092,7 @@ async def assign_bundle(bundle_id: str = None, students: list = None):
 
     except Exception:
         log.exception(
-            f"An error occured while assigning {value_type} to course_id {course_id}")
+            f"An error occured while assigning instructors to course_id {course_id}")
     return False
 
 
@@ -1191,6 +1162,9 @@ async def delete_course(course_id: str = None) -> bool:
         async with acquire_connection(db_pool) as conn:
             for query in queries:
                 await conn.execute(query, course_id)
+
+        forget_entity("course", course_id)
+        invalidate_prerequisites()
         return True
 
     except Exception:
@@ -1276,6 +1250,12 @@ async def update_course(content: course_update.UpdateCourseInput):
                 for prerequisite in prerequisitesValues:
                     await conn.execute(prerequisites_update_query, prerequisite[0])
                     await conn.execute(prerequisites_update_query_1, *prerequisite)
+
+        if prerequisites:
+            invalidate_prerequisites()
+        if "course_name" in course or "course_code" in course:
+            await refresh_entity("course", course_id)
+            await invalidate_related_artifacts(course_id=course_id)
         return True
 
     except Exception:
@@ -1515,6 +1495,9 @@ async def update_bundle(content: bundle_update.UpdateBundleInput):
                 for value in courseValues:
                     await conn.execute(courses_update_query_1, value[0])
                     await conn.execute(courses_update_query, *value)
+
+        if "bundle_name" in bundle:
+            await refresh_entity("bundle", bundle_id)
         return True
 
     except Exception:
@@ -1744,6 +1727,7 @@ async def create_course(
             if not assigned:
                 raise ValueError("Unable to assign instructors to course")
 
+        await refresh_entity("course", course_id)
         return True
 
     except Exception:
@@ -1848,6 +1832,7 @@ async def create_bundle(content: bundle.Input, bundle_id: str, user_id: str, is_
             if values:
                 await conn.executemany(courses_query, values)
 
+        await refresh_entity("bundle", bundle_id)
         return True
 
     except Exception:
@@ -2013,120 +1998,133 @@ async def get_bundle(bundle_id: str) -> tuple:
     return (None, None)
 
 
-async def get_total_course_schedule(start_date: str = None, end_date: str = None, page: int = None, pageSize: int = None) -> list:
+def schedule_range(start_date: datetime.datetime = None, end_date: datetime.datetime = None):
+    conditions = []
+    values = []
+    # classes are stored as utc without a timezone
+    if start_date:
+        values.append(start_date.astimezone(datetime.timezone.utc).replace(tzinfo=None))
+        conditions.append(f"cd.start_dtm >= ${len(values)}")
+    if end_date:
+        values.append(end_date.astimezone(datetime.timezone.utc).replace(tzinfo=None))
+        conditions.append(f"cd.start_dtm < ${len(values)}")
+
+    return f"WHERE {' AND '.join(conditions)}" if conditions else "", values
+
+
+async def get_total_course_schedule(
+    start_date: datetime.datetime = None,
+    end_date: datetime.datetime = None,
+    page: int = None,
+    pageSize: int = None
+) -> list:
     """Function to get complete course schedule for all courses
 
     Args:
-        start_date (str, optional): date to start search at. Defaults to None.
-        end_date (str, optional): date to end search at. Defaults to None.
+        start_date (datetime.datetime, optional): classes starting at or after this time. Defaults to None.
+        end_date (datetime.datetime, optional): classes starting before this time. Defaults to None.
+        page (int, optional): page to get. Defaults to None.
+        pageSize (int, optional): classes per page. Defaults to None.
 
     Returns:
         list: List of classes in schedule
     """
-    where_condition = None
     schedule = []
-    conditions = []
-    query = """
-        select
+    where_condition, values = schedule_range(start_date, end_date)
+    paging = ""
+    if page and pageSize:
+        paging = f"LIMIT ${len(values) + 1} OFFSET ${len(values) + 2}"
+        values.extend([pageSize, (page-1)*pageSize])
+
+    # the range is read off the start_dtm index so only classes in view are touched
+    query = f"""
+        SELECT
             cd.course_id,
             c.course_name,
             cd.start_dtm,
             cd.end_dtm,
             cd.series_number,
-            cd.is_complete
+            cd.is_complete,
+            COUNT(*) OVER() AS total
         FROM course_dates cd
         JOIN courses c
         on c.course_id = cd.course_id
-        ORDER BY start_dtm ASC;
+        {where_condition}
+        ORDER BY cd.start_dtm ASC
+        {paging};
     """
+    total_pages = 0
+    try:
+        db_pool = await get_connection()
+        async with acquire_connection(db_pool) as conn:
+            found = await conn.fetch(query, *values)
 
-    if page and pageSize:
-        query = """
-            select
-                cd.course_id,
-                c.course_name,
-                cd.start_dtm,
-                cd.end_dtm,
-                cd.series_number,
-                cd.is_complete
-            FROM course_dates cd
-            JOIN courses c
-            on c.course_id = cd.course_id
-            ORDER BY start_dtm ASC
-            LIMIT $1 OFFSET $2;
-        """
-    # TODO: fill these out
-    if start_date:
-        conditions.append("")
+        for event in found:
+            schedule.append({
+                "courseId": event['course_id'],
+                "courseName": event['course_name'],
+                "startTime": event['start_dtm'].strftime("%m/%d/%Y %-I:%M %p"),
+                "duration": (event['end_dtm'] - event['start_dtm']).total_seconds() // 60,
+                "seriesNumber": event['series_number'],
+                "complete": event['is_complete']
+            })
 
-    if end_date:
-        conditions.append("")
+        if found and page and pageSize:
+            total_pages = math.ceil(found[0]['total']/pageSize)
 
-    if conditions:
-        where_condition = " AND ".join(conditions)
-        query = """
-            select
-                cd.course_id,
-                c.course_name,
-                cd.start_dtm,
-                c.duration,
-                cd.series_number,
-                cd.is_complete
-            FROM course_dates cd
-            JOIN courses c
-            on c.course_id = cd.course_id
-            WHERE {}
-            ORDER BY start_dtm ASC;
-        """.format(where_condition)
+    except Exception:
+        log.exception("An error occured while getting course schedule")
 
-        if page and pageSize:
-            query = """
-                select
-                    cd.course_id,
-                    c.course_name,
-                    cd.start_dtm,
-                    c.duration,
-                    cd.series_number,
-                    cd.is_complete
-                FROM course_dates cd
-                JOIN courses c
-                on c.course_id = cd.course_id
-                WHERE {}
-                ORDER BY start_dtm ASC
-                LIMIT $1 OFFSET $2;
-            """.format(where_condition)
-    total_pages = 0
+    return schedule, int(total_pages)
+
+
+async def get_schedule_counts(
+    start_date: datetime.datetime = None,
+    end_date: datetime.datetime = None,
+    group_by: str = "day"
+) -> Union[list, None]:
+    """Function to count classes per day or week
+
+    Args:
+        start_date (datetime.datetime, optional): classes starting at or after this time. Defaults to None.
+        end_date (datetime.datetime, optional): classes starting before this time. Defaults to None.
+        group_by (str, optional): day or week. Defaults to "day".
+
+    Returns:
+        Union[list, None]: amount of classes per period in local time, None if failed
+    """
+    if group_by not in ["day", "week"]:
+        raise ValueError(f"Unable to group schedule by {group_by}")
+
+    where_condition, values = schedule_range(start_date, end_date)
+    values.append(group_by)
+    # classes are stored in utc, periods are counted in the time the classes are held in
+    query = f"""
+        SELECT
+            date_trunc(${len(values)}, (cd.start_dtm AT TIME ZONE 'UTC') AT TIME ZONE 'America/New_York') AS period,
+            COUNT(*) AS classes
+        FROM course_dates cd
+        {where_condition}
+        GROUP BY period
+        ORDER BY period ASC;
+    """
     try:
         db_pool = await get_connection()
         async with acquire_connection(db_pool) as conn:
-            if page and pageSize:
-                found = await conn.fetch(query, pageSize, (page-1)*pageSize)
-                total_pages = await conn.fetchrow("""
-                    select
-                        COUNT(*)
-                    FROM course_dates cd
-                    JOIN courses c
-                    on c.course_id = cd.course_id;
-                """)
-            else:
-                found = await conn.fetch(query)
-            if found:
-                for event in found:
-                    schedule.append({
-                        "courseId": event['course_id'],
-                        "courseName": event['course_name'],
-                        "startTime": event['start_dtm'].strftime("%m/%d/%Y %-I:%M %p"),
-                        "duration": (event['end_dtm'] - event['start_dtm']).total_seconds() // 60,
-                        "seriesNumber": event['series_number'],
-                        "complete": event['is_complete']
-                    })
+            found = await conn.fetch(query, *values)
+
+        return [
+            {
+                "period": count['period'].strftime("%m/%d/%Y"),
+                "classes": count['classes']
+            }
+            for count in found
+        ]
 
     except Exception:
-        log.exception("An error occured while creating course")
+        log.exception("An error occured while counting course schedule")
 
-    if total_pages:
-        total_pages = total_pages[0]/pageSize
-    return schedule, int(total_pages)
+    return None
 
 
 async def get_content(
@@ -2210,7 +2208,7 @@ async def find_class_time(course_id: str, series_number: int):
             course_id,
             series_number,
             start_dtm,
-            end_dtm,
+            end_dtm
         FROM course_dates
         WHERE course_id = $1
         AND series_number = $2
@@ -2234,6 +2232,11 @@ async def find_class_time(course_id: str, series_number: int):
     return found
 
 
+def utc_naive(dtm: datetime.datetime) -> datetime.datetime:
+    # class times are stored as utc without a timezone
+    return dtm.astimezone(pytz.utc).replace(tzinfo=None) if dtm.tzinfo else dtm
+
+
 async def update_schedule(new_class: dict):
     """Function to update a schedule
 
@@ -2254,8 +2257,8 @@ async def update_schedule(new_class: dict):
         async with acquire_connection(db_pool) as conn:
             await conn.execute(
                 query,
-                new_class["start_dtm"].replace(tzinfo=None),
-                new_class["end_dtm"].replace(tzinfo=None),
+                utc_naive(new_class["start_dtm"]),
+                utc_naive(new_class["end_dtm"]),
                 new_class["course_id"],
                 new_class["series_number"]
             )
@@ -2267,31 +2270,179 @@ async def update_schedule(new_class: dict):
     return False
 
 
-async def validate_prerequisites(course: dict, user_id: str):
-    if len(course["prerequisites"]) <= 0:
-        return True
+async def get_course_sessions(course_ids: list) -> Union[list, None]:
+    """Function to get every scheduled class of many courses in one query
 
-    prerequisite_course_ids = [prerequisite['courseId']
-                               for prerequisite in course['prerequisites']]
+    Args:
+        course_ids (list): ids of the courses
 
+    Returns:
+        Union[list, None]: classes of the courses, courses without classes have no start_dtm or end_dtm, None if failed
+    """
     query = """
-    SELECT COUNT(*)
-    FROM
-        user_certificates
-    WHERE
-        user_id = $1 AND course_id IN ({})
-    """.format(', '.join(['$' + str(i + 2) for i in range(len(prerequisite_course_ids))]))
+        SELECT
+            c.course_id,
+            c.course_name,
+            cd.series_number,
+            cd.start_dtm,
+            cd.end_dtm
+        FROM courses c
+        LEFT JOIN course_dates cd
+        ON cd.course_id = c.course_id
+        WHERE c.course_id = ANY($1);
+    """
+    try:
+        db_pool = await get_connection()
+        async with acquire_connection(db_pool) as conn:
+            found = await conn.fetch(query, course_ids)
+
+        return [
+            {
+                "courseId": session["course_id"],
+                "courseName": session["course_name"],
+                "seriesNumber": session["series_number"],
+                "start_dtm": session["start_dtm"],
+                "end_dtm": session["end_dtm"]
+            }
+            for session in found
+        ]
+
+    except Exception:
+        log.exception("An error occured while getting course sessions")
 
-    count = None
+    return None
+
+
+def session_output(session: dict) -> dict:
+    return {
+        "courseId": session["courseId"],
+        "courseName": session["courseName"],
+        "seriesNumber": session["seriesNumber"],
+        "startTime": session["start_dtm"].strftime("%m/%d/%Y %-I:%M %p"),
+        "endTime": session["end_dtm"].strftime("%m/%d/%Y %-I:%M %p")
+    }
+
+
+async def find_instructor_conflicts(course_id: str, instructor_ids: list = None, new_class: dict = None) -> Union[list, None]:
+    """Function to find upcoming classes of a course that an instructor is already teaching another course at
+
+    Args:
+        course_id (str): id of the course the instructors teach
+        instructor_ids (list, optional): instructors to check, defaults to the instructors of the course. Defaults to None.
+        new_class (dict, optional): class about to replace the class of the course with the same series_number. Defaults to None.
+
+    Returns:
+        Union[list, None]: conflicting classes, empty if there are none, None if failed
+    """
+    now = datetime.datetime.utcnow()
+    if instructor_ids:
+        instructor_query = "ci.user_id = ANY($3)"
+        values = [course_id, now, instructor_ids]
+    else:
+        instructor_query = "ci.user_id IN (SELECT user_id FROM course_instructor WHERE course_id = $1)"
+        values = [course_id, now]
+
+    course_query = """
+        SELECT
+            c.course_id,
+            c.course_name,
+            cd.series_number,
+            cd.start_dtm,
+            cd.end_dtm,
+            cd.is_complete
+        FROM courses c
+        JOIN course_dates cd
+        ON cd.course_id = c.course_id
+        WHERE c.course_id = $1;
+    """
+    query = f"""
+        SELECT
+            ci.user_id,
+            c.course_id,
+            c.course_name,
+            cd.series_number,
+            cd.start_dtm,
+            cd.end_dtm
+        FROM course_instructor ci
+        JOIN courses c
+        ON c.course_id = ci.course_id
+        JOIN course_dates cd
+        ON cd.course_id = ci.course_id
+        WHERE {instructor_query}
+        AND ci.course_id <> $1
+        AND cd.is_complete = false
+        AND cd.end_dtm > $2;
+    """
     try:
         db_pool = await get_connection()
         async with acquire_connection(db_pool) as conn:
-            count = await conn.fetchrow(query, user_id, *prerequisite_course_ids)
+            classes = await conn.fetch(course_query, course_id)
+            found = await conn.fetch(query, *values)
+
+        course_sessions = []
+        for found_class in classes:
+            session = {
+                "courseId": found_class["course_id"],
+                "courseName": found_class["course_name"],
+                "seriesNumber": found_class["series_number"],
+                "start_dtm": found_class["start_dtm"],
+                "end_dtm": found_class["end_dtm"]
+            }
+            if new_class and found_class["series_number"] == new_class["series_number"]:
+                session["start_dtm"] = utc_naive(new_class["start_dtm"])
+                session["end_dtm"] = utc_naive(new_class["end_dtm"])
+            # classes that are over can not be double booked anymore
+            if found_class["is_complete"] or not session["end_dtm"] or session["end_dtm"] <= now:
+                continue
+            course_sessions.append(session)
+
+        if not course_sessions:
+            return []
+
+        teaching = {instructor_id: [] for instructor_id in instructor_ids or []}
+        for session in found:
+            teaching.setdefault(session["user_id"], []).append({
+                "courseId": session["course_id"],
+                "courseName": session["course_name"],
+                "seriesNumber": session["series_number"],
+                "start_dtm": session["start_dtm"],
+                "end_dtm": session["end_dtm"]
+            })
+
+        conflicts = []
+        for instructor_id, sessions in teaching.items():
+            for first, second in find_overlaps(sessions + course_sessions):
+                # only a class of this course against a class of another course is a double booking
+                if (first["courseId"] == course_id) == (second["courseId"] == course_id):
+                    continue
+                session, other = (first, second) if first["courseId"] == course_id else (second, first)
+                conflicts.append({
+                    "instructorId": instructor_id,
+                    **session_output(session),
+                    "conflictsWith": session_output(other)
+                })
+
+        return conflicts
 
-        if count and count != len(prerequisite_course_ids):
-            return False
+    except Exception:
+        log.exception(f"An error occured while checking instructor conflicts for course {course_id}")
 
-        return True
+    return None
+
+
+async def validate_prerequisites(course: dict, user_id: str) -> bool:
+    """Function to check if a user has completed every prerequisite of a course, including their prerequisites
+
+    Args:
+        course (dict): course with its courseId
+        user_id (str): user wanting to enroll
+
+    Returns:
+        bool: true if nothing is missing
+    """
+    try:
+        missing = await missing_prerequisites([(user_id, course["courseId"])])
+        return not missing
 
     except Exception:
         log.exception(
@@ -2537,6 +2688,8 @@ async def delete_bundle(bundle_id: str) -> bool:
         async with acquire_connection(db_pool) as conn:
             for query in queries:
                 await conn.execute(query, bundle_id)
+
+        forget_entity("bundle", bundle_id)
         return True
     except Exception:
         log.exception(f"Failed to delete bundle {bundle_id}")
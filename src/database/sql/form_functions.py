@@ -1,11 +1,18 @@
+import json
 import datetime
 from typing import List, Union, Tuple
 import asyncpg
 
-from src import log
+from src import log, redis_client
 from src.database.sql import get_connection, acquire_connection
 from src.api.api_models.forms.list_forms import Form
 
+FORM_CACHE_EXPIRY = 60 * 60
+
+
+def form_cache_key(form_id: str) -> str:
+    return f"form_{form_id}"
+
 
 async def submit_form(content: dict):
     """Function to create a form
@@ -75,6 +82,7 @@ async def update_form_postgres(content: dict):
         db_pool = await get_connection()
         async with acquire_connection(db_pool) as conn:
             await conn.execute(update_query, form_id, *query_values)
+        redis_client.delete_key(form_cache_key(form_id))
         return True
     except Exception:
         log.exception(
@@ -196,18 +204,25 @@ async def get_form(form_type: str = None, form_id: str = None) -> Union[Form, No
     """
 
     try:
+        cached = redis_client.get_key(form_cache_key(form_id))
+        if cached:
+            form = json.loads(cached)
+            return form if form["formType"] == form_type else None
+
         db_pool = await get_connection()
         async with acquire_connection(db_pool) as conn:
             form = await conn.fetchrow(query, form_type, form_id)
             if not form:
                 return None
 
-        return {
+        form = {
             "formId": form['form_id'],
             "formName": form['form_name'],
             "formType": form['form_type'],
             "active": form['active']
         }
+        redis_client.set_key(form_cache_key(form_id), json.dumps(form), FORM_CACHE_EXPIRY)
+        return form
 
     except Exception:
         log.exception("An error occured while getting forms")
@@ -226,41 +241,29 @@ async def is_form_related(course_id: str, form_id: str, user_id: str) -> Union[T
     Returns:
         Union[Tuple[bool, bool, int], None]: returns tuple with bools for each option, related, user is in course and int for total attempts
     """
-    related_query = """
-        SELECT
-            *
-        FROM course_forms
-        where course_id = $1 AND form_id = $2;
-    """
-
-    user_in_course_query = """
-        SELECT
-            *
-        FROM course_registration
-        where course_id = $1 AND user_id = $2 AND registration_status = 'enrolled';
-    """
-
-    user_form_attempts = """
+    query = """
         SELECT
-            fs.*
-        FROM course_forms cf
-        JOIN form_submissions fs
-        ON cf.form_id = fs.form_id
-        where cf.course_id = $1 AND cf.form_id = $2 and fs.user_id = $3;
+            EXISTS (
+                SELECT 1 FROM course_forms
+                WHERE course_id = $1 AND form_id = $2
+            ) AS related,
+            EXISTS (
+                SELECT 1 FROM course_registration
+                WHERE course_id = $1 AND user_id = $3 AND registration_status = 'enrolled'
+            ) AS enrolled,
+            (
+                SELECT COUNT(*) FROM form_submissions
+                WHERE form_id = $2 AND user_id = $3
+            ) AS attempt_count;
     """
     try:
         db_pool = await get_connection()
         async with acquire_connection(db_pool) as conn:
-            related = await conn.fetchrow(related_query, course_id, form_id)
-            if not related:
-                return (False, False, None)
-
-            user_check = await conn.fetchrow(user_in_course_query, course_id, user_id)
-            if not user_check:
-                return (True, False, None)
+            found = await conn.fetchrow(query, course_id, form_id, user_id)
 
-            user_attempts = await conn.fetchall(user_form_attempts, course_id, form_id, user_id)
-            return (True, True, len(user_attempts) if user_attempts else None)
+        if not found["related"]:
+            return (False, False, 0)
+        return (True, found["enrolled"], found["attempt_count"])
 
     except Exception:
         log.exception("An error occured while getting forms")
@@ -319,6 +322,41 @@ async def submit_quiz_submission(
     return False
 
 
+async def update_quiz_submission_scores(scores: List[tuple]) -> bool:
+    """Function to update the scores of already graded quiz submissions
+
+    Args:
+        scores (List[tuple]): list of (response_id, passing, score, possible_score)
+
+    Returns:
+        bool: True if updated, false if failed
+    """
+
+    query = """
+        UPDATE form_submissions
+        SET
+            passing = $2,
+            score = $3,
+            possible_score = $4,
+            modify_dtm = $5
+        WHERE response_id = $1;
+    """
+
+    if not scores:
+        return True
+
+    try:
+        modify_dtm = datetime.datetime.utcnow()
+        db_pool = await get_connection()
+        async with acquire_connection(db_pool) as conn:
+            await conn.executemany(query, [(*score, modify_dtm) for score in scores])
+        return True
+
+    except Exception:
+        log.exception("An error occured while updating quiz submission scores")
+    return False
+
+
 async def submit_survey_submission(
     response_id: str,
     user_id: str,
@@ -0,0 +1,418 @@
+import asyncio
+import datetime
+import json
+import os
+import re
+import sys
+from typing import List
+
+from src import log
+from src.database.sql import get_connection, acquire_connection
+
+# the tables themselves were created by hand before migrations existed, version 1 is the
+# baseline every database is expected to have and everything after it is owned here.
+# indexes are built concurrently so migrating never blocks writes, which means statements
+# run one at a time outside of a transaction and must be safe to run again
+# migrations run as their own deploy step (the migrate service), never from api workers.
+# a migration with blocked_by is opt in, it is skipped while that query returns true and the ones
+# after it are still applied, it is applied by the first run after whatever blocks it is resolved
+MIGRATIONS = [
+    {
+        "version": 1,
+        "name": "search and schedule indexes",
+        "statements": [
+            "CREATE EXTENSION IF NOT EXISTS pg_trgm;",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS course_dates_start_dtm_idx ON course_dates (start_dtm);",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS course_dates_course_id_start_dtm_idx ON course_dates (course_id, start_dtm);",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS course_instructor_user_id_idx ON course_instructor (user_id);",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS course_registration_user_id_idx ON course_registration (user_id);",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS courses_course_name_trgm_idx ON courses USING gin (course_name gin_trgm_ops);",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS courses_course_code_trgm_idx ON courses USING gin (course_code gin_trgm_ops);",
+            """CREATE INDEX CONCURRENTLY IF NOT EXISTS courses_search_idx ON courses USING gin (
+                to_tsvector('english', coalesce(course_name, '') || ' ' || coalesce(course_code, '') || ' ' || coalesce(brief_description, ''))
+            );""",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS course_bundles_bundle_name_trgm_idx ON course_bundles USING gin (bundle_name gin_trgm_ops);",
+            """CREATE INDEX CONCURRENTLY IF NOT EXISTS course_bundles_search_idx ON course_bundles USING gin (
+                to_tsvector('english', coalesce(bundle_name, '') || ' ' || coalesce(brief_description, ''))
+            );""",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS users_last_first_name_idx ON users (lower(last_name) text_pattern_ops, lower(first_name) text_pattern_ops);",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS users_first_name_idx ON users (lower(first_name) text_pattern_ops);",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS users_first_name_trgm_idx ON users USING gin (lower(first_name) gin_trgm_ops);",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS users_last_name_trgm_idx ON users USING gin (lower(last_name) gin_trgm_ops);",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS users_phone_number_trgm_idx ON users USING gin (regexp_replace(phone_number, '\\D', '', 'g') gin_trgm_ops);",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS users_other_id_idx ON users (other_id);",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS user_role_role_id_user_id_idx ON user_role (role_id, user_id);"
+        ]
+    },
+    {
+        "version": 2,
+        "name": "lookup indexes for enrollment, roles, certificates and audit log",
+        "statements": [
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS course_registration_course_user_status_idx ON course_registration (course_id, user_id, registration_status);",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS course_dates_course_id_series_number_idx ON course_dates (course_id, series_number);",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS user_role_user_id_idx ON user_role (user_id);",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS user_certificates_user_id_completion_date_idx ON user_certificates (user_id, completion_date);",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS users_email_idx ON users (email);",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS users_phone_number_idx ON users (phone_number);",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS audit_log_create_dtm_idx ON audit_log (create_dtm);"
+        ]
+    },
+    {
+        "version": 3,
+        "name": "certificates by instructor and course",
+        "statements": [
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS user_certificates_instructor_id_idx ON user_certificates (instructor_id);",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS user_certificates_course_id_idx ON user_certificates (course_id);"
+        ]
+    },
+    {
+        "version": 4,
+        "name": "unique certificate numbers",
+        "statements": [
+            "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS user_certificates_certificate_number_idx ON user_certificates (certificate_number);"
+        ]
+    },
+    {
+        "version": 5,
+        "name": "certificate expiry notices",
+        "statements": [
+            """CREATE TABLE IF NOT EXISTS certificate_expiry_notices (
+                certificate_number TEXT NOT NULL,
+                window_days INTEGER NOT NULL,
+                sent_dtm TIMESTAMP NOT NULL,
+                PRIMARY KEY (certificate_number, window_days)
+            );""",
+            # most certificates never expire, only the ones that do are indexed
+            """CREATE INDEX CONCURRENTLY IF NOT EXISTS user_certificates_expiration_date_idx ON user_certificates (expiration_date)
+                WHERE expiration_date IS NOT NULL;"""
+        ]
+    },
+    {
+        "version": 6,
+        "name": "prerequisites by course",
+        "statements": [
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS prerequisites_course_id_idx ON prerequisites (course_id, prerequisite);",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS user_certificates_user_id_course_id_idx ON user_certificates (user_id, course_id);"
+        ]
+    },
+    {
+        "version": 7,
+        "name": "one registration per student and course",
+        # enrollment used to insert blindly and duplicates hold enrollment and payment records, so they are
+        # never removed here. this waits until they are reviewed with `registrations` and removed with
+        # `registrations --apply`, until then bulk enrollment relies on its NOT EXISTS alone
+        "blocked_by": "SELECT EXISTS (SELECT 1 FROM course_registration GROUP BY course_id, user_id HAVING COUNT(*) > 1);",
+        "blocked_reason": "course_registration has duplicate registrations, run python -m src.database.sql.migrations registrations",
+        "statements": [
+            "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS course_registration_course_id_user_id_idx ON course_registration (course_id, user_id);"
+        ]
+    },
+    {
+        "version": 8,
+        "name": "daily digest preference",
+        "statements": [
+            "ALTER TABLE users ADD COLUMN IF NOT EXISTS digest_notif BOOLEAN NOT NULL DEFAULT false;"
+        ]
+    }
+]
+
+# the registration of a student in a course that is kept when duplicates are removed, enrolled over
+# pending over waitlisted, then paid, then the earliest
+DUPLICATE_REGISTRATIONS_QUERY = """
+    SELECT
+        ctid,
+        course_id,
+        user_id,
+        registration_status,
+        user_paid,
+        user_paying_cash,
+        student_registration_date,
+        notes,
+        ROW_NUMBER() OVER (
+            PARTITION BY course_id, user_id
+            ORDER BY
+                CASE registration_status
+                    WHEN 'enrolled' THEN 0
+                    WHEN 'pending' THEN 1
+                    WHEN 'waitlist' THEN 2
+                    ELSE 3
+                END,
+                user_paid DESC NULLS LAST,
+                user_paying_cash DESC NULLS LAST,
+                student_registration_date NULLS LAST,
+                ctid
+        ) as registration
+    FROM course_registration
+    WHERE (course_id, user_id) IN (
+        SELECT course_id, user_id FROM course_registration GROUP BY course_id, user_id HAVING COUNT(*) > 1
+    )
+    ORDER BY course_id, user_id, registration
+"""
+
+# any number works as long as nothing else takes the same advisory lock
+MIGRATION_LOCK = 4301
+INDEX_NAME = re.compile(r"CREATE (?:UNIQUE )?INDEX CONCURRENTLY IF NOT EXISTS (\w+)", re.IGNORECASE)
+
+# queries run on most requests, each must be able to use an index once its tables are large
+HOT_QUERIES = [
+    {
+        "name": "enrollment of a student in a course",
+        "query": "SELECT 1 FROM course_registration WHERE course_id = $1 AND user_id = $2 AND registration_status = $3;",
+        "args": ["", "", "enrolled"]
+    },
+    {
+        "name": "courses of a student",
+        "query": "SELECT course_id FROM course_registration WHERE user_id = $1;",
+        "args": [""]
+    },
+    {
+        "name": "courses of an instructor",
+        "query": "SELECT course_id FROM course_instructor WHERE user_id = $1;",
+        "args": [""]
+    },
+    {
+        "name": "class of a course",
+        "query": "SELECT start_dtm, end_dtm FROM course_dates WHERE course_id = $1 AND series_number = $2;",
+        "args": ["", 1]
+    },
+    {
+        "name": "schedule in a date range",
+        "query": "SELECT course_id FROM course_dates WHERE start_dtm >= $1 AND start_dtm < $2 ORDER BY start_dtm LIMIT 50;",
+        "args": [datetime.datetime(2000, 1, 1), datetime.datetime(2000, 1, 8)]
+    },
+    {
+        "name": "roles of a user",
+        "query": "SELECT role_id FROM user_role WHERE user_id = $1;",
+        "args": [""]
+    },
+    {
+        "name": "certificates of a user",
+        "query": "SELECT certificate_number FROM user_certificates WHERE user_id = $1 ORDER BY completion_date;",
+        "args": [""]
+    },
+    {
+        "name": "certificate by number",
+        "query": "SELECT user_id FROM user_certificates WHERE certificate_number = $1;",
+        "args": [""]
+    },
+    {
+        "name": "certificates expiring soon",
+        "query": "SELECT certificate_number FROM user_certificates WHERE expiration_date IS NOT NULL AND expiration_date > $1 AND expiration_date <= $2;",
+        "args": [datetime.datetime(2000, 1, 1), datetime.datetime(2000, 4, 1)]
+    },
+    {
+        "name": "user by email",
+        "query": "SELECT user_id FROM users WHERE email = $1;",
+        "args": [""]
+    },
+    {
+        "name": "user by phone number",
+        "query": "SELECT user_id FROM users WHERE phone_number = $1;",
+        "args": [""]
+    },
+    {
+        "name": "latest audit records",
+        "query": "SELECT audit_id FROM audit_log WHERE create_dtm >= $1 ORDER BY create_dtm DESC LIMIT 50;",
+        "args": [datetime.datetime(2000, 1, 1)]
+    }
+]
+# tables estimated to have fewer rows than this are cheaper to scan than to read through an index
+LARGE_TABLE_ROWS = int(os.getenv("MIGRATIONS_LARGE_TABLE_ROWS", 10000))
+
+
+async def drop_invalid_indexes(conn, statements: List[str]):
+    """Function to drop indexes left invalid by a concurrent build that failed
+
+    IF NOT EXISTS would otherwise skip them and the migration would never build them again.
+
+    Args:
+        conn (asyncpg.Connection): connection to run on
+        statements (List[str]): statements of the migration about to run
+    """
+    names = [match.group(1) for match in (INDEX_NAME.search(statement) for statement in statements) if match]
+    if not names:
+        return
+
+    invalid = await conn.fetch("""
+        SELECT c.relname
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE NOT i.indisvalid AND c.relname = ANY($1::text[])
+          AND pg_catalog.pg_table_is_visible(c.oid);
+    """, names)
+    for index in invalid:
+        log.warning(f"Dropping invalid index {index['relname']} to build it again")
+        await conn.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{index["relname"]}";')
+
+
+async def run_migrations(target: int = None) -> bool:
+    """Function to apply every migration that has not been applied yet, in order
+
+    Args:
+        target (int, optional): version to stop at, the latest if not given. Defaults to None.
+
+    Returns:
+        bool: true if the database is at the target version, apart from blocked migrations
+    """
+    try:
+        db_pool = await get_connection()
+        async with acquire_connection(db_pool) as conn:
+            # never wait on the lock, a session blocked in pg_advisory_lock holds a snapshot that the
+            # holder's CREATE INDEX CONCURRENTLY waits on and postgres cancels one of them as a deadlock
+            if not await conn.fetchval("SELECT pg_try_advisory_lock($1);", MIGRATION_LOCK):
+                log.warning("Migrations are already being applied by another process")
+                return False
+
+            try:
+                await conn.execute("""
+                    CREATE TABLE IF NOT EXISTS schema_migrations (
+                        version INTEGER PRIMARY KEY,
+                        name TEXT NOT NULL,
+                        applied_dtm TIMESTAMP NOT NULL
+                    );
+                """)
+
+                applied = {row["version"] for row in await conn.fetch("SELECT version FROM schema_migrations;")}
+                for migration in sorted(MIGRATIONS, key=lambda m: m["version"]):
+                    if target is not None and migration["version"] > target:
+                        break
+                    if migration["version"] in applied:
+                        continue
+                    if migration.get("blocked_by") and await conn.fetchval(migration["blocked_by"]):
+                        log.warning(
+                            f"Skipping migration {migration['version']} {migration['name']}, {migration['blocked_reason']}")
+                        continue
+
+                    log.info(f"Applying migration {migration['version']} {migration['name']}")
+                    await drop_invalid_indexes(conn, migration["statements"])
+                    for statement in migration["statements"]:
+                        await conn.execute(statement)
+
+                    await conn.execute(
+                        "INSERT INTO schema_migrations (version, name, applied_dtm) VALUES ($1, $2, $3);",
+                        migration["version"],
+                        migration["name"],
+                        datetime.datetime.utcnow()
+                    )
+            finally:
+                await conn.execute("SELECT pg_advisory_unlock($1);", MIGRATION_LOCK)
+        return True
+
+    except Exception:
+        log.exception("Failed to apply migrations")
+    return False
+
+
+def sequential_scans(plan: dict) -> List[str]:
+    """Function to find the tables a query plan reads with a sequential scan
+
+    Args:
+        plan (dict): plan node from EXPLAIN (FORMAT JSON)
+
+    Returns:
+        List[str]: tables scanned sequentially
+    """
+    scans = [plan["Relation Name"]] if plan.get("Node Type") == "Seq Scan" else []
+    for child in plan.get("Plans") or []:
+        scans.extend(sequential_scans(child))
+    return scans
+
+
+async def check_query_plans(min_rows: int = LARGE_TABLE_ROWS) -> List[dict]:
+    """Function to EXPLAIN every hot query and report the ones that scan a large table sequentially
+
+    Args:
+        min_rows (int, optional): estimated rows a table needs to count as large. Defaults to LARGE_TABLE_ROWS.
+
+    Returns:
+        List[dict]: name of the query and the large tables it scans, empty if every plan uses an index
+    """
+    failures = []
+    db_pool = await get_connection()
+    async with acquire_connection(db_pool) as conn:
+        for hot_query in HOT_QUERIES:
+            explained = await conn.fetchval(f"EXPLAIN (FORMAT JSON) {hot_query['query']}", *hot_query["args"])
+            plan = (json.loads(explained) if isinstance(explained, str) else explained)[0]["Plan"]
+            scanned = set(sequential_scans(plan))
+            if not scanned:
+                continue
+
+            sizes = await conn.fetch("""
+                SELECT relname, reltuples FROM pg_class
+                WHERE relname = ANY($1::text[]) AND relkind = 'r' AND pg_catalog.pg_table_is_visible(oid);
+            """, list(scanned))
+            large = [size["relname"] for size in sizes if size["reltuples"] >= min_rows]
+            if large:
+                failures.append({"name": hot_query["name"], "tables": sorted(large)})
+
+    return failures
+
+
+async def remove_duplicate_registrations(apply: bool = False) -> List[dict]:
+    """Function to find the duplicate registrations of a student in a course and optionally remove them
+
+    Args:
+        apply (bool, optional): delete every registration but the kept one. Defaults to False.
+
+    Returns:
+        List[dict]: duplicate registrations with whether each one is kept
+    """
+    db_pool = await get_connection()
+    async with acquire_connection(db_pool) as conn:
+        async with conn.transaction():
+            # nothing can register in between finding the duplicates and removing them
+            await conn.execute("LOCK TABLE course_registration IN SHARE ROW EXCLUSIVE MODE;")
+            found = await conn.fetch(DUPLICATE_REGISTRATIONS_QUERY)
+            removed = [row["ctid"] for row in found if row["registration"] > 1]
+            if apply and removed:
+                await conn.execute("DELETE FROM course_registration WHERE ctid = ANY($1::tid[]);", removed)
+
+    return [
+        {
+            "courseId": row["course_id"],
+            "userId": row["user_id"],
+            "registrationStatus": row["registration_status"],
+            "userPaid": row["user_paid"],
+            "usingCash": row["user_paying_cash"],
+            "registrationDate": row["student_registration_date"],
+            "notes": row["notes"],
+            "kept": row["registration"] == 1
+        }
+        for row in found
+    ]
+
+
+async def main(command: str, args: List[str] = None) -> int:
+    args = args or []
+    if command == "migrate":
+        return 0 if await run_migrations() else 1
+
+    if command == "registrations":
+        apply = "--apply" in args
+        duplicates = await remove_duplicate_registrations(apply=apply)
+        for duplicate in duplicates:
+            action = "keep" if duplicate["kept"] else ("removed" if apply else "remove")
+            log.info(
+                f"{action} course {duplicate['courseId']} user {duplicate['userId']} {duplicate['registrationStatus']} "
+                f"paid={duplicate['userPaid']} cash={duplicate['usingCash']} registered={duplicate['registrationDate']} "
+                f"notes={duplicate['notes']!r}"
+            )
+        if not duplicates:
+            log.info("No duplicate registrations")
+        if apply or not duplicates:
+            log.info("Run migrate to add the unique registration index")
+        return 0
+
+    if command == "check":
+        failures = await check_query_plans()
+        for failure in failures:
+            log.error(f"{failure['name']} scans {', '.join(failure['tables'])} sequentially")
+        return 1 if failures else 0
+
+    log.error(f"Unknown command {command}, expected migrate, check or registrations")
+    return 1
+
+
+if __name__ == '__main__':
+    # python -m src.database.sql.migrations migrate|check|registrations [--apply]
+    sys.exit(asyncio.run(main(sys.argv[1] if len(sys.argv) > 1 else "migrate", sys.argv[2:])))
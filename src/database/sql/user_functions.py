@@ -1,4 +1,6 @@
 from typing import Union, List
+import asyncio
+import re
 import datetime
 import math
 from fractions import Fraction
@@ -9,6 +11,17 @@ from src import log
 from src.api.api_models import global_models
 from src.api.api_models.users import lookup, my_certifications
 from src.database.sql import get_connection, acquire_connection
+from src.utils.like_pattern import escape_like
+from src.modules.typeahead import refresh_entity, forget_entities
+from src.modules.certificate_artifacts import invalidate_artifacts, invalidate_related_artifacts
+from src.modules.digest import invalidate_digest_users
+
+# columns the typeahead index finds a user by
+TYPEAHEAD_COLUMNS = {"first_name", "last_name", "email"}
+# columns printed on the certificates of a user
+CERTIFICATE_COLUMNS = {"first_name", "last_name"}
+# columns the cached daily digest users depend on
+DIGEST_COLUMNS = {"email", "digest_notif"}
 
 
 async def get_user(user_id: str = None, email: str = None, phoneNumber: str = None) -> Union[global_models.User, None]:
@@ -202,6 +215,8 @@ async def create_user(**kwargs) -> bool:
         db_pool = await get_connection()
         async with acquire_connection(db_pool) as conn:
             await conn.execute(query, *insert_values)
+
+        await refresh_entity("user", kwargs['newUser']['user_id'])
         return True
 
     except asyncpg.exceptions.UniqueViolationError as err:
@@ -246,6 +261,12 @@ async def update_user(user_id: str, **kwargs) -> bool:
         async with acquire_connection(db_pool) as conn:
             await conn.execute(query, *values)
 
+        if TYPEAHEAD_COLUMNS & set(kwargs):
+            await refresh_entity("user", user_id)
+        if CERTIFICATE_COLUMNS & set(kwargs):
+            await invalidate_related_artifacts(user_id=user_id)
+        if DIGEST_COLUMNS & set(kwargs):
+            invalidate_digest_users()
         return True
 
     except Exception:
@@ -254,31 +275,81 @@ async def update_user(user_id: str, **kwargs) -> bool:
     return None
 
 
-async def get_user_type(user: lookup.Input, roleName: str, page: int = None, pageSize: int = None) -> Union[list, None]:
-    """Function to find student by lookup
+role_ids = {}
+
+
+async def get_cached_role_id(role_name: str) -> Union[str, None]:
+    # role ids never change once created so they are kept for the life of the process
+    if role_name not in role_ids:
+        role_id = await get_role_id(role_name=role_name)
+        if not role_id:
+            return None
+        role_ids[role_name] = role_id
+    return role_ids[role_name]
+
+
+async def get_user_type(user: lookup.Input, roleName: str, page: int = None, pageSize: int = None, fuzzy: bool = True) -> Union[list, None]:
+    """Function to find users of a role by name, phone number or other id
+
+    Names match exactly, by prefix or, when fuzzy, by trigram similarity. The phone number matches
+    any part of the number ignoring formatting. Best matches come first.
 
     Args:
-        student (Input, optional): Parameters to look up a student with. Defaults to None.
+        user (lookup.Input): Parameters to look up a user with.
+        roleName (str): role the users must have.
+        page (int, optional): page to get. Defaults to None.
+        pageSize (int, optional): users per page. Defaults to None.
+        fuzzy (bool, optional): whether names can match by prefix or similarity, otherwise only exactly. Defaults to True.
 
     Returns:
         Union[list, None]: Either returns a list of users or none.
     """
     users = []
+    role_id = await get_cached_role_id(roleName)
+    if not role_id:
+        return users, 0
+
+    values = [role_id]
     where_conditions = []
-    values = [roleName]
-    if user.firstName:
-        where_conditions.append(
-            f"UPPER(u.first_name) = UPPER(${len(where_conditions)+2})")
-        values.append(user.firstName)
-    if user.lastName:
-        where_conditions.append(
-            f"UPPER(u.last_name) = UPPER(${len(where_conditions)+2})")
-        values.append(user.lastName)
-    if user._id:
-        where_conditions.append(f"u.other_id = ${len(where_conditions)+2}")
-        values.append(user._id)
+    scores = []
+
+    def add_value(value) -> str:
+        values.append(value)
+        return f"${len(values)}"
+
+    # names are compared lower cased so the lower(name) indexes are used
+    for column, term in [("first_name", user.firstName), ("last_name", user.lastName)]:
+        if not term or not term.strip():
+            continue
+        name = add_value(term.strip().lower())
+        if not fuzzy:
+            where_conditions.append(f"lower(u.{column}) = {name}")
+            scores.append("1")
+            continue
+
+        prefix = add_value(f"{escape_like(term.strip().lower())}%")
+        where_conditions.append(f"(lower(u.{column}) LIKE {prefix} OR lower(u.{column}) % {name})")
+        scores.append(
+            f"CASE WHEN lower(u.{column}) = {name} THEN 1 "
+            f"WHEN lower(u.{column}) LIKE {prefix} THEN 0.9 "
+            f"ELSE similarity(lower(u.{column}), {name}) END"
+        )
+
+    phone_number = re.sub(r"\D", "", user.phoneNumber or "")
+    if phone_number:
+        phone = add_value(f"%{phone_number}%")
+        where_conditions.append(f"regexp_replace(u.phone_number, '\\D', '', 'g') LIKE {phone}")
+        scores.append("1")
+
+    if user.otherId:
+        where_conditions.append(f"u.other_id = {add_value(user.otherId)}")
+        scores.append("1")
+
+    paging = ""
+    if page and pageSize:
+        paging = f"LIMIT {add_value(pageSize)} OFFSET {add_value((page-1)*pageSize)}"
 
-    query = """
+    query = f"""
         SELECT
             u.head_shot,
             u.user_id,
@@ -286,115 +357,42 @@ async def get_user_type(user: lookup.Input, roleName: str, page: int = None, pag
             u.last_name,
             u.email,
             u.phone_number,
-            u.dob
+            u.dob,
+            {f"({' + '.join(scores)}) / {len(scores)}" if scores else "1"} AS score,
+            COUNT(*) OVER() AS total
         FROM users u
-        JOIN user_role ur ON u.user_id = ur.user_id
-        JOIN roles r ON ur.role_id = r.role_id
-        AND r.role_name = $1
-        ORDER BY u.last_name;
+        JOIN user_role ur
+        ON ur.user_id = u.user_id
+        AND ur.role_id = $1
+        {f"WHERE {' AND '.join(where_conditions)}" if where_conditions else ""}
+        ORDER BY score DESC, lower(u.last_name), lower(u.first_name)
+        {paging};
     """
-    if page and pageSize:
-        query = """
-            SELECT
-                u.head_shot,
-                u.user_id,
-                u.first_name,
-                u.last_name,
-                u.email,
-                u.phone_number,
-                u.dob
-            FROM users u
-            JOIN user_role ur ON u.user_id = ur.user_id
-            JOIN roles r ON ur.role_id = r.role_id
-            AND r.role_name = $1
-            ORDER BY u.last_name
-            LIMIT $2 OFFSET $3;
-        """
-    if where_conditions:
-        query = """
-            SELECT
-                u.head_shot,
-                u.user_id,
-                u.first_name,
-                u.last_name,
-                u.email,
-                u.phone_number,
-                u.dob
-            FROM users u
-            JOIN user_role ur ON u.user_id = ur.user_id
-            JOIN roles r ON ur.role_id = r.role_id
-            WHERE {}
-            AND r.role_name = $1
-            ORDER BY u.last_name;
-        """.format(" AND ".join(where_conditions))
-
-        if page and pageSize:
-            query = """
-                SELECT
-                    u.head_shot,
-                    u.user_id,
-                    u.first_name,
-                    u.last_name,
-                    u.email,
-                    u.phone_number,
-                    u.dob
-                FROM users u
-                JOIN user_role ur ON u.user_id = ur.user_id
-                JOIN roles r ON ur.role_id = r.role_id
-                WHERE {}
-                AND r.role_name = $1
-                ORDER BY u.last_name
-                LIMIT ${} OFFSET ${};
-            """.format(" AND ".join(where_conditions), len(where_conditions)+1, len(where_conditions)+2)
 
     total_pages = 0
     try:
         db_pool = await get_connection()
         async with acquire_connection(db_pool) as conn:
-            if page and pageSize:
-                if where_conditions:
-                    total_pages = await conn.fetchrow("""
-                        SELECT
-                            COUNT(*)
-                        FROM users u
-                        JOIN user_role ur ON u.user_id = ur.user_id
-                        JOIN roles r ON ur.role_id = r.role_id
-                        WHERE {}
-                        AND r.role_name = $1;
-                    """.format(
-                        " AND ".join(where_conditions)
-                    ), *values)
-                else:
-                    total_pages = await conn.fetchrow("""
-                        SELECT
-                            COUNT(*)
-                        FROM users u
-                        JOIN user_role ur ON u.user_id = ur.user_id
-                        JOIN roles r ON ur.role_id = r.role_id
-                        AND r.role_name = $1;
-                    """, *values)
-                found = await conn.fetch(query, *values, pageSize, (page-1)*pageSize)
-            else:
-                found = await conn.fetch(query, *values)
-
-            if found:
-                for user in found:
-                    users.append({
-                        "headShot": user['head_shot'],
-                        "userId": user['user_id'],
-                        "firstName": user['first_name'],
-                        "lastName": user['last_name'],
-                        "email": user['email'],
-                        "phoneNumber": user['phone_number'],
-                        "dob": str(user['dob'])
-                    })
+            found = await conn.fetch(query, *values)
+
+        for user in found:
+            users.append({
+                "headShot": user['head_shot'],
+                "userId": user['user_id'],
+                "firstName": user['first_name'],
+                "lastName": user['last_name'],
+                "email": user['email'],
+                "phoneNumber": user['phone_number'],
+                "dob": str(user['dob']),
+                "score": round(float(user['score']), 3)
+            })
+
+        if found and page and pageSize:
+            total_pages = math.ceil(found[0]['total']/pageSize)
 
     except Exception:
         log.exception("An error occured while getting all users by lookup")
 
-    if total_pages:
-        total_pages = total_pages[0]/pageSize
-
     return users, int(total_pages)
 
 
@@ -1250,51 +1248,114 @@ async def upload_user_pictures(user_id: str, save_to_db: dict, user: global_mode
     return False
 
 
+# tables that reference users, cleared before the users themselves
+USER_DEPENDENT_TABLES = [
+    "user_role",
+    "course_instructor",
+    "course_registration",
+    "form_submissions"
+]
+USER_PHOTO_COLUMNS = ["head_shot", "other_id_photo", "photo_id_photo"]
+
+
+def remove_user_files(file_names: List[str]):
+    for file_name in file_names:
+        try:
+            filePath = f"./src/content/users/{file_name}"
+            if os.path.exists(filePath):
+                os.remove(filePath)
+        except Exception:
+            log.exception(f"Failed to remove user file {file_name}")
+
+
+def log_cleanup_errors(future: asyncio.Future):
+    if not future.cancelled() and future.exception():
+        log.error("Failed to clean up after deleting users", exc_info=future.exception())
+
+
+async def delete_user_rows(conn, user_ids: list) -> tuple:
+    """Function to delete users and everything that references them in a single transaction
+
+    Args:
+        conn (asyncpg.Connection): connection to delete on
+        user_ids (list): ids of the users to delete
+
+    Returns:
+        tuple: deleted users with their photos and the numbers of their deleted certificates
+    """
+    async with conn.transaction():
+        for table in USER_DEPENDENT_TABLES:
+            await conn.execute(f"DELETE FROM {table} WHERE user_id = ANY($1);", user_ids)
+        certificates = await conn.fetch(
+            "DELETE FROM user_certificates WHERE user_id = ANY($1) RETURNING certificate_number;", user_ids)
+        certificate_numbers = [c['certificate_number'] for c in certificates]
+        await conn.execute(
+            "DELETE FROM certificate_expiry_notices WHERE certificate_number = ANY($1);", certificate_numbers)
+        deleted = await conn.fetch(
+            f"DELETE FROM users WHERE user_id = ANY($1) RETURNING user_id, {', '.join(USER_PHOTO_COLUMNS)};",
+            user_ids
+        )
+    return deleted, certificate_numbers
+
+
 async def delete_users(user_ids: list) -> tuple:
+    """Function to delete users and everything that references them
+
+    Every user is deleted in one transaction. If that fails, e.g. on a foreign key of a single user,
+    each user is deleted in a transaction of its own so only the users that can't be deleted fail.
+
+    Args:
+        user_ids (list): ids of the users to delete
+
+    Returns:
+        tuple: users that failed to delete with the reason, or None, and a fatal error, or None
+    """
     failed_deletes = []
     err = None
+    user_ids = list(dict.fromkeys(user_ids))
     try:
+        deleted = []
+        certificate_numbers = []
+        failed_ids = set()
         db_pool = await get_connection()
         async with acquire_connection(db_pool) as conn:
-            for user_id in user_ids:
-                try:
-                    user = await get_user(user_id=user_id)
-                    if not user:
-                        log.error(f"user not found for user_id {user_id}")
+            try:
+                deleted, certificate_numbers = await delete_user_rows(conn, user_ids)
+            except asyncpg.PostgresError:
+                log.exception("Failed to delete users together, deleting them one at a time")
+                for user_id in user_ids:
+                    try:
+                        user_deleted, user_certificates = await delete_user_rows(conn, [user_id])
+                        deleted.extend(user_deleted)
+                        certificate_numbers.extend(user_certificates)
+                    except asyncpg.PostgresError:
+                        log.exception(f"Failed to delete user {user_id}")
+                        failed_ids.add(user_id)
                         failed_deletes.append({
                             "userId": user_id,
-                            "reason": "Failed to find user"
+                            "reason": "Failed to delete specific user"
                         })
-                        continue
-                    async with conn.transaction():
-                        await conn.execute("DELETE FROM user_role WHERE user_id = $1", user_id)
-                        await conn.execute("DELETE FROM course_instructor WHERE user_id = $1", user_id)
-                        await conn.execute("DELETE FROM course_registration WHERE user_id = $1", user_id)
-                        await conn.execute("DELETE FROM form_submissions WHERE user_id = $1", user_id)
-                        await conn.execute("DELETE FROM user_certificates WHERE user_id = $1", user_id)
-                        await conn.execute("DELETE FROM users WHERE user_id = $1", user_id)
-
-                    if user.headShot:
-                        filePath = f"./src/content/users/{user.headShot}"
-                        if os.path.exists(filePath):
-                            os.remove(filePath)
-
-                    if user.otherIdPhoto:
-                        filePath = f"./src/content/users/{user.otherIdPhoto}"
-                        if os.path.exists(filePath):
-                            os.remove(filePath)
-
-                    if user.photoIdPhoto:
-                        filePath = f"./src/content/users/{user.photoIdPhoto}"
-                        if os.path.exists(filePath):
-                            os.remove(filePath)
-
-                except Exception:
-                    log.exception("Failed to delete something")
-                    failed_deletes.append({
-                        "userId": user_id,
-                        "reason": "Failed to delete specific user"
-                    })
+
+        deleted_ids = {user['user_id'] for user in deleted}
+        for user_id in user_ids:
+            if user_id not in deleted_ids and user_id not in failed_ids:
+                log.error(f"user not found for user_id {user_id}")
+                failed_deletes.append({
+                    "userId": user_id,
+                    "reason": "Failed to find user"
+                })
+
+        forget_entities("user", list(deleted_ids))
+
+        # unlinking thousands of files would stall every other request, the rows are already gone
+        file_names = [user[column] for user in deleted for column in USER_PHOTO_COLUMNS if user[column]]
+        if file_names:
+            asyncio.get_running_loop().run_in_executor(
+                None, remove_user_files, file_names).add_done_callback(log_cleanup_errors)
+        if certificate_numbers:
+            asyncio.get_running_loop().run_in_executor(
+                None, invalidate_artifacts, certificate_numbers, True).add_done_callback(log_cleanup_errors)
+
     except Exception:
         log.exception("An exception occured while deleting users")
         err = "Fatal error occured"
@@ -1423,6 +1484,177 @@ async def get_certificates(page: int = None, pageSize: int = None) -> list:
     return formatted_certifications, int(total_pages)
 
 
+async def get_certificate_by_number(certificate_number: str) -> Union[dict, None]:
+    """Function to get what is printed on a certificate by its number
+
+    Args:
+        certificate_number (str): number of the certificate
+
+    Returns:
+        Union[dict, None]: certificate details or None if no certificate has that number
+    """
+    query = """
+        SELECT
+            uc.user_id,
+            c.course_code,
+            c.course_name,
+            COALESCE(cert.certificate_name, uc.certificate_name) as certificate_name,
+            uc.certificate_number,
+            uc.completion_date,
+            uc.expiration_date,
+            u.first_name as student_first,
+            u.last_name as student_last,
+            inst.first_name as instr_first,
+            inst.last_name as instr_last
+        FROM user_certificates as uc
+        LEFT JOIN courses as c
+        ON c.course_id = uc.course_id
+        LEFT JOIN certificate cert
+        ON uc.certificate_id = cert.certificate_id
+        LEFT JOIN users as u
+        ON u.user_id = uc.user_id
+        LEFT JOIN users as inst
+        ON uc.instructor_id = inst.user_id
+        WHERE uc.certificate_number = $1;
+    """
+
+    try:
+        db_pool = await get_connection()
+        async with acquire_connection(db_pool) as conn:
+            found = await conn.fetchrow(query, certificate_number)
+
+        if not found:
+            return None
+
+        certificate_name = found['certificate_name']
+        if not certificate_name:
+            certificate_name = ', '.join(name for name in [found['course_name'], found['course_code']] if name) or "N/A"
+
+        return {
+            "userId": found['user_id'],
+            "certificateNumber": found['certificate_number'],
+            "certificateName": certificate_name,
+            "completionDate": found['completion_date'],
+            "expirationDate": found['expiration_date'],
+            "student": f"{found['student_first']} {found['student_last']}",
+            "instructor": f"{found['instr_first']} {found['instr_last']}" if found['instr_first'] and found['instr_last'] else os.getenv(
+                "COMPANY_NAME")
+        }
+
+    except Exception:
+        log.exception(f"Failed to get certificate {certificate_number}")
+
+    return None
+
+
+async def get_expiring_certificates(start: datetime.datetime, end: datetime.datetime, page: int = None, pageSize: int = None) -> tuple:
+    """Function to get certificates that expire in a date range, read off the partial expiration index
+
+    Args:
+        start (datetime.datetime): expiring after
+        end (datetime.datetime): expiring on or before
+        page (int, optional): page number. Defaults to None.
+        pageSize (int, optional): page size. Defaults to None.
+
+    Returns:
+        tuple: certificates with their holder and the expiry windows already notified, and the total pages
+    """
+    query = """
+        SELECT
+            uc.certificate_number,
+            uc.expiration_date,
+            COALESCE(cert.certificate_name, uc.certificate_name) as certificate_name,
+            c.course_name,
+            c.course_code,
+            u.user_id,
+            u.first_name,
+            u.last_name,
+            u.email,
+            u.phone_number,
+            u.email_notif,
+            ARRAY(
+                SELECT n.window_days FROM certificate_expiry_notices n
+                WHERE n.certificate_number = uc.certificate_number
+            ) as notified_windows,
+            COUNT(*) OVER() as total
+        FROM user_certificates as uc
+        JOIN users as u
+        ON u.user_id = uc.user_id
+        LEFT JOIN courses as c
+        ON c.course_id = uc.course_id
+        LEFT JOIN certificate as cert
+        ON cert.certificate_id = uc.certificate_id
+        WHERE uc.expiration_date IS NOT NULL AND uc.expiration_date > $1 AND uc.expiration_date <= $2
+        ORDER BY uc.expiration_date, uc.certificate_number
+    """
+    values = [start, end]
+    if page and pageSize:
+        query += " LIMIT $3 OFFSET $4"
+        values.extend([pageSize, (page - 1) * pageSize])
+
+    certificates = []
+    total_pages = 0
+    try:
+        db_pool = await get_connection()
+        async with acquire_connection(db_pool) as conn:
+            found = await conn.fetch(f"{query};", *values)
+
+        for certificate in found:
+            certificate_name = certificate['certificate_name']
+            if not certificate_name:
+                certificate_name = ', '.join(
+                    name for name in [certificate['course_name'], certificate['course_code']] if name) or "N/A"
+
+            certificates.append({
+                "certificateNumber": certificate['certificate_number'],
+                "certificateName": certificate_name,
+                "expirationDate": certificate['expiration_date'],
+                "userId": certificate['user_id'],
+                "firstName": certificate['first_name'],
+                "lastName": certificate['last_name'],
+                "email": certificate['email'],
+                "phoneNumber": certificate['phone_number'],
+                "emailNotifications": certificate['email_notif'],
+                "notifiedWindows": sorted(certificate['notified_windows'])
+            })
+
+        if found and page and pageSize:
+            total_pages = math.ceil(found[0]['total'] / pageSize)
+
+    except Exception:
+        log.exception(f"Failed to get certificates expiring between {start} and {end}")
+
+    return certificates, int(total_pages)
+
+
+async def record_expiry_notices(notices: List[tuple]) -> bool:
+    """Function to record which expiry windows certificates were notified for
+
+    Args:
+        notices (List[tuple]): certificate number and window in days
+
+    Returns:
+        bool: true if recorded
+    """
+    if not notices:
+        return True
+
+    try:
+        db_pool = await get_connection()
+        async with acquire_connection(db_pool) as conn:
+            await conn.executemany("""
+                INSERT INTO certificate_expiry_notices (certificate_number, window_days, sent_dtm)
+                VALUES ($1, $2, $3)
+                ON CONFLICT DO NOTHING;
+            """, [(certificate_number, window, datetime.datetime.utcnow()) for certificate_number, window in notices])
+        return True
+
+    except Exception:
+        log.exception(f"Failed to record {len(notices)} certificate expiry notices")
+
+    return False
+
+
 async def delete_user_certificates(certificate_numbers: list) -> bool:
     query = """
         DELETE FROM user_certificates where certificate_number = $1
@@ -1433,6 +1665,10 @@ async def delete_user_certificates(certificate_numbers: list) -> bool:
         async with acquire_connection(db_pool) as conn:
             for certificate_number in certificate_numbers:
                 await conn.execute(query, certificate_number)
+            await conn.execute(
+                "DELETE FROM certificate_expiry_notices WHERE certificate_number = ANY($1);", certificate_numbers)
+
+        invalidate_artifacts(certificate_numbers, remove_files=True)
         return True
 
     except Exception:
@@ -0,0 +1,167 @@
+import glob
+import hashlib
+import json
+import os
+from typing import List, Union
+
+from src import log, redis_client
+from src.database.sql import get_connection, acquire_connection
+from src.modules.certificate_verification import invalidate_verifications
+
+# rendered certificates are stored as <certificate number>_<etag>.<format>, the etag is a hash of
+# everything that goes into the render so a file that exists is always the current version of it
+ARTIFACT_DIR = './src/content/user_certificates'
+TEMPLATE_FILES = [
+    './src/content/certificates/index.html',
+    './src/content/certificates/styles/output.css'
+]
+ARTIFACT_FORMATS = {
+    "png": "image/png",
+    "pdf": "application/pdf"
+}
+ARTIFACT_EXPIRY = 60 * 60 * 24 * 30
+
+template_fingerprints = {}
+
+
+def template_fingerprint() -> str:
+    """Function to get a hash of the certificate template, only re-read when a template file changes
+
+    Returns:
+        str: hash of the template files
+    """
+    modified = tuple(os.stat(path).st_mtime_ns for path in TEMPLATE_FILES)
+    if modified not in template_fingerprints:
+        digest = hashlib.sha256()
+        for path in TEMPLATE_FILES:
+            with open(path, 'rb') as file:
+                digest.update(file.read())
+        template_fingerprints.clear()
+        template_fingerprints[modified] = digest.hexdigest()
+    return template_fingerprints[modified]
+
+
+def artifact_etag(details: dict, artifact_format: str) -> str:
+    rendered_from = json.dumps([template_fingerprint(), artifact_format, details], sort_keys=True, default=str)
+    return hashlib.sha256(rendered_from.encode()).hexdigest()[:32]
+
+
+def artifact_path(certificate_number: str, etag: str, artifact_format: str) -> str:
+    return f"{ARTIFACT_DIR}/{certificate_number}_{etag}.{artifact_format}"
+
+
+def artifact_key(certificate_number: str, artifact_format: str) -> str:
+    return f"certificate_artifact_{certificate_number}_{artifact_format}"
+
+
+def cached_artifact(certificate_number: str, artifact_format: str) -> Union[str, None]:
+    """Function to get the etag of a stored artifact without touching postgres
+
+    Args:
+        certificate_number (str): number of the certificate
+        artifact_format (str): png or pdf
+
+    Returns:
+        Union[str, None]: etag of the stored artifact, None if it has to be looked up again
+    """
+    try:
+        cached = redis_client.get_key(artifact_key(certificate_number, artifact_format))
+        if not cached:
+            return None
+
+        cached = json.loads(cached)
+        if cached["template"] != template_fingerprint():
+            return None
+        if not os.path.exists(artifact_path(certificate_number, cached["etag"], artifact_format)):
+            return None
+        return cached["etag"]
+    except Exception:
+        log.exception(f"Failed to get cached artifact for certificate {certificate_number}")
+    return None
+
+
+def remember_artifact(certificate_number: str, artifact_format: str, etag: str):
+    try:
+        redis_client.set_key(
+            artifact_key(certificate_number, artifact_format),
+            json.dumps({"etag": etag, "template": template_fingerprint()}),
+            ARTIFACT_EXPIRY
+        )
+    except Exception:
+        log.exception(f"Failed to cache artifact for certificate {certificate_number}")
+
+
+def store_artifact(certificate_number: str, artifact_format: str, etag: str, content: bytes) -> str:
+    """Function to save a rendered certificate and drop its older versions
+
+    Args:
+        certificate_number (str): number of the certificate
+        artifact_format (str): png or pdf
+        etag (str): etag of the render
+        content (bytes): rendered certificate
+
+    Returns:
+        str: path of the stored artifact
+    """
+    path = artifact_path(certificate_number, etag, artifact_format)
+    # written next to the final path then moved so a download never reads half a file
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'wb') as file:
+        file.write(content)
+    os.replace(temp_path, path)
+
+    for old_path in glob.glob(f"{ARTIFACT_DIR}/{glob.escape(certificate_number)}_*.{artifact_format}"):
+        if old_path != path:
+            os.remove(old_path)
+
+    remember_artifact(certificate_number, artifact_format, etag)
+    return path
+
+
+def invalidate_artifacts(certificate_numbers: List[str], remove_files: bool = False):
+    """Function to make the next download or verification of certificates check whether they changed
+
+    Args:
+        certificate_numbers (List[str]): numbers of the certificates
+        remove_files (bool, optional): also delete the stored renders, for certificates that no longer exist. Defaults to False.
+    """
+    if not certificate_numbers:
+        return
+    invalidate_verifications(certificate_numbers)
+    try:
+        redis_client.redis_client.delete(*[
+            artifact_key(certificate_number, artifact_format)
+            for certificate_number in certificate_numbers
+            for artifact_format in ARTIFACT_FORMATS
+        ])
+        if remove_files:
+            for certificate_number in certificate_numbers:
+                for path in glob.glob(f"{ARTIFACT_DIR}/{glob.escape(certificate_number)}_*"):
+                    os.remove(path)
+    except Exception:
+        log.exception(f"Failed to invalidate artifacts of {len(certificate_numbers)} certificates")
+
+
+async def invalidate_related_artifacts(user_id: str = None, course_id: str = None):
+    """Function to invalidate the certificates a renamed user or course appears on
+
+    Args:
+        user_id (str, optional): user that is the student or instructor of the certificates. Defaults to None.
+        course_id (str, optional): course of the certificates. Defaults to None.
+    """
+    try:
+        db_pool = await get_connection()
+        async with acquire_connection(db_pool) as conn:
+            if user_id:
+                found = await conn.fetch("""
+                    SELECT certificate_number FROM user_certificates WHERE user_id = $1
+                    UNION
+                    SELECT certificate_number FROM user_certificates WHERE instructor_id = $1;
+                """, user_id)
+            else:
+                found = await conn.fetch(
+                    "SELECT certificate_number FROM user_certificates WHERE course_id = $1;", course_id)
+
+        invalidate_artifacts([row['certificate_number'] for row in found])
+    except Exception:
+        log.exception(f"Failed to invalidate certificate artifacts for {user_id or course_id}")
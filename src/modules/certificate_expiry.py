@@ -0,0 +1,141 @@
+import datetime
+import os
+from typing import List, Union
+
+import pytz
+
+from src import log
+from src.database.sql.user_functions import get_expiring_certificates, record_expiry_notices
+from src.modules.digest import queue_digest
+from src.modules.notifications import load_template
+from src.utils.mailer import send_email, get_session
+
+EXPIRY_TEMPLATE = "/source/src/content/templates/certificate_expiry/certificate_expiring.json"
+# notices going out in one smtp session before they are recorded as sent
+EXPIRY_BATCH = int(os.getenv("CERTIFICATE_EXPIRY_BATCH", 100))
+
+
+def expiry_windows() -> List[int]:
+    """Function to get how many days before expiring a certificate holder is notified
+
+    Returns:
+        List[int]: windows in days from CERTIFICATE_EXPIRY_WINDOWS, smallest first
+    """
+    windows = os.getenv("CERTIFICATE_EXPIRY_WINDOWS", "90,30,7")
+    return sorted({int(window) for window in windows.split(",") if window.strip()})
+
+
+def due_window(days_left: float, windows: List[int], notified: List[int]) -> Union[int, None]:
+    """Function to get the window a certificate should be notified for now
+
+    Only the closest window is sent, a certificate first seen 5 days out gets the 7 day notice and not all three.
+
+    Args:
+        days_left (float): days until the certificate expires
+        windows (List[int]): windows in days, smallest first
+        notified (List[int]): windows already notified
+
+    Returns:
+        Union[int, None]: window to notify or None if nothing is due
+    """
+    window = next((window for window in windows if days_left <= window), None)
+    if window is None or any(sent <= window for sent in notified):
+        return None
+    return window
+
+
+def build_expiry_notice(template: dict, certificate: dict, days_left: int) -> dict:
+    expiration_date = pytz.utc.localize(certificate["expirationDate"]).astimezone(
+        pytz.timezone('America/New_York')).strftime("%m/%d/%Y")
+    values = {
+        "name": certificate["firstName"],
+        "company_name": os.getenv("COMPANY_NAME", "ABC Safety Group"),
+        "certificate_name": certificate["certificateName"],
+        "certificate_number": certificate["certificateNumber"],
+        "expiration_date": expiration_date,
+        "days_left": days_left,
+        "company_phone": os.getenv("COMPANY_PHONE", "1234"),
+        "company_url": os.getenv("COMPANY_URL", 'doitsolutions.io'),
+        "company_email": os.getenv("COMPANY_EMAIL", "rmiller.doitsolutions.io")
+    }
+    return {
+        "subject": template["email"]["subject"].format(**values),
+        "body": template["email"]["body"].format(**values)
+    }
+
+
+async def scan_expiring_certificates(now: datetime.datetime = None) -> int:
+    """Function to notify holders of certificates entering an expiry window
+
+    Every window is covered by a single range query up to the largest one, notices go out in
+    batches over one smtp session and each batch is recorded so a notice is never sent twice.
+
+    Args:
+        now (datetime.datetime, optional): time to scan from. Defaults to utcnow.
+
+    Returns:
+        int: amount of notices recorded, including holders that opted out of email
+    """
+    now = now or datetime.datetime.utcnow()
+    windows = expiry_windows()
+    if not windows:
+        return 0
+
+    certificates, _ = await get_expiring_certificates(now, now + datetime.timedelta(days=windows[-1]))
+    due = []
+    for certificate in certificates:
+        days_left = (certificate["expirationDate"] - now).total_seconds() / 86400
+        window = due_window(days_left, windows, certificate["notifiedWindows"])
+        if window is not None:
+            due.append((certificate, window, max(int(days_left), 0)))
+
+    if not due:
+        return 0
+
+    template = load_template(EXPIRY_TEMPLATE)
+    if not template:
+        log.error("Failed to load certificate expiry template")
+        return 0
+
+    notified = 0
+    session = None
+    try:
+        for idx in range(0, len(due), EXPIRY_BATCH):
+            sent = []
+            for certificate, window, days_left in due[idx:idx + EXPIRY_BATCH]:
+                # holders without email notifications are still recorded so they show as handled in the report
+                if not certificate["emailNotifications"] or not certificate["email"]:
+                    sent.append((certificate["certificateNumber"], window))
+                    continue
+
+                content = build_expiry_notice(template, certificate, days_left)
+                if await queue_digest(certificate["email"], "certificate_expiry", content, certificate["firstName"]):
+                    sent.append((certificate["certificateNumber"], window))
+                    continue
+
+                for _ in range(5):
+                    try:
+                        if not session:
+                            session = get_session()
+                        if send_email(receiver=[certificate["email"]], email_content=content, session=session):
+                            sent.append((certificate["certificateNumber"], window))
+                            break
+                    except Exception:
+                        log.error(f"Attempting to resend certificate expiry notice to {certificate['email']}")
+                    # drop the session so the next try reconnects
+                    session = None
+                else:
+                    log.error(f"Failed to send certificate expiry notice for {certificate['certificateNumber']}")
+
+            if not await record_expiry_notices(sent):
+                log.error(f"Failed to record {len(sent)} sent certificate expiry notices")
+            notified += len(sent)
+    finally:
+        if session:
+            try:
+                session.quit()
+            except Exception:
+                pass
+
+    log.info(f"Sent {notified} certificate expiry notices")
+    return notified
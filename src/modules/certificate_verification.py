@@ -0,0 +1,142 @@
+import datetime
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import List, Union
+
+from src import log, redis_client
+from src.database.sql import get_connection, acquire_connection
+
+# verification is public and can be hammered, so lookups are answered from a small in process LRU
+# in front of redis. entries only live a short while in process since other workers can not clear them
+VERIFY_CACHE_SIZE = int(os.getenv("CERTIFICATE_VERIFY_CACHE_SIZE", 1024))
+VERIFY_LOCAL_EXPIRY = 30
+VERIFY_EXPIRY = 60 * 60
+# unknown numbers are remembered too, for less time, so guessing numbers never reaches postgres
+VERIFY_MISSING_EXPIRY = 60 * 5
+
+verified = OrderedDict()
+
+VERIFY_QUERY = """
+    SELECT
+        uc.certificate_number,
+        uc.completion_date,
+        uc.expiration_date,
+        COALESCE(cert.certificate_name, uc.certificate_name) as certificate_name,
+        c.course_name,
+        c.course_code,
+        u.first_name,
+        u.last_name
+    FROM user_certificates as uc
+    JOIN users as u
+    ON u.user_id = uc.user_id
+    LEFT JOIN courses as c
+    ON c.course_id = uc.course_id
+    LEFT JOIN certificate as cert
+    ON cert.certificate_id = uc.certificate_id
+    WHERE uc.certificate_number = $1;
+"""
+
+
+def verify_key(certificate_number: str) -> str:
+    return f"certificate_verify_{certificate_number}"
+
+
+def verify_url(certificate_number: str) -> str:
+    return f"{(os.getenv('OPENAPI_SERVER_URL') or '').rstrip('/')}/certificates/verify/{certificate_number}"
+
+
+def remember_local(certificate_number: str, record: Union[dict, None]):
+    verified[certificate_number] = (time.monotonic() + VERIFY_LOCAL_EXPIRY, record)
+    verified.move_to_end(certificate_number)
+    while len(verified) > VERIFY_CACHE_SIZE:
+        verified.popitem(last=False)
+
+
+async def load_verification_record(certificate_number: str) -> Union[dict, None]:
+    """Function to get what a verification shows about a certificate, from the caches or postgres
+
+    Args:
+        certificate_number (str): number of the certificate
+
+    Returns:
+        Union[dict, None]: certificate holder, name and dates, None if no certificate has that number
+    """
+    local = verified.get(certificate_number)
+    if local and local[0] > time.monotonic():
+        verified.move_to_end(certificate_number)
+        return local[1]
+
+    try:
+        cached = redis_client.get_key(verify_key(certificate_number))
+        if cached:
+            record = json.loads(cached)
+            remember_local(certificate_number, record)
+            return record
+    except Exception:
+        log.exception(f"Failed to get cached verification for certificate {certificate_number}")
+
+    db_pool = await get_connection()
+    async with acquire_connection(db_pool) as conn:
+        found = await conn.fetchrow(VERIFY_QUERY, certificate_number)
+
+    record = None
+    if found:
+        certificate_name = found['certificate_name']
+        if not certificate_name:
+            certificate_name = ', '.join(name for name in [found['course_name'], found['course_code']] if name) or "N/A"
+        record = {
+            "certificateNumber": found['certificate_number'],
+            "certificateName": certificate_name,
+            "holder": f"{found['first_name']} {found['last_name']}",
+            "completionDate": found['completion_date'].isoformat() if found['completion_date'] else None,
+            "expirationDate": found['expiration_date'].isoformat() if found['expiration_date'] else None
+        }
+
+    try:
+        redis_client.set_key(
+            verify_key(certificate_number),
+            json.dumps(record),
+            VERIFY_EXPIRY if record else VERIFY_MISSING_EXPIRY
+        )
+    except Exception:
+        log.exception(f"Failed to cache verification for certificate {certificate_number}")
+
+    remember_local(certificate_number, record)
+    return record
+
+
+async def verify_certificate(certificate_number: str) -> Union[dict, None]:
+    """Function to verify a certificate by its number
+
+    Args:
+        certificate_number (str): number of the certificate
+
+    Returns:
+        Union[dict, None]: verification with whether the certificate is currently valid, None if it does not exist
+    """
+    record = await load_verification_record(certificate_number)
+    if not record:
+        return None
+
+    # expiry is worked out on every request so a cached record never outlives its certificate
+    expired = bool(record["expirationDate"]) and datetime.datetime.fromisoformat(record["expirationDate"]) <= datetime.datetime.utcnow()
+    return {
+        **record,
+        "valid": not expired,
+        "status": "expired" if expired else "valid",
+        "issuer": os.getenv("COMPANY_NAME"),
+        "verifyUrl": verify_url(certificate_number)
+    }
+
+
+def invalidate_verifications(certificate_numbers: List[str]):
+    if not certificate_numbers:
+        return
+    for certificate_number in certificate_numbers:
+        verified.pop(certificate_number, None)
+    try:
+        redis_client.redis_client.delete(*[verify_key(certificate_number) for certificate_number in certificate_numbers])
+    except Exception:
+        log.exception(f"Failed to invalidate verifications of {len(certificate_numbers)} certificates")
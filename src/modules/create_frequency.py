@@ -19,7 +19,7 @@ def create_frequency(content: Series) -> dict:
         "june": 6,
         "july": 7,
         "august": 8,
-        "steptember": 9,
+        "september": 9,
         "october": 10,
         "november": 11,
         "december": 12
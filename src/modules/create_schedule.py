@@ -1,88 +1,193 @@
 import datetime
+from itertools import islice
+from typing import Iterator, List, Tuple, Union
 
+import pytz
+from dateutil import parser
+from dateutil.rrule import rrule, rruleset, DAILY, WEEKLY, MONTHLY, YEARLY, MO, TH
 
-def create_schedule(frequency: dict, first_class_dtm: datetime.datetime, classes_in_series: int, class_duration: int) -> list:
+# classes are scheduled in local time so they stay at the same wall clock time across DST
+SCHEDULE_TZ = pytz.timezone('America/New_York')
+# stops series that can never produce enough classes, e.g. the 31st of every february
+MAX_SERIES_YEARS = 50
+
+WEEKDAYS = {
+    "monday": 0,
+    "tuesday": 1,
+    "wednesday": 2,
+    "thursday": 3,
+    "friday": 4,
+    "saturday": 5,
+    "sunday": 6
+}
+
+# federal holidays that fall on a fixed day or a fixed weekday of the month
+HOLIDAYS = [
+    {"bymonth": 1, "bymonthday": 1},
+    {"bymonth": 1, "byweekday": MO(3)},
+    {"bymonth": 2, "byweekday": MO(3)},
+    {"bymonth": 5, "byweekday": MO(-1)},
+    {"bymonth": 6, "bymonthday": 19},
+    {"bymonth": 7, "bymonthday": 4},
+    {"bymonth": 9, "byweekday": MO(1)},
+    {"bymonth": 10, "byweekday": MO(2)},
+    {"bymonth": 11, "bymonthday": 11},
+    {"bymonth": 11, "byweekday": TH(4)},
+    {"bymonth": 12, "bymonthday": 25}
+]
+
+
+def holidays_in(year: int) -> set:
+    start = datetime.datetime(year, 1, 1)
+    return {
+        holiday.date()
+        for rule in HOLIDAYS
+        for holiday in rrule(YEARLY, dtstart=start, count=1, **rule)
+    }
+
+
+def to_date(value: Union[str, datetime.date]) -> datetime.date:
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    return parser.isoparse(value).date()
+
+
+def parse_first_class(first_class_dtm: Union[str, datetime.datetime]) -> datetime.datetime:
+    if isinstance(first_class_dtm, datetime.datetime):
+        return first_class_dtm if first_class_dtm.tzinfo else pytz.utc.localize(first_class_dtm)
+    return datetime.datetime.strptime(
+        first_class_dtm.replace('Z', '+0000'), '%Y-%m-%dT%H:%M:%S.%f%z')
+
+
+def weekday(day: Union[str, int]) -> int:
+    return day if isinstance(day, int) else WEEKDAYS[day.lower()]
+
+
+def build_rules(frequency: dict, local_start: datetime.datetime) -> rruleset:
+    """Function to turn a frequency into recurrence rules in local wall clock time
+
+    Args:
+        frequency (dict): frequency of schedule
+        local_start (datetime.datetime): first class in local time without a timezone
+
+    Raises:
+        ValueError: unknown frequency type
+
+    Returns:
+        rruleset: every class start of the series
+    """
+    until = local_start.replace(year=local_start.year + MAX_SERIES_YEARS, day=min(local_start.day, 28))
+    rules = rruleset()
+    # the first class is always part of the series even if it does not match the rule
+    rules.rdate(local_start)
+
+    frequency_type = frequency["frequency_type"]
+    if frequency_type == "days":
+        rules.rrule(rrule(DAILY, dtstart=local_start, until=until,
+                          interval=frequency["classes_per_week"] or 1))
+
+    elif frequency_type == "weeks":
+        days = [weekday(day) for day in frequency.get("days") or []]
+        rules.rrule(rrule(WEEKLY, dtstart=local_start, until=until,
+                          interval=frequency["skip_weeks"] or 1,
+                          byweekday=days or None))
+
+    elif frequency_type == "months":
+        days = [int(day) for day in frequency.get("days") or []]
+        rules.rrule(rrule(MONTHLY, dtstart=local_start, until=until,
+                          interval=frequency["skip_months"] or 1,
+                          bymonth=frequency.get("months") or None,
+                          bymonthday=days or None))
+
+    elif frequency_type == "years":
+        for date in frequency.get("dates") or []:
+            date = to_date(date)
+            rules.rrule(rrule(YEARLY, dtstart=local_start, until=until,
+                              interval=frequency["skip_years"] or 1,
+                              bymonth=date.month,
+                              bymonthday=date.day))
+        rules.rrule(rrule(YEARLY, dtstart=local_start, until=until,
+                          interval=frequency["skip_years"] or 1))
+
+    else:
+        raise ValueError(f"Unknown frequency type {frequency_type}")
+
+    return rules
+
+
+def iter_schedule(
+    frequency: dict,
+    first_class_dtm: Union[str, datetime.datetime],
+    class_duration: int,
+    exclusions: List[Union[str, datetime.date]] = None,
+    skip_holidays: bool = False
+) -> Iterator[Tuple[datetime.datetime, datetime.datetime]]:
+    """Function to lazily generate the classes of a series
+
+    Args:
+        frequency (dict): frequency of schedule
+        first_class_dtm (Union[str, datetime.datetime]): first class datetime
+        class_duration (int): length of a class in minutes
+        exclusions (List[Union[str, datetime.date]], optional): dates with no class. Defaults to None.
+        skip_holidays (bool, optional): whether to skip federal holidays. Defaults to False.
+
+    Yields:
+        Tuple[datetime.datetime, datetime.datetime]: start and end of each class in UTC
+    """
+    first_class_dtm = parse_first_class(first_class_dtm)
+    local_start = first_class_dtm.astimezone(SCHEDULE_TZ).replace(tzinfo=None)
+    excluded = {to_date(date) for date in exclusions or []}
+    holidays = {}
+
+    for local_class in build_rules(frequency, local_start):
+        if local_class.date() in excluded:
+            continue
+        if skip_holidays:
+            if local_class.year not in holidays:
+                holidays[local_class.year] = holidays_in(local_class.year)
+            if local_class.date() in holidays[local_class.year]:
+                continue
+
+        # times that do not exist when clocks spring forward move to after the change
+        try:
+            start = SCHEDULE_TZ.localize(local_class, is_dst=None)
+        except pytz.exceptions.NonExistentTimeError:
+            start = SCHEDULE_TZ.normalize(SCHEDULE_TZ.localize(local_class, is_dst=False))
+        except pytz.exceptions.AmbiguousTimeError:
+            start = SCHEDULE_TZ.localize(local_class, is_dst=True)
+
+        start = start.astimezone(pytz.utc)
+        yield (start, start + datetime.timedelta(minutes=class_duration))
+
+
+def create_schedule(
+    frequency: dict,
+    first_class_dtm: Union[str, datetime.datetime],
+    classes_in_series: int,
+    class_duration: int,
+    exclusions: List[Union[str, datetime.date]] = None,
+    skip_holidays: bool = False
+) -> list:
     """Function to create a schedule based off of frequency
 
     Args:
         frequency (dict): frequency of schedule
-        first_class_dtm (datetime.datetime): first class datetime
+        first_class_dtm (Union[str, datetime.datetime]): first class datetime
         classes_in_series (int): total classes in series
+        class_duration (int): length of a class in minutes
+        exclusions (List[Union[str, datetime.date]], optional): dates with no class. Defaults to None.
+        skip_holidays (bool, optional): whether to skip federal holidays. Defaults to False.
 
     Returns:
         list: Returns a list with scheduled events
     """
-    first_class_dtm = datetime.datetime.strptime(
-        first_class_dtm.replace('Z', '+0000'), '%Y-%m-%dT%H:%M:%S.%f%z')
-    date_list = [(first_class_dtm, first_class_dtm +
-                  datetime.timedelta(minutes=class_duration))]
-    enum = {
-        "monday": 0,
-        "tuesday": 1,
-        "wednesday": 2,
-        "thursday": 3,
-        "friday": 4,
-        "saturday": 5,
-        "sunday": 6
-    }
+    if not frequency or not classes_in_series:
+        return None
 
-    if frequency["frequency_type"] == "days":
-        class_frequency = frequency["classes_per_week"]
-        for _ in range(classes_in_series-1):
-            next_class_start = first_class_dtm + \
-                datetime.timedelta(days=class_frequency)
-            next_class_end = next_class_start + \
-                datetime.timedelta(minutes=class_duration)
-            date_list.append((next_class_start, next_class_end))
-            first_class_dtm = next_class_start
-
-        return date_list
-
-    if frequency["frequency_type"] == "weeks":
-        class_frequency = frequency["skip_weeks"]
-        class_days = []
-        for _ in range(classes_in_series-1):
-            for x in frequency["days"]:
-                class_days.append(enum[x.lower()])
-
-        while len(date_list) < classes_in_series-1:
-            next_class_start = first_class_dtm
-            while not next_class_start.weekday() == class_days[0]:
-                next_class_start += datetime.timedelta(days=1)
-                next_class_end = next_class_start + \
-                    datetime.timedelta(minutes=class_duration)
-
-            date_list.append((next_class_start, next_class_end))
-            class_days.remove(next_class_start.weekday())
-
-            if len(date_list) % len(frequency["days"]) == 0:
-                first_class_dtm += datetime.timedelta(weeks=class_frequency)
-
-        return date_list
-
-    if frequency["frequency_type"] == "months":
-        class_frequency = frequency["skip_months"]
-        for _ in range(classes_in_series-1):
-            if first_class_dtm.month == 2 and first_class_dtm.day < 28:
-                continue
-            next_class_start = first_class_dtm + \
-                datetime.timedelta(days=30*class_frequency)
-            next_class_end = next_class_start + \
-                datetime.timedelta(minutes=class_duration)
-            date_list.append((next_class_start, next_class_end))
-        return date_list
-
-    if frequency["frequency_type"] == "years":
-        class_frequency = frequency["skip_years"]
-        frequency["dates"].append(first_class_dtm)
-        date_list = []
-        while len(date_list) < classes_in_series-1:
-            for date in frequency["dates"]:
-                next_class_start = date + \
-                    datetime.timedelta(days=365*class_frequency)
-                next_class_end = next_class_start + \
-                    datetime.timedelta(minutes=class_duration)
-                date_list.append((next_class_start, next_class_end))
-        return date_list
-
-    return None
+    schedule = list(islice(
+        iter_schedule(frequency, first_class_dtm, class_duration, exclusions, skip_holidays),
+        classes_in_series
+    ))
+    return schedule or None
@@ -0,0 +1,232 @@
+import os
+import json
+import datetime
+
+from src import log, redis_client
+from src.database.sql import get_connection, acquire_connection
+from src.utils.mailer import send_email, get_session
+
+# opted in emails are cached from users.digest_notif, the loaded key tells an empty cache from a missing one
+DIGEST_USERS_KEY = "digest_users_cache"
+DIGEST_USERS_LOADED_KEY = "digest_users_loaded"
+DIGEST_USERS_EXPIRY = 60 * 60
+# opt ins from before the preference was kept in postgres
+LEGACY_DIGEST_USERS_KEY = "digest_users"
+DIGEST_PENDING_KEY = "digest_pending"
+DIGEST_TEMPLATE = "/source/src/content/templates/digest/daily_digest.json"
+
+
+def digest_types() -> list:
+    """Function to get the notification types that are always sent as a digest
+
+    Returns:
+        list: notification types from NOTIFICATION_DIGEST_TYPES
+    """
+    types = os.getenv("NOTIFICATION_DIGEST_TYPES", "")
+    return [t.strip() for t in types.split(",") if t.strip()]
+
+
+def invalidate_digest_users():
+    """Function to make the next digest check reload the opted in users from postgres
+    """
+    try:
+        redis_client.delete_key(DIGEST_USERS_LOADED_KEY)
+    except Exception:
+        log.exception("Failed to invalidate cached digest users")
+
+
+async def load_digest_users():
+    """Function to cache the emails of the users opted in to the daily digest, if they are not cached already
+    """
+    if redis_client.get_key(DIGEST_USERS_LOADED_KEY):
+        return
+
+    db_pool = await get_connection()
+    async with acquire_connection(db_pool) as conn:
+        legacy = redis_client.get_set(LEGACY_DIGEST_USERS_KEY)
+        if legacy:
+            await conn.execute("UPDATE users SET digest_notif = true WHERE email = ANY($1);", legacy)
+            redis_client.delete_key(LEGACY_DIGEST_USERS_KEY)
+
+        found = await conn.fetch("SELECT email FROM users WHERE digest_notif AND email IS NOT NULL;")
+
+    pipe = redis_client.redis_client.pipeline()
+    pipe.delete(DIGEST_USERS_KEY)
+    if found:
+        pipe.sadd(DIGEST_USERS_KEY, *[user["email"] for user in found])
+    pipe.set(DIGEST_USERS_LOADED_KEY, 1, ex=DIGEST_USERS_EXPIRY)
+    pipe.execute()
+
+
+async def set_digest_preference(user_id: str, enabled: bool) -> bool:
+    """Function to opt a user in or out of the daily digest
+
+    Args:
+        user_id (str): id of the user
+        enabled (bool): whether the user wants a daily digest
+
+    Returns:
+        bool: True if the preference was saved
+    """
+    try:
+        db_pool = await get_connection()
+        async with acquire_connection(db_pool) as conn:
+            updated = await conn.fetchval(
+                "UPDATE users SET digest_notif = $2 WHERE user_id = $1 RETURNING user_id;", user_id, enabled)
+        invalidate_digest_users()
+        return bool(updated)
+    except Exception:
+        log.exception(f"Failed to set digest preference for user {user_id}")
+    return False
+
+
+async def get_digest_preference(user_id: str) -> bool:
+    """Function to check if a user is opted in to the daily digest
+
+    Args:
+        user_id (str): id of the user
+
+    Returns:
+        bool: True if the user gets a daily digest
+    """
+    try:
+        db_pool = await get_connection()
+        async with acquire_connection(db_pool) as conn:
+            return bool(await conn.fetchval("SELECT digest_notif FROM users WHERE user_id = $1;", user_id))
+    except Exception:
+        log.exception(f"Failed to get digest preference for user {user_id}")
+    return False
+
+
+async def queue_digest(email: str, notification_type: str, email_content: dict, name: str = None) -> bool:
+    """Function to hold a notification for the daily digest instead of sending it now
+
+    Args:
+        email (str): email of the recipient
+        notification_type (str): type of notification e.g. student_enroll
+        email_content (dict): formatted subject, body and attachments
+        name (str, optional): first name of the recipient. Defaults to None.
+
+    Returns:
+        bool: True if the notification was queued, False if it should be sent right away
+    """
+    if not email or not email_content:
+        return False
+
+    try:
+        if notification_type not in digest_types():
+            await load_digest_users()
+            if not redis_client.in_set(DIGEST_USERS_KEY, email):
+                return False
+
+        attachments = email_content.get("attachments") or []
+        # only file paths survive the trip through redis
+        if any(not isinstance(attachment, str) for attachment in attachments):
+            return False
+
+        redis_client.push_list(f"digest_{email}", json.dumps({
+            "type": notification_type,
+            "name": name,
+            "subject": email_content["subject"],
+            "body": email_content["body"],
+            "attachments": attachments,
+            "created": datetime.datetime.utcnow().isoformat()
+        }))
+        redis_client.add_set(DIGEST_PENDING_KEY, email)
+        return True
+    except Exception:
+        log.exception(f"Failed to queue {notification_type} digest for {email}, sending now")
+    return False
+
+
+def build_digest(email: str, items: list) -> dict:
+    """Function to combine pending notifications into one email
+
+    Args:
+        email (str): email of the recipient
+        items (list): pending notifications for the recipient
+
+    Returns:
+        dict: email content to be sent
+    """
+    with open(DIGEST_TEMPLATE) as file:
+        template = json.load(file)
+
+    name = next((item["name"] for item in items if item.get("name")), email)
+    attachments = []
+    body = ""
+    for item in items:
+        body += template["email"]["item"].format(
+            subject=item["subject"],
+            body=item["body"]
+        )
+        attachments.extend(a for a in item["attachments"] if a not in attachments)
+
+    return {
+        "subject": template["email"]["subject"].format(
+            company_name=os.getenv("COMPANY_NAME", "ABC Safety Group"),
+            amount=len(items)
+        ),
+        "body": template["email"]["body"].format(
+            name=name,
+            items=body,
+            company_name=os.getenv("COMPANY_NAME", "ABC Safety Group"),
+            company_phone=os.getenv("COMPANY_PHONE", "1234"),
+            company_email=os.getenv(
+                "COMPANY_EMAIL", "rmiller.doitsolutions.io")
+        ),
+        "attachments": attachments
+    }
+
+
+def flush_digests() -> int:
+    """Function to send one combined email per recipient with pending notifications
+
+    Returns:
+        int: amount of digest emails sent
+    """
+    sent = 0
+    session = None
+    try:
+        for email in redis_client.get_set(DIGEST_PENDING_KEY):
+            redis_client.remove_set(DIGEST_PENDING_KEY, email)
+            items = [json.loads(item) for item in redis_client.drain_list(f"digest_{email}")]
+            if not items:
+                continue
+
+            if len(items) == 1:
+                content = {
+                    "subject": items[0]["subject"],
+                    "body": items[0]["body"],
+                    "attachments": items[0]["attachments"]
+                }
+            else:
+                content = build_digest(email, items)
+
+            tries = 0
+            while tries < 5:
+                try:
+                    if not session:
+                        session = get_session()
+                    if send_email(receiver=[email], email_content=content, session=session):
+                        sent += 1
+                        break
+                except Exception:
+                    log.error(f"Attempting to resend digest to {email}")
+                # drop the session so the next try reconnects
+                session = None
+                tries += 1
+            else:
+                log.error(f"Failed to send digest to {email}, requeueing")
+                for item in items:
+                    redis_client.push_list(f"digest_{email}", json.dumps(item))
+                redis_client.add_set(DIGEST_PENDING_KEY, email)
+    except Exception:
+        log.exception("Failed to flush notification digests")
+    finally:
+        if session:
+            try:
+                session.quit()
+            except Exception:
+                pass
+    return sent
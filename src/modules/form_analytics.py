@@ -0,0 +1,252 @@
+from src import log
+from src.database.mongo import mongo_client
+
+# one document per form holding running totals, reading it costs the same no matter how many submissions there are
+STATS_COLLECTION = "form_stats"
+SUBMISSION_COLLECTIONS = {
+    "quiz": "quiz_submissions",
+    "survey": "survey_submissions"
+}
+
+
+def usable_question_id(question_id) -> bool:
+    # ids become field names so anything mongo would read as a path or operator is skipped
+    return isinstance(question_id, str) and bool(question_id) and "." not in question_id and not question_id.startswith("$")
+
+
+def submission_counts(submission: dict, form_type: str) -> dict:
+    """Function to turn a single submission into the counters it adds to the forms stats
+
+    Args:
+        submission (dict): submitted form
+        form_type (str): quiz or survey
+
+    Returns:
+        dict: dotted counter path to amount to add
+    """
+    counts = {"submissions": 1}
+    if form_type == "quiz":
+        counts.update({
+            "passed": 1 if submission.get("passing") else 0,
+            "totalScore": submission.get("score") or 0,
+            "totalPossible": submission.get("possibleScore") or 0
+        })
+
+    counted = set()
+    for question in submission.get("questions") or []:
+        question_id = question.get("questionId")
+        if not usable_question_id(question_id) or question_id in counted:
+            continue
+        counted.add(question_id)
+
+        answer = question.get("answer")
+        prefix = f"questions.{question_id}"
+        counts[f"{prefix}.answered"] = 1 if answer else 0
+        if form_type == "quiz":
+            counts[f"{prefix}.correct"] = 1 if question.get("correct") else 0
+        if answer and answer.get("choicePosition") is not None:
+            counts[f"{prefix}.choices.{answer['choicePosition']}"] = 1
+
+    return counts
+
+
+async def record_submission(form_id: str, form_type: str, submission: dict) -> bool:
+    """Function to add a submission to the running stats of its form
+
+    Args:
+        form_id (str): id of the form
+        form_type (str): quiz or survey
+        submission (dict): submitted form
+
+    Returns:
+        bool: true if the stats were updated
+    """
+    try:
+        return await mongo_client.increment(
+            STATS_COLLECTION,
+            query={"formId": form_id},
+            counts=submission_counts(submission, form_type),
+            on_insert={"formType": form_type}
+        )
+    except Exception:
+        log.exception(f"Failed to record submission stats for form {form_id}")
+    return False
+
+
+def backfill_pipeline(form_id: str) -> list:
+    unwind = {"$unwind": "$questions"}
+    return [
+        {"$match": {"formId": form_id}},
+        {"$facet": {
+            "totals": [
+                {"$group": {
+                    "_id": None,
+                    "submissions": {"$sum": 1},
+                    "passed": {"$sum": {"$cond": ["$passing", 1, 0]}},
+                    "totalScore": {"$sum": {"$ifNull": ["$score", 0]}},
+                    "totalPossible": {"$sum": {"$ifNull": ["$possibleScore", 0]}}
+                }}
+            ],
+            "questions": [
+                unwind,
+                {"$group": {
+                    "_id": "$questions.questionId",
+                    "answered": {"$sum": {"$cond": [{"$ifNull": ["$questions.answer", False]}, 1, 0]}},
+                    "correct": {"$sum": {"$cond": [{"$eq": ["$questions.correct", True]}, 1, 0]}}
+                }}
+            ],
+            "choices": [
+                unwind,
+                {"$match": {"questions.answer.choicePosition": {"$ne": None}}},
+                {"$group": {
+                    "_id": {
+                        "questionId": "$questions.questionId",
+                        "choicePosition": "$questions.answer.choicePosition"
+                    },
+                    "count": {"$sum": 1}
+                }}
+            ]
+        }}
+    ]
+
+
+def regrade_counts(regraded: list) -> dict:
+    """Function to turn re-graded quiz submissions into the counters that move the stats from the old grades to the new ones
+
+    Args:
+        regraded (list): tuples of the submission before and after it was re-graded
+
+    Returns:
+        dict: dotted counter path to amount to add, unchanged counters are left out
+    """
+    counts = {}
+    for before, after in regraded:
+        for path, amount in submission_counts(after, "quiz").items():
+            counts[path] = counts.get(path, 0) + amount
+        for path, amount in submission_counts(before, "quiz").items():
+            counts[path] = counts.get(path, 0) - amount
+    return {path: amount for path, amount in counts.items() if amount}
+
+
+async def record_regrade(form_id: str, regraded: list) -> bool:
+    """Function to update the stats of a quiz for re-graded submissions
+
+    Args:
+        form_id (str): id of the quiz
+        regraded (list): tuples of the submission before and after it was re-graded
+
+    Returns:
+        bool: true if the stats were updated
+    """
+    try:
+        counts = regrade_counts(regraded)
+        # only an existing document is moved, a missing one is built from the already re-graded submissions
+        if counts and not await mongo_client.increment(STATS_COLLECTION, query={"formId": form_id}, counts=counts, upsert=False):
+            return False
+        return await backfill_form_stats(form_id, "quiz")
+    except Exception:
+        log.exception(f"Failed to record re-graded stats for form {form_id}")
+    return False
+
+
+async def backfill_form_stats(form_id: str, form_type: str) -> bool:
+    """Function to build the stats of a form from every stored submission, if it has none yet
+
+    Args:
+        form_id (str): id of the form
+        form_type (str): quiz or survey
+
+    Returns:
+        bool: true if the form has stats
+    """
+    try:
+        # stats that exist are kept up to date by record_submission, overwriting them would drop the
+        # submissions counted while the aggregation ran
+        if await mongo_client.find_one(STATS_COLLECTION, {"formId": form_id}, exclude=["_id"]):
+            return True
+
+        result = await mongo_client.aggregate(SUBMISSION_COLLECTIONS[form_type], backfill_pipeline(form_id))
+        if result is False:
+            return False
+
+        facets = result[0] if result else {"totals": [], "questions": [], "choices": []}
+        totals = facets["totals"][0] if facets["totals"] else {}
+        stats = {
+            "formId": form_id,
+            "formType": form_type,
+            "submissions": totals.get("submissions", 0),
+            "questions": {}
+        }
+        if form_type == "quiz":
+            stats.update({
+                "passed": totals.get("passed", 0),
+                "totalScore": totals.get("totalScore", 0),
+                "totalPossible": totals.get("totalPossible", 0)
+            })
+
+        for question in facets["questions"]:
+            if not usable_question_id(question["_id"]):
+                continue
+            stats["questions"][question["_id"]] = {"answered": question["answered"], "choices": {}}
+            if form_type == "quiz":
+                stats["questions"][question["_id"]]["correct"] = question["correct"]
+
+        for choice in facets["choices"]:
+            question = stats["questions"].get(choice["_id"]["questionId"])
+            if question is not None:
+                question["choices"][str(choice["_id"]["choicePosition"])] = choice["count"]
+
+        # a submission recorded since the check above created the document first and wins
+        return await mongo_client.insert_missing(STATS_COLLECTION, query={"formId": form_id}, content=stats)
+    except Exception:
+        log.exception(f"Failed to backfill stats for form {form_id}")
+    return False
+
+
+def rate(part: float, whole: float) -> float:
+    return round((part / whole) * 100, 2) if whole else 0
+
+
+async def get_form_stats(form_id: str) -> dict:
+    """Function to get the stats of a form
+
+    Args:
+        form_id (str): id of the form
+
+    Returns:
+        dict: totals of the form and per question answer counts, None if there are no stats
+    """
+    stats = await mongo_client.find_one(STATS_COLLECTION, {"formId": form_id}, exclude=["_id"])
+    if not stats:
+        return None
+
+    submissions = stats.get("submissions", 0)
+    questions = []
+    for question_id, question in (stats.get("questions") or {}).items():
+        answered = question.get("answered", 0)
+        choices = question.get("choices") or {}
+        questions.append({
+            "questionId": question_id,
+            "answered": answered,
+            "correct": question.get("correct"),
+            "correctRate": rate(question["correct"], answered) if "correct" in question else None,
+            "choices": sorted([
+                {
+                    "choicePosition": int(position),
+                    "count": count,
+                    "percent": rate(count, answered)
+                }
+                for position, count in choices.items()
+            ], key=lambda c: c["choicePosition"])
+        })
+
+    is_quiz = stats.get("formType") == "quiz"
+    return {
+        "formId": form_id,
+        "formType": stats.get("formType"),
+        "submissions": submissions,
+        "passed": stats.get("passed", 0) if is_quiz else None,
+        "passRate": rate(stats.get("passed", 0), submissions) if is_quiz else None,
+        "averageScore": rate(stats.get("totalScore", 0), stats.get("totalPossible", 0)) if is_quiz else None,
+        "questions": questions
+    }
@@ -47,7 +47,7 @@ async def survey_builder(survey: create_survey.Input, user_id: str):
     if not submitted_survey:
         return None
 
-    submitted_survey = mongo_client.insert(
+    submitted_survey = await mongo_client.insert(
         collection="survey", content=form_doc.copy())
     if not submitted_survey:
         return None
@@ -94,7 +94,7 @@ async def quiz_builder(quiz: create_quiz.Input, user_id: str):
     if not submitted_quiz:
         return None
 
-    submitted_quiz = mongo_client.insert(
+    submitted_quiz = await mongo_client.insert(
         collection="quiz", content=form_doc.copy())
     if not submitted_quiz:
         return None
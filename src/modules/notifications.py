@@ -10,6 +10,7 @@ from src.api.api_models.global_models import User
 from src.database.sql.course_functions import get_course, get_bundle
 from src.utils.mailer import send_email, class_calendar_invite
 from src.utils.generate_random_code import generate_random_code
+from src.modules.digest import queue_digest
 
 
 def load_template(location: str):
@@ -329,6 +330,8 @@ async def instructor_enroll_notification(users: list, course_id: str):
                         first_class_dtm=course[0]["startDate"]
                     )
                 }
+                if await queue_digest(user.email, "instructor_enroll", template, user.firstName):
+                    continue
                 tries = 0
                 while True:
                     try:
@@ -407,6 +410,8 @@ async def student_enroll_notification(users: list, course_id: str):
                     ),
                     "attachments": []
                 }
+                if await queue_digest(user.email, "student_enroll", template, user.firstName):
+                    continue
                 tries = 0
                 while True:
                     try:
@@ -474,6 +479,8 @@ async def student_bundle_enroll_notification(users: list, bundle_id: str):
                     ),
                     "attachments": []
                 }
+                if await queue_digest(user.email, "student_bundle_enroll", template, user.firstName):
+                    continue
                 tries = 0
                 while True:
                     try:
@@ -537,6 +544,8 @@ async def self_bundle_enroll_notification(users: list, bundle_id: str):
                     ),
                     "attachments": []
                 }
+                if await queue_digest(user.email, "self_bundle_enroll", template, user.firstName):
+                    continue
                 tries = 0
                 while True:
                     try:
@@ -599,6 +608,8 @@ async def self_enroll_notification(user: User, course_id: str, registration_stat
                     registration_status=registration_status
                 )
             }
+            if await queue_digest(user.email, "self_enroll", template, user.firstName):
+                return True
             tries = 0
             while True:
                 try:
@@ -621,7 +632,7 @@ async def self_enroll_notification(user: User, course_id: str, registration_stat
 
 
 # TODO: test notification
-def scheduled_class_update_notifcation(users: list, new_class: dict, original_class: dict, course: dict):
+async def scheduled_class_update_notifcation(users: list, new_class: dict, original_class: dict, course: dict):
     if new_class["is_complete"]:
         return True
 
@@ -651,7 +662,7 @@ def scheduled_class_update_notifcation(users: list, new_class: dict, original_cl
                     "body": template["email"]["body"].format(
                         company_name=os.getenv(
                             "COMPANY_NAME", "ABC Safety Group"),
-                        name=user.firstName,
+                        name=user["first_name"],
                         original_start_time=original_class["start_dtm"],
                         course_name=course["courseName"],
                         new_start_date=new_class["start_dtm"],
@@ -667,6 +678,8 @@ def scheduled_class_update_notifcation(users: list, new_class: dict, original_cl
                     ]
 
                 }
+                if await queue_digest(user["email"], "scheduled_class_update", template, user["first_name"]):
+                    continue
                 tries = 0
                 while True:
                     try:
@@ -690,7 +703,7 @@ def scheduled_class_update_notifcation(users: list, new_class: dict, original_cl
 # TODO: test notification
 
 
-def canceled_course_notification(course: dict, students: list, instructors: list, first_class_dtm: datetime.datetime):
+async def canceled_course_notification(course: dict, students: list, instructors: list, first_class_dtm: datetime.datetime):
     users = []
     if students:
         users.extend(students)
@@ -740,6 +753,8 @@ def canceled_course_notification(course: dict, students: list, instructors: list
                     # ]
 
                 }
+                if await queue_digest(user["email"], "canceled_course", template, user["first_name"]):
+                    continue
                 tries = 0
                 while True:
                     try:
@@ -763,7 +778,7 @@ def canceled_course_notification(course: dict, students: list, instructors: list
 # TODO: test notification
 
 
-def enrollment_update_notification(user: User, course: dict, bundle: dict, new_status: str) -> bool:
+async def enrollment_update_notification(user: User, course: dict, bundle: dict, new_status: str) -> bool:
     try:
         template = load_template(
             "/source/src/content/templates/register/enroll_update.json")
@@ -801,6 +816,8 @@ def enrollment_update_notification(user: User, course: dict, bundle: dict, new_s
                 "body": body
             }
 
+            if await queue_digest(user.email, "enrollment_update", template, user.firstName):
+                return True
             tries = 0
             while True:
                 try:
@@ -825,7 +842,7 @@ def enrollment_update_notification(user: User, course: dict, bundle: dict, new_s
 # TODO: test notification
 
 
-def remove_enrollment_update_notification(user: User, course: dict = None, bundle: dict = None) -> bool:
+async def remove_enrollment_update_notification(user: User, course: dict = None, bundle: dict = None) -> bool:
     try:
         template = load_template(
             "/source/src/content/templates/register/unenroll_update.json")
@@ -861,6 +878,8 @@ def remove_enrollment_update_notification(user: User, course: dict = None, bundl
                 "body": body
             }
 
+            if await queue_digest(user.email, "remove_enrollment_update", template, user.firstName):
+                return True
             tries = 0
             while True:
                 try:
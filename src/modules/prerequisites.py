@@ -0,0 +1,124 @@
+import json
+from typing import Dict, List, Tuple
+
+from src import log, redis_client
+from src.database.sql import get_connection, acquire_connection
+
+# a change to any course's prerequisites can change the closure of every course that depends on
+# it, so instead of tracking dependents every cached closure is keyed by a version that is bumped
+PREREQUISITE_VERSION_KEY = "prerequisites_version"
+PREREQUISITE_EXPIRY = 60 * 60 * 24
+
+CLOSURE_QUERY = """
+    WITH RECURSIVE closure(course_id, prerequisite) AS (
+        SELECT course_id, prerequisite
+        FROM prerequisites
+        WHERE course_id = ANY($1) AND prerequisite IS NOT NULL
+        UNION
+        SELECT c.course_id, p.prerequisite
+        FROM closure c
+        JOIN prerequisites p
+        ON p.course_id = c.prerequisite
+        WHERE p.prerequisite IS NOT NULL
+    )
+    SELECT course_id, array_agg(DISTINCT prerequisite) as prerequisites
+    FROM closure
+    GROUP BY course_id;
+"""
+
+
+def closure_key(version: int, course_id: str) -> str:
+    return f"prerequisites_{version}_{course_id}"
+
+
+def invalidate_prerequisites():
+    try:
+        redis_client.redis_client.incr(PREREQUISITE_VERSION_KEY)
+    except Exception:
+        log.exception("Failed to invalidate cached prerequisites")
+
+
+async def get_prerequisite_closure(course_ids: List[str]) -> Dict[str, List[str]]:
+    """Function to get every course that has to be completed before each course, directly or through another prerequisite
+
+    Args:
+        course_ids (List[str]): courses to get the prerequisites of
+
+    Returns:
+        Dict[str, List[str]]: course id to the ids of all of its prerequisites
+    """
+    course_ids = list(dict.fromkeys(course_ids))
+    closures = {}
+    version = 0
+    try:
+        version = int(redis_client.redis_client.get(PREREQUISITE_VERSION_KEY) or 0)
+        cached = redis_client.redis_client.mget([closure_key(version, course_id) for course_id in course_ids])
+        for course_id, closure in zip(course_ids, cached):
+            if closure is not None:
+                closures[course_id] = json.loads(closure)
+    except Exception:
+        log.exception("Failed to get cached prerequisites")
+
+    missing = [course_id for course_id in course_ids if course_id not in closures]
+    if not missing:
+        return closures
+
+    db_pool = await get_connection()
+    async with acquire_connection(db_pool) as conn:
+        found = await conn.fetch(CLOSURE_QUERY, missing)
+
+    for course_id in missing:
+        closures[course_id] = []
+    for row in found:
+        # a cycle would make a course its own prerequisite
+        closures[row['course_id']] = sorted(p for p in row['prerequisites'] if p != row['course_id'])
+
+    try:
+        pipe = redis_client.redis_client.pipeline()
+        for course_id in missing:
+            pipe.set(closure_key(version, course_id), json.dumps(closures[course_id]), ex=PREREQUISITE_EXPIRY)
+        pipe.execute()
+    except Exception:
+        log.exception("Failed to cache prerequisites")
+
+    return closures
+
+
+async def missing_prerequisites(pairs: List[Tuple[str, str]]) -> Dict[str, Dict[str, List[str]]]:
+    """Function to check which prerequisites users are missing for courses, in one query for every pair
+
+    Args:
+        pairs (List[Tuple[str, str]]): user id and the course id they want to enroll in
+
+    Returns:
+        Dict[str, Dict[str, List[str]]]: user id to course id to the prerequisite course ids they have no certificate for,
+            only users missing something are included
+    """
+    if not pairs:
+        return {}
+
+    closures = await get_prerequisite_closure([course_id for _, course_id in pairs])
+    required = {prerequisite for closure in closures.values() for prerequisite in closure}
+    if not required:
+        return {}
+
+    user_ids = list(dict.fromkeys(user_id for user_id, _ in pairs))
+    db_pool = await get_connection()
+    async with acquire_connection(db_pool) as conn:
+        found = await conn.fetch("""
+            SELECT user_id, array_agg(DISTINCT course_id) as courses
+            FROM user_certificates
+            WHERE user_id = ANY($1) AND course_id = ANY($2)
+            GROUP BY user_id;
+        """, user_ids, list(required))
+
+    completed = {row['user_id']: set(row['courses']) for row in found}
+    missing = {}
+    for user_id, course_id in pairs:
+        lacking = [
+            prerequisite for prerequisite in closures.get(course_id, [])
+            if prerequisite not in completed.get(user_id, set())
+        ]
+        if lacking:
+            missing.setdefault(user_id, {})[course_id] = lacking
+    return missing
@@ -0,0 +1,180 @@
+import copy
+import json
+from typing import Tuple, Union
+
+from src import log, redis_client
+from src.database.mongo import mongo_client
+from src.database.sql.form_functions import update_quiz_submission_scores
+from src.modules.form_analytics import record_regrade
+
+# answer types that have choices to grade
+GRADED_TYPES = ["MC", "multipleChoice"]
+ANSWER_KEY_EXPIRY = 60 * 60 * 24
+
+
+def answer_key_name(quiz_id: str) -> str:
+    return f"quiz_key_{quiz_id}"
+
+
+def compile_answer_key(quiz: dict) -> dict:
+    """Function to compile a quiz into the parts needed to grade it
+
+    Args:
+        quiz (dict): quiz document from mongo
+
+    Returns:
+        dict: attempts, passing points, possible score and questionId to point value and correct choices
+    """
+    questions = {}
+    for question in quiz.get("questions") or []:
+        if question.get("answerType") not in GRADED_TYPES:
+            continue
+
+        questions[question["questionId"]] = {
+            "pointValue": question.get("pointValue") or 0,
+            "correct": [
+                [choice["choicePosition"], choice["description"]]
+                for choice in question.get("choices") or []
+                if choice.get("isCorrect")
+            ]
+        }
+
+    return {
+        "formId": quiz["formId"],
+        "attempts": quiz.get("attempts") or 1,
+        "passingPoints": quiz.get("passingPoints") or 0,
+        "possibleScore": sum(q["pointValue"] for q in questions.values()),
+        "questions": questions
+    }
+
+
+async def get_answer_key(quiz_id: str) -> Union[dict, None]:
+    """Function to get the compiled answer key of a quiz, compiling and caching it on a miss
+
+    Args:
+        quiz_id (str): id of the quiz
+
+    Returns:
+        Union[dict, None]: compiled answer key or None if the quiz does not exist
+    """
+    try:
+        cached = redis_client.get_key(answer_key_name(quiz_id))
+        if cached:
+            return json.loads(cached)
+    except Exception:
+        log.exception(f"Failed to get cached answer key for quiz {quiz_id}")
+
+    quiz = await mongo_client.find_one("quiz", {"formId": quiz_id}, exclude=["_id"])
+    if not quiz:
+        return None
+
+    answer_key = compile_answer_key(quiz)
+    try:
+        redis_client.set_key(answer_key_name(quiz_id), json.dumps(answer_key), ANSWER_KEY_EXPIRY)
+    except Exception:
+        log.exception(f"Failed to cache answer key for quiz {quiz_id}")
+    return answer_key
+
+
+def invalidate_answer_key(quiz_id: str):
+    try:
+        redis_client.delete_key(answer_key_name(quiz_id))
+    except Exception:
+        log.exception(f"Failed to invalidate answer key for quiz {quiz_id}")
+
+
+def grade_submission(answer_key: dict, questions: list) -> Tuple[float, float]:
+    """Function to grade submitted answers against an answer key in a single pass
+
+    Marks each graded question with its point value and whether it was correct.
+
+    Args:
+        answer_key (dict): compiled answer key
+        questions (list): submitted questions with their answer
+
+    Returns:
+        Tuple[float, float]: earned points and possible points
+    """
+    earned_points = 0
+    graded = set()
+    for submitted_question in questions:
+        key = answer_key["questions"].get(submitted_question.get("questionId"))
+        # questions answered twice only count once
+        if not key or submitted_question["questionId"] in graded:
+            continue
+        graded.add(submitted_question["questionId"])
+
+        submitted_question["pointValue"] = key["pointValue"]
+        submitted_question["correct"] = False
+        answer = submitted_question.get("answer")
+        if not answer:
+            continue
+
+        if [answer.get("choicePosition"), answer.get("description")] in key["correct"]:
+            earned_points += key["pointValue"]
+            submitted_question["correct"] = True
+
+    return earned_points, answer_key["possibleScore"]
+
+
+async def regrade_submissions(quiz_id: str) -> int:
+    """Function to re-grade every stored submission of a quiz against its current answer key
+
+    Args:
+        quiz_id (str): id of the quiz
+
+    Returns:
+        int: amount of submissions re-graded
+    """
+    try:
+        answer_key = await get_answer_key(quiz_id)
+        if not answer_key:
+            return 0
+
+        submissions = await mongo_client.find("quiz_submissions", {"formId": quiz_id})
+        if not submissions:
+            return 0
+
+        mongo_updates = []
+        scores = []
+        regraded = []
+        for submission in submissions:
+            before = copy.deepcopy(submission)
+            questions = submission.get("questions") or []
+            earned_points, possible_score = grade_submission(answer_key, questions)
+            passing = earned_points >= answer_key["passingPoints"]
+            if (
+                submission.get("score") == earned_points and
+                submission.get("possibleScore") == possible_score and
+                submission.get("passing") == passing
+            ):
+                continue
+
+            mongo_updates.append((
+                {"_id": submission["_id"]},
+                {
+                    "questions": questions,
+                    "passing": passing,
+                    "score": earned_points,
+                    "possibleScore": possible_score
+                }
+            ))
+            scores.append((submission["responseId"], passing, earned_points, possible_score))
+            regraded.append((before, {**submission, "passing": passing, "score": earned_points, "possibleScore": possible_score}))
+
+        if not mongo_updates:
+            return 0
+
+        if not await mongo_client.update_bulk("quiz_submissions", mongo_updates):
+            return 0
+
+        if not await update_quiz_submission_scores(scores):
+            return 0
+
+        # scores changed under the running totals, move them by the difference
+        await record_regrade(quiz_id, regraded)
+        log.info(f"Re-graded {len(scores)} submissions for quiz {quiz_id}")
+        return len(scores)
+    except Exception:
+        log.exception(f"Failed to re-grade submissions for quiz {quiz_id}")
+    return 0
@@ -1,10 +1,15 @@
 import os
 import asyncio
 import re
-import asyncio_redis
 import json
+import base64
+import hashlib
+import signal
+import socket
 import datetime
 import tempfile
+import redis.asyncio as aioredis
+from redis.exceptions import ResponseError
 from pyppeteer.errors import TimeoutError
 from pyppeteer import launch
 from cuid2 import Cuid
@@ -18,6 +23,53 @@ from src.modules.notifications import (
     student_failed_users_notification,
     training_connect_failure_notification
 )
+from src.modules.training_connect_queue import (
+    TRAINING_CONNECT_STREAM,
+    TRAINING_CONNECT_GROUP,
+    UPLOAD_EXPIRY,
+    upload_key,
+    results_key,
+    rows_key,
+    serializer
+)
+
+# how long a row can sit unacknowledged before another worker takes it over. rows being worked on
+# are claimed again every third of that so only rows of a worker that stopped are ever taken over
+CLAIM_IDLE = int(os.getenv("TRAINING_CONNECT_CLAIM_IDLE", 15 * 60 * 1000))
+# only reset the idle time of a row if this worker still owns it
+REFRESH_CLAIM = """
+local pending = redis.call("xpending", KEYS[1], ARGV[1], ARGV[2], ARGV[2], 1)
+if pending[1] and pending[1][2] == ARGV[3] then
+    redis.call("xclaim", KEYS[1], ARGV[1], ARGV[3], 0, ARGV[2], "JUSTID")
+    return 1
+end
+return 0
+"""
+MAX_DELIVERIES = int(os.getenv("TRAINING_CONNECT_MAX_DELIVERIES", 3))
+# amount of rows worked on at the same time, each with its own page
+PARALLELISM = int(os.getenv("TRAINING_CONNECT_PARALLELISM", 3))
+TRAINING_CONNECT_URL = os.getenv("TRAINING_CONNECT_URL", "https://dob-trainingconnect.cityofnewyork.us")
+PROVIDER_ID = os.getenv("TRAINING_CONNECT_PROVIDER_ID", "36cd1e6e-62b5-4770-ad4f-08d97ed9594c")
+CHROME_PATH = os.getenv("TRAINING_CONNECT_CHROME", "/usr/bin/google-chrome-stable")
+# when set only the worker holding the leader lock uploads, the rest stand by
+EXCLUSIVE = os.getenv("TRAINING_CONNECT_EXCLUSIVE", "false").lower() == "true"
+LEADER_KEY = f"{TRAINING_CONNECT_STREAM}_leader"
+LEADER_LEASE = int(os.getenv("TRAINING_CONNECT_LEADER_LEASE", 30000))
+# only extend or release the lease if this worker still holds it
+RENEW_LEADER = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("pexpire", KEYS[1], ARGV[2])
+end
+return 0
+"""
+MATCH_TTL = int(os.getenv("TRAINING_CONNECT_MATCH_TTL", 60 * 60 * 24 * 30))
+ADD_CERTIFICATE_ERROR = "An error occured while adding certificate, please manually upload."
+RELEASE_LEADER = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
 
 
 def find_in_select(element: str, find: str):
@@ -42,24 +94,157 @@ def find_in_select(element: str, find: str):
     return code
 
 
-class TrainingConnect:
-    def __init__(self):
-        self.page = None
-        self.browser = None
-        self.redis = None
+def normalize_dob(dob) -> str:
+    if not dob:
+        return ""
+    if isinstance(dob, (datetime.datetime, datetime.date)):
+        return dob.strftime("%Y-%m-%d")
+    for date_format in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d", "%m/%d/%Y"):
+        try:
+            return datetime.datetime.strptime(str(dob).strip(), date_format).strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    return str(dob).strip()
+
+
+def profile_matches(user: dict, fields: list) -> bool:
+    """Function to check a remembered profile still belongs to a student before anything is uploaded to it
+
+    Args:
+        user (dict): row of the student
+        fields (list): field values of the profile, phone, email and birth date are the 6th, 7th and 8th
+
+    Returns:
+        bool: true if the profile shows both names and the same email, phone number or birth date
+    """
+    if len(fields) < 8:
+        return False
+
+    shown = {" ".join(field.lower().split()) for field in fields}
+    for name in (user.get("first_name"), user.get("last_name")):
+        if " ".join(str(name or "").lower().split()) not in shown:
+            return False
+
+    email = str(user.get("email") or "").strip().lower()
+    phone = re.sub(r"\D", "", str(user.get("phone_number") or ""))
+    dob = normalize_dob(user.get("date_of_birth") or user.get("dob"))
+    return bool(
+        (email and fields[6].lower() == email)
+        or (phone and re.sub(r"\D", "", fields[5]) == phone)
+        or (dob and normalize_dob(fields[7]) == dob)
+    )
+
+
+class MatchCache:
+    """Remembers which Training Connect profile a student matched so repeat rows
+    skip the student search and profile scans
+    """
+
+    def __init__(self, redis):
+        self.redis = redis
+
+    @staticmethod
+    def key(user: dict):
+        name = " ".join(f"{user.get('first_name') or ''} {user.get('last_name') or ''}".lower().split())
+        dob = normalize_dob(user.get('date_of_birth') or user.get('dob'))
+        osha_id = str(user.get('osha_id') or '').strip().lower()
+        sstid = str(user.get('sstid') or '').replace(" ", "").lower()
+        # a name alone is not enough to tell two students apart
+        if not name or not (dob or osha_id or sstid):
+            return None
 
-        self.logged_in = False
+        digest = hashlib.sha1("|".join([name, dob, osha_id, sstid]).encode()).hexdigest()
+        return f"training_connect_match_{digest}"
+
+    async def get(self, key: str):
+        if not key:
+            return None
+
+        try:
+            url = await self.redis.get(key)
+            return url.decode() if url else None
+        except Exception:
+            log.exception("Failed to get training connect match")
+        return None
+
+    async def set(self, key: str, url: str):
+        if not key or not url:
+            return
+
+        try:
+            await self.redis.set(key, url, ex=MATCH_TTL)
+        except Exception:
+            log.exception("Failed to save training connect match")
+
+    async def invalidate(self, key: str):
+        if not key:
+            return
+
+        try:
+            await self.redis.delete(key)
+        except Exception:
+            log.exception("Failed to invalidate training connect match")
+
+
+class TrainingConnectRow:
+    """State of a single uploaded row, every row gets its own page so rows can run side by side
+    """
+
+    def __init__(self, page, cuid_generator: Cuid, match_cache: MatchCache = None):
+        self.page = page
         self.match_user_url = ""
-        self.email = ""
+        self.match_key = None
         self.users = []
         self.tmpfiles = []
-        self.generated = []
-        self.pattern = re.compile(r'(\d+)\s+(.+)')
-        self.cuid_generator: Cuid = Cuid(length=15)
+        self.cuid_generator = cuid_generator
+        self.match_cache = match_cache
+
+    async def remember_match(self, url: str):
+        if self.match_cache:
+            await self.match_cache.set(self.match_key, url)
+
+    async def use_cached_match(self, user: dict, url: str, upload_type: str) -> bool:
+        try:
+            matches = profile_matches(user, await self.profile_fields(url))
+        except Exception:
+            log.exception(f"Failed to check cached profile {url}")
+            matches = False
+
+        # the cached profile no longer belongs to this student, forget it and search again
+        if not matches:
+            log.info(f"cached profile {url} did not match, looking up again")
+            await self.match_cache.invalidate(self.match_key)
+            return False
 
-        self.queue_running = False
-        self.queue_lock = asyncio.Lock()
-        self.queue = []
+        if upload_type == "student":
+            await self.add_failed(user, "User already exists", upload_type=upload_type)
+            return True
+
+        users = len(self.users)
+        try:
+            await self.update_user(user, url, upload_type=upload_type)
+        except Exception as e:
+            log.exception(f"Failed to use cached profile {url}")
+            training_connect_failure_notification(
+                body="Failed to upload certificate to student", stack_trace=str(e))
+            await self.add_failed(user, ADD_CERTIFICATE_ERROR, upload_type=upload_type)
+
+        # the upload may have reached the site already so it is not tried again, the next row searches instead
+        if any(u.get("failed") for u in self.users[users:]):
+            await self.match_cache.invalidate(self.match_key)
+        return True
+
+    async def profile_fields(self, user_url: str) -> list:
+        # visit users profile url and read the field values shown on it
+        await self.goto_user_profile(user_url)
+        await self.page.waitForSelector(".sc-field-value", visible=True)
+        await self.page.waitFor(1000)
+
+        fieldValues = []
+        for fieldValueElement in await self.page.querySelectorAll('.sc-field-value'):
+            fieldValue = await self.page.evaluate('(element) => element.textContent', fieldValueElement)
+            fieldValues.append(fieldValue.strip())
+        return fieldValues
 
     async def generate_cert(self, user, failed: bool):
         cert_id = user["certificate_id"] if user.get(
@@ -165,7 +350,7 @@ class TrainingConnect:
                 await self.add_failed(user, f"dob: {user['dob']}, incorrect format.", upload_type=upload_type)
                 return
 
-            await self.page.goto("https://dob-trainingconnect.cityofnewyork.us/Students/Create?providerId=36cd1e6e-62b5-4770-ad4f-08d97ed9594c")
+            await self.page.goto(f"{TRAINING_CONNECT_URL}/Students/Create?providerId={PROVIDER_ID}")
             await self.page.waitForSelector('.col-auto')
             await self.page.type('#FirstName', str(user['first_name']))
 
@@ -318,7 +503,7 @@ class TrainingConnect:
                 "something went wrong when trying to add the users certificate")
             training_connect_failure_notification(
                 body="Failed to add certificate to user", stack_trace=str(e))
-            await self.add_failed(user, "An error occured while adding certificate, please manually upload.", upload_type=upload_type)
+            await self.add_failed(user, ADD_CERTIFICATE_ERROR, upload_type=upload_type)
 
     async def goto_user_profile(self, user_profile_url):
         await self.page.goto(user_profile_url)
@@ -353,20 +538,8 @@ class TrainingConnect:
         # self.match_user_url = ""
 
     async def check_match(self, user, user_url, amount, index, upload_type: str):
-        # visit users profile url to start validation
-        await self.goto_user_profile(user_url)
-        await self.page.waitForSelector(".sc-field-value", visible=True)
-        await self.page.waitFor(1000)
-
-        # this is what actually gets all the elements / field values which allows for us to get the values and check for matches
-        fieldValuesElements = await self.page.querySelectorAll('.sc-field-value')
-
-        fieldValues = []
-
-        for fieldValueElement in fieldValuesElements:
-            fieldValue = await self.page.evaluate('(element) => element.textContent', fieldValueElement)
-            fieldValue = fieldValue.strip()
-            fieldValues.append(fieldValue)
+        # this is what actually gets all the field values which allows for us to check for matches
+        fieldValues = await self.profile_fields(user_url)
 
         # 5, 6, 7 are the phone, email and birthdate listed on a users profile, these are used to get the value of them
         # and then compare them to the actual users info below
@@ -429,12 +602,14 @@ class TrainingConnect:
         # check if the amount of users found on STUDENT LOOKUP is equal to one, if so it only requires ONE match on the users profile
         if matches >= 2:
             self.match_user_url = self.page.url
+            await self.remember_match(self.match_user_url)
             if upload_type == "certificate":
                 await self.update_user(user, self.match_user_url, upload_type=upload_type)
             if upload_type == "student":
                 await self.add_failed(user, "User already exists", upload_type=upload_type)
         elif amount == 1 and matches >= 1:
             self.match_user_url = self.page.url
+            await self.remember_match(self.match_user_url)
             if upload_type == "certificate":
                 await self.update_user(user, self.match_user_url, upload_type=upload_type)
             if upload_type == "student":
@@ -461,6 +636,13 @@ class TrainingConnect:
         log.debug("log 1: looking up " +
                   str(user['first_name'] + " " + user["last_name"]))
 
+        if self.match_cache:
+            self.match_key = MatchCache.key(user)
+            cached_url = await self.match_cache.get(self.match_key)
+            if cached_url and await self.use_cached_match(user, cached_url, upload_type):
+                log.info("used cached training connect profile")
+                return
+
         if upload_type == 'student' or not user.get("osha_id") and not user.get("sstid") and not user.get("our_student"):
             if upload_type == 'student':
                 log.debug("upload type is student")
@@ -469,7 +651,7 @@ class TrainingConnect:
                     "user has no sst or osha and is not tagged as 'our_student'")
             try:
                 await self.page.goto(
-                    "https://dob-trainingconnect.cityofnewyork.us/CourseProviders/StudentLookup/36cd1e6e-62b5-4770-ad4f-08d97ed9594c?type=StudentName"
+                    f"{TRAINING_CONNECT_URL}/CourseProviders/StudentLookup/{PROVIDER_ID}?type=StudentName"
                 )
 
                 await self.page.evaluate(
@@ -537,7 +719,7 @@ class TrainingConnect:
         if user.get("sstid"):
             try:
                 await self.page.goto(
-                    "https://dob-trainingconnect.cityofnewyork.us/CourseProviders/StudentLookup/36cd1e6e-62b5-4770-ad4f-08d97ed9594c?type=CardId"
+                    f"{TRAINING_CONNECT_URL}/CourseProviders/StudentLookup/{PROVIDER_ID}?type=CardId"
                 )
 
                 await self.page.evaluate(f"document.getElementById('CardId').value = \"{user['sstid']}\"")
@@ -545,6 +727,7 @@ class TrainingConnect:
                 await self.page.waitForSelector("a[role='button']", timeout=5000)
 
                 url = await self.page.evaluate("document.querySelector(`a[role='button']`).href")
+                await self.remember_match(url)
 
                 await self.update_user(user, url, upload_type=upload_type)
             except (KeyError, TimeoutError):
@@ -561,7 +744,7 @@ class TrainingConnect:
             try:
                 log.info("user has osha_id")
                 await self.page.goto(
-                    "https://dob-trainingconnect.cityofnewyork.us/CourseProviders/StudentLookup/36cd1e6e-62b5-4770-ad4f-08d97ed9594c?type=OshaId"
+                    f"{TRAINING_CONNECT_URL}/CourseProviders/StudentLookup/{PROVIDER_ID}?type=OshaId"
                 )
 
                 await self.page.evaluate(f"document.getElementById('OshaId').value = '{user['osha_id']}'")
@@ -569,6 +752,7 @@ class TrainingConnect:
                 await self.page.waitForSelector("a[role='button']", timeout=5000)
 
                 url = await self.page.evaluate("document.querySelector(`a[role='button']`).href")
+                await self.remember_match(url)
 
                 await self.update_user(user, url, upload_type=upload_type)
             except (KeyError, TimeoutError):
@@ -583,7 +767,7 @@ class TrainingConnect:
 
         if user.get("our_student"):
             try:
-                await self.page.goto('https://dob-trainingconnect.cityofnewyork.us/CourseProviders/Dashboard/36cd1e6e-62b5-4770-ad4f-08d97ed9594c')
+                await self.page.goto(f"{TRAINING_CONNECT_URL}/CourseProviders/Dashboard/{PROVIDER_ID}")
                 await self.page.waitForSelector(".container.card", visible=True)
 
                 await self.page.evaluate(
@@ -622,169 +806,361 @@ class TrainingConnect:
                 )
             return
 
-    async def run_queue_item(self, userJson: dict, retries: int = 1):
 
-        try:
-            upload_info = userJson['upload_info']
-            upload_type = userJson['upload_info']['upload_type']
+class TrainingConnect:
+    def __init__(self, parallelism: int = None):
+        self.browser = None
+        self.redis = None
+
+        self.logged_in = False
+        self.parallelism = parallelism or PARALLELISM
+        self.browser_lock = asyncio.Lock()
+        # bumped on every launch so rows that saw the same browser fail only relaunch it once
+        self.browser_generation = 0
+        self.cuid_generator: Cuid = Cuid(length=15)
+        self.consumer = f"{socket.gethostname()}-{os.getpid()}"
+        self.is_leader = False
+        self.leader_task = None
+        self.match_cache = None
+
+    async def acquire_leadership(self):
+        log.info(f"{self.consumer} waiting for training connect leader lock")
+        while not await self.redis.set(LEADER_KEY, self.consumer, nx=True, px=LEADER_LEASE):
+            await asyncio.sleep(LEADER_LEASE / 2000)
+
+        log.info(f"{self.consumer} is the training connect leader")
+        self.is_leader = True
+        self.leader_task = asyncio.create_task(self.renew_leadership())
+
+    async def renew_leadership(self):
+        while self.is_leader:
+            await asyncio.sleep(LEADER_LEASE / 3000)
             try:
-                log.debug(str(upload_info['position']) +
-                          " " + str(upload_info['max']))
+                renewed = await self.redis.eval(RENEW_LEADER, 1, LEADER_KEY, self.consumer, LEADER_LEASE)
+            except Exception:
+                log.exception("Failed to renew training connect leader lock")
+                renewed = False
+
+            if not renewed:
+                log.error(f"{self.consumer} lost the training connect leader lock")
+                self.is_leader = False
+
+    async def open_browser(self, failed_generation: int = None):
+        """Launches the browser and logs in, unless another row already did
+
+        Args:
+            failed_generation (int, optional): generation of the browser that failed, it is only
+                relaunched if it is still the current one. Defaults to None to only launch when there is no browser.
+        """
+        async with self.browser_lock:
+            if self.browser and failed_generation != self.browser_generation:
+                return
 
-                if upload_info['position'] == 1:
-                    self.email = upload_info['uploader']
-                    try:
+            await self.close_browser()
+            log.info("starting browser and logging in...")
+            self.browser = await launch(
+                executablePath=CHROME_PATH,
+                headless=True,
+                args=[
+                    '--no-sandbox',
+                    '--disable-software-rasterizer',
+                    '--single-process',
+                    '--disable-dev-shm-usage',
+                    '--no-zygote'
+                ]
+            )
+            self.browser_generation += 1
 
-                        if not self.page and not self.logged_in:
-                            log.info("starting browser and logging in...")
-
-                            self.browser = await launch(
-                                executablePath='/usr/bin/google-chrome-stable',
-                                headless=True,
-                                args=[
-                                    '--no-sandbox',
-                                    '--disable-software-rasterizer',
-                                    '--single-process',
-                                    '--disable-dev-shm-usage',
-                                    '--no-zygote'
-                                ]
-                            )
-
-                            self.page = await self.browser.newPage()
-
-                            await asyncio.gather(
-                                self.login()
-                            )
-                    except Exception:
-                        log.exception("THERE WAS AN ERROR, RELOGGING IN")
+            # pages share the browsers session cookie so logging in once covers every row
+            page = await self.browser.newPage()
+            await self.login(page)
+            await page.close()
 
-            except Exception as e:
-                raise e
+    async def close_browser(self):
+        if self.browser:
+            try:
+                await self.browser.close()
+            except Exception:
+                log.exception("Failed to close browser")
+
+        self.browser = None
+        self.logged_in = False
+
+    async def new_page(self):
+        if not self.browser:
+            await self.open_browser()
+
+        generation = self.browser_generation
+        try:
+            return await self.browser.newPage()
+        except Exception:
+            # chrome itself is gone, every other row's page went with it
+            log.exception("Failed to open a page, relaunching browser")
+            await self.open_browser(failed_generation=generation)
+        return await self.browser.newPage()
+
+    async def get_page(self, relogin: bool = False):
+        try:
+            page = await self.new_page()
+        except Exception:
+            log.exception("Failed to open a page")
+            return None
+
+        if relogin:
+            # the previous try may have failed because the session expired, logging in again on this
+            # rows own page refreshes the shared cookie without touching the pages of other rows
+            try:
+                await self.login(page)
+            except Exception:
+                log.exception("Failed to log in again")
+        return page
+
+    async def run_queue_item(self, userJson: dict) -> TrainingConnectRow:
+        upload_type = None
+        try:
+            upload_info = userJson['upload_info']
+            upload_type = upload_info['upload_type']
+            log.debug(str(upload_info['position']) +
+                      " " + str(upload_info['max']))
         except Exception as e:
             log.exception("Failed json loading user")
             training_connect_failure_notification(
                 body="Failed to load user json", stack_trace=str(e))
 
-        if userJson:
+        retries = 1
+        while True:
+            page = await self.get_page(relogin=retries > 1)
+            row = TrainingConnectRow(page=page, cuid_generator=self.cuid_generator, match_cache=self.match_cache)
             try:
-                await self.do_lookup(userJson, upload_type)
+                await row.do_lookup(userJson, upload_type)
+                return row
             except Exception as e:
                 if retries >= 5:
                     log.exception(
                         "An exception occured while doing lookup final retry reached")
                     training_connect_failure_notification(
                         body="Final retry reached while doing lookup", stack_trace=str(e))
-                    await self.add_failed(
+                    await row.add_failed(
                         failed_user=userJson,
                         reason="Unable to do lookup on user.",
                         upload_type=upload_type
                     )
-                    return
+                    return row
 
                 log.exception(
                     "An exception occured while doing lookup... retrying")
-                if self.page:
-                    await self.page.close()
-
-                if self.browser:
-                    await self.browser.close()
-
-                self.page = None
-                self.browser = None
-                self.logged_in = False
+                retries += 1
+            finally:
+                if page:
+                    try:
+                        await page.close()
+                    except Exception:
+                        log.exception("Failed to close page")
+
+    async def record_result(self, row: TrainingConnectRow, userJson: dict, entry_id: bytes):
+        """Stores the failed users of a finished row on the upload and sends the
+        failed users report once every row of the upload is done
+        """
+        upload_info = userJson['upload_info']
+        upload_id = upload_info.get('upload_id')
+        if not upload_id:
+            log.error("Row has no upload id, unable to record result")
+            return
 
-                await self.run_queue_item(userJson, retries=retries+1)
+        # a row that ran twice is only counted once so the report never goes out early
+        if not await self.redis.sadd(rows_key(upload_id), entry_id):
+            log.error(f"stream entry {entry_id} was already recorded for upload {upload_id}")
+            return
 
-        if upload_info['position'] == upload_info['max']:
-            log.info("cleaning up for next queue...")
+        failed_users = [user for user in row.users if user.get("failed")]
+        failed_tmps = [tmp for tmp in row.tmpfiles if tmp['failed']]
+
+        pipe = self.redis.pipeline()
+        for failed in failed_users:
+            pipe.rpush(results_key(upload_id), json.dumps({
+                "type": "user",
+                "user": failed["user"],
+                "failed": True,
+                "reason": failed.get("reason")
+            }, default=serializer))
+        for tmp in failed_tmps:
+            pipe.rpush(results_key(upload_id), json.dumps({
+                "type": "tempfile",
+                "user": tmp["user"],
+                "tempfile": base64.b64encode(tmp["tempfile"]).decode()
+            }, default=serializer))
+        pipe.expire(results_key(upload_id), UPLOAD_EXPIRY)
+        pipe.expire(rows_key(upload_id), UPLOAD_EXPIRY)
+        pipe.hincrby(upload_key(upload_id), "done", 1)
+        done = (await pipe.execute())[-1]
+
+        # only the worker that finishes the last row sends the report
+        if done == int(upload_info['max']):
+            await self.notify_upload(upload_id)
+
+    async def notify_upload(self, upload_id: str):
+        log.info(f"upload {upload_id} finished, sending failed users")
+        info = await self.redis.hgetall(upload_key(upload_id))
+        info = {k.decode(): v.decode() for k, v in info.items()}
+        results = [json.loads(r) for r in await self.redis.lrange(results_key(upload_id), 0, -1)]
+
+        failed_users = [r for r in results if r["type"] == "user"]
+        if info.get("upload_type") == 'certificate':
+            failed_tmps = [
+                {"tempfile": base64.b64decode(r["tempfile"]), "failed": True, "user": r["user"]}
+                for r in results if r["type"] == "tempfile"
+            ]
+            try:
+                certification_failed_users_notification(
+                    info["uploader"], failed_users, int(info["max"]), failed_tmps, info.get("file_name"))
+            except Exception as e:
+                log.exception(
+                    "an error occured while sending failed notification")
+                training_connect_failure_notification(
+                    body="Final retry reached while doing lookup", stack_trace=str(e))
+        elif info.get("upload_type") == "student":
+            try:
+                student_failed_users_notification(
+                    info["uploader"], failed_users, info.get("file_name"))
+            except Exception as e:
+                log.exception(
+                    "an error occured while sending failed notification")
+                training_connect_failure_notification(
+                    body="An error occured while sending failed notification", stack_trace=str(e))
 
-            failed_users = [user for user in self.users if user.get("failed")]
-            if upload_type == 'certificate':
-                failed_tmps = [tmp for tmp in self.tmpfiles if tmp['failed']]
-                try:
-                    certification_failed_users_notification(
-                        self.email, failed_users, upload_info['max'], failed_tmps, upload_info["file_name"])
-                except Exception as e:
-                    log.exception(
-                        "an error occured while sending failed notification")
-                    training_connect_failure_notification(
-                        body="Final retry reached while doing lookup", stack_trace=str(e))
-            elif upload_type == "student":
-                try:
-                    student_failed_users_notification(
-                        self.email, failed_users, upload_info.get("file_name"))
-                except Exception as e:
-                    log.exception(
-                        "an error occured while sending failed notification")
-                    training_connect_failure_notification(
-                        body="An error occured while sending failed notification", stack_trace=str(e))
-
-            self.email = ""
-            self.match_user_url = ""
-
-            self.users.clear()
-            self.tmpfiles.clear()
-            await self.page.close()
-            await self.browser.close()
-            self.page = None
-            self.browser = None
-            self.logged_in = False
-        await asyncio.sleep(1)
-
-    async def run_queue_task(self, uploads: str):
-        if not uploads:
-            return
+        await self.redis.delete(upload_key(upload_id), results_key(upload_id), rows_key(upload_id))
 
+    async def create_group(self):
         try:
-            users = json.loads(uploads)
-        except Exception:
-            log.exception("Failed json loading users")
+            await self.redis.xgroup_create(TRAINING_CONNECT_STREAM, TRAINING_CONNECT_GROUP, id="0", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise e
 
-        for user_json in users:
-            await self.run_queue_item(userJson=user_json)
+    async def claim_stale(self, count: int) -> list:
+        # rows handed to a worker that crashed before acknowledging them
+        claimed = await self.redis.xautoclaim(
+            TRAINING_CONNECT_STREAM,
+            TRAINING_CONNECT_GROUP,
+            self.consumer,
+            min_idle_time=CLAIM_IDLE,
+            count=count
+        )
+        return claimed[1]
 
-    async def handle_queue(self):
+    async def keep_claim(self, entry_id: bytes):
+        # keeps a long running row from looking abandoned to claim_stale
         while True:
-            if not self.queue_running:
-                async with self.queue_lock:
-                    if self.queue:
-                        self.queue_running = True  # Update class attribute
-                        uploads = self.queue.pop(0)
-                        await self.run_queue_task(uploads)
-                        self.queue_running = False  # Update class attribute
-            await asyncio.sleep(1)  # Add this line to yield control
+            await asyncio.sleep(CLAIM_IDLE / 3000)
+            try:
+                owned = await self.redis.eval(
+                    REFRESH_CLAIM, 1, TRAINING_CONNECT_STREAM, TRAINING_CONNECT_GROUP, entry_id, self.consumer)
+            except Exception:
+                log.exception(f"Failed to refresh claim on stream entry {entry_id}")
+                continue
+
+            if not owned:
+                log.error(f"{self.consumer} no longer owns stream entry {entry_id}")
+                return
+
+    async def run_stream_entry(self, entry_id: bytes, fields: dict):
+        claim = asyncio.create_task(self.keep_claim(entry_id))
+        try:
+            if fields:
+                row = json.loads(fields[b"row"])
+                pending = await self.redis.xpending_range(
+                    TRAINING_CONNECT_STREAM, TRAINING_CONNECT_GROUP, min=entry_id, max=entry_id, count=1)
+
+                if pending and pending[0]["times_delivered"] > MAX_DELIVERIES:
+                    log.error(f"giving up on stream entry {entry_id} after {MAX_DELIVERIES} deliveries")
+                    result = TrainingConnectRow(page=None, cuid_generator=self.cuid_generator)
+                    await result.add_failed(
+                        failed_user=row,
+                        reason="Unable to do lookup on user.",
+                        upload_type=row['upload_info']['upload_type']
+                    )
+                else:
+                    result = await self.run_queue_item(userJson=row)
+                await self.record_result(result, row, entry_id)
+
+            await self.redis.xack(TRAINING_CONNECT_STREAM, TRAINING_CONNECT_GROUP, entry_id)
+            await self.redis.xdel(TRAINING_CONNECT_STREAM, entry_id)
+        except Exception as e:
+            # left unacknowledged so it gets reclaimed
+            log.exception(f"An exception occured while running stream entry {entry_id}")
+            training_connect_failure_notification(
+                body="Failed to run training connect row", stack_trace=str(e))
+        finally:
+            claim.cancel()
 
     async def start_queue(self):
-        self.redis = await asyncio_redis.Connection.create(host=str(os.getenv("REDIS_HOST")), port=int(os.getenv("REDIS_PORT")))
-        pubsub = await self.redis.start_subscribe()
-        await pubsub.subscribe([os.getenv("TRAINING_CONNECT_QUEUE", 'training_connect_queue')])
+        self.redis = aioredis.Redis.from_url(f"{os.getenv('REDIS_URI', None)}/0")
+        self.match_cache = MatchCache(self.redis)
+        await self.create_group()
 
+        running = set()
         while True:
-            message = await pubsub.next_published()
-            user = message.value
-            async with self.queue_lock:
-                self.queue.append(user)
+            try:
+                running = {task for task in running if not task.done()}
+                if EXCLUSIVE and not self.is_leader:
+                    # let rows that already started finish before standing by
+                    if running:
+                        await asyncio.wait(running)
+                        continue
+                    async with self.browser_lock:
+                        await self.close_browser()
+                    await self.acquire_leadership()
+
+                if len(running) >= self.parallelism:
+                    await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                    continue
+
+                free = self.parallelism - len(running)
+                entries = await self.claim_stale(free)
+                if not entries:
+                    response = await self.redis.xreadgroup(
+                        TRAINING_CONNECT_GROUP,
+                        self.consumer,
+                        {TRAINING_CONNECT_STREAM: ">"},
+                        count=free,
+                        block=1000 if running else 30000
+                    )
+                    entries = response[0][1] if response else []
+
+                if not entries and not running:
+                    # nothing left to upload, free up chrome until the next upload comes in
+                    async with self.browser_lock:
+                        await self.close_browser()
+                    continue
+
+                for entry_id, fields in entries:
+                    running.add(asyncio.create_task(self.run_stream_entry(entry_id, fields)))
+            except Exception as e:
+                log.exception("An exception occured while reading the training connect queue")
+                training_connect_failure_notification(
+                    body="Failed to read training connect queue", stack_trace=str(e))
+                await asyncio.sleep(5)
 
-    async def login(self):
+    async def login(self, page):
         # go to the sign in link
-        await self.page.goto('https://dob-trainingconnect.cityofnewyork.us/Saml/InitiateSingleSignOn')
+        await page.goto(f"{TRAINING_CONNECT_URL}/Saml/InitiateSingleSignOn")
         try:
-            await self.page.waitForSelector('input[name="username"]', visible=True, timeout=5000)
+            await page.waitForSelector('input[name="username"]', visible=True, timeout=5000)
         except Exception:
             pass
 
-        loggedIn = await self.page.querySelector('.alert.alert-success.alert-dismissible.fade.show')
+        loggedIn = await page.querySelector('.alert.alert-success.alert-dismissible.fade.show')
 
         if not loggedIn:
             # after done waiting for username input to appear, enter information
-            await self.page.type('input[name="username"]', os.getenv("TRAINING_CONNECT_EMAIL"))
-            await self.page.type('input[name="password"]', os.getenv("TRAINING_CONNECT_PASSWORD"))
-            await self.page.click('input[type="submit"]')
+            await page.type('input[name="username"]', os.getenv("TRAINING_CONNECT_EMAIL"))
+            await page.type('input[name="password"]', os.getenv("TRAINING_CONNECT_PASSWORD"))
+            await page.click('input[type="submit"]')
 
             # wait for logged in selector to be present and then validate if it says logged in,
             # if so start analyzation of users
-            await self.page.waitForSelector('.alert.alert-success.alert-dismissible.fade.show', visible=True)
-            result = await self.page.evaluate('document.body.innerText.includes("logged in")')
+            await page.waitForSelector('.alert.alert-success.alert-dismissible.fade.show', visible=True)
+            result = await page.evaluate('document.body.innerText.includes("logged in")')
 
             if result:
                 log.debug("logged in here")
@@ -794,12 +1170,46 @@ class TrainingConnect:
                 return None
         else:
             log.debug("already logged in")
+            self.logged_in = True
 
     async def start_system(self):
-        # launch the browser
         log.info("starting training connect....")
-
-        await asyncio.gather(
-            self.start_queue(),
-            self.handle_queue()
-        )
+        await self.start_queue()
+
+    async def shutdown(self):
+        log.info("shutting down training connect....")
+        async with self.browser_lock:
+            await self.close_browser()
+
+        if self.leader_task:
+            self.leader_task.cancel()
+
+        if self.redis:
+            if self.is_leader:
+                await self.redis.eval(RELEASE_LEADER, 1, LEADER_KEY, self.consumer)
+            self.is_leader = False
+            await self.redis.close()
+
+
+async def main():
+    training_connect = TrainingConnect()
+    # docker stop sends SIGTERM, which would end the process without running the cleanup below. cancelling
+    # the main task instead unwinds it so the leader lock is released and chrome is closed
+    loop = asyncio.get_running_loop()
+    task = asyncio.current_task()
+    for stop_signal in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(stop_signal, task.cancel)
+
+    try:
+        await training_connect.start_system()
+    except asyncio.CancelledError:
+        log.info("training connect was asked to stop")
+    finally:
+        # a second signal while cleaning up stops the process right away
+        for stop_signal in (signal.SIGTERM, signal.SIGINT):
+            loop.remove_signal_handler(stop_signal)
+        await training_connect.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
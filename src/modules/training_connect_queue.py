@@ -0,0 +1,101 @@
+import os
+import json
+import uuid
+from datetime import datetime
+
+from src import log, redis_client
+
+TRAINING_CONNECT_STREAM = os.getenv("TRAINING_CONNECT_QUEUE", "training_connect_queue")
+TRAINING_CONNECT_GROUP = os.getenv("TRAINING_CONNECT_GROUP", "training_connect_workers")
+# uploads are kept around long enough for every row to finish
+UPLOAD_EXPIRY = 60 * 60 * 24 * 3
+
+
+def upload_key(upload_id: str) -> str:
+    return f"training_connect_upload_{upload_id}"
+
+
+def results_key(upload_id: str) -> str:
+    return f"training_connect_results_{upload_id}"
+
+
+def rows_key(upload_id: str) -> str:
+    return f"training_connect_rows_{upload_id}"
+
+
+def serializer(o):
+    if isinstance(o, datetime):
+        return o.__str__()
+
+
+def enqueue_upload(rows: list, uploader: str, file_name: str, upload_type: str) -> str:
+    """Function to publish an upload to training connect one stream entry per row
+
+    Args:
+        rows (list): rows of the uploaded sheet
+        uploader (str): email of the user uploading, receives the failed users report
+        file_name (str): name of the uploaded file
+        upload_type (str): certificate or student
+
+    Returns:
+        str: id of the upload, None if nothing was published
+    """
+    if not rows:
+        return None
+
+    upload_id = str(uuid.uuid4())
+    max_length = len(rows)
+    try:
+        redis_client.set_hset(upload_key(upload_id), {
+            "uploader": uploader,
+            "file_name": file_name or "",
+            "upload_type": upload_type,
+            "max": max_length,
+            "done": 0
+        })
+        redis_client.redis_client.expire(upload_key(upload_id), UPLOAD_EXPIRY)
+
+        entries = []
+        for idx, row in enumerate(rows):
+            row["upload_info"] = {
+                "upload_id": upload_id,
+                "uploader": uploader,
+                "position": idx + 1,
+                "max": max_length,
+                "file_name": file_name,
+                "upload_type": upload_type
+            }
+            entries.append({"row": json.dumps(row, default=serializer)})
+
+        if len(redis_client.add_stream(TRAINING_CONNECT_STREAM, entries)) != max_length:
+            raise Exception("Not every row was added to the stream")
+        return upload_id
+    except Exception:
+        log.exception(f"Failed to enqueue training connect upload {file_name}")
+    return None
+
+
+def backlog() -> dict:
+    """Function to get how far behind the training connect workers are
+
+    Returns:
+        dict: stream length, rows handed out but not acknowledged, rows not yet handed out and consumers
+    """
+    stats = {
+        "length": 0,
+        "pending": 0,
+        "lag": None,
+        "consumers": 0
+    }
+    try:
+        stats["length"] = redis_client.redis_client.xlen(TRAINING_CONNECT_STREAM)
+        for group in redis_client.redis_client.xinfo_groups(TRAINING_CONNECT_STREAM):
+            name = group["name"].decode() if isinstance(group["name"], bytes) else group["name"]
+            if name != TRAINING_CONNECT_GROUP:
+                continue
+            stats["pending"] = group["pending"]
+            stats["lag"] = group.get("lag")
+            stats["consumers"] = group["consumers"]
+    except Exception:
+        log.exception("Failed to get training connect backlog")
+    return stats
@@ -0,0 +1,251 @@
+import re
+from typing import List
+
+from src import log, redis_client
+from src.database.sql import get_connection, acquire_connection
+
+# every kind has one sorted set where all members share a score so redis orders them by
+# term, a prefix is then a single ZRANGEBYLEX. members are term, kind, id and label joined
+# by SEPARATOR so a suggestion is answered without looking anything else up
+KINDS = ["user", "course", "bundle"]
+SEPARATOR = "\x00"
+REBUILD_BATCH = 1000
+
+
+def index_key(kind: str) -> str:
+    return f"typeahead_{kind}"
+
+
+def members_key(kind: str, entity_id: str) -> str:
+    return f"typeahead_members_{kind}_{entity_id}"
+
+
+def normalize(text: str) -> str:
+    return " ".join(re.sub(r"[^\w\s-]", " ", str(text or "").lower()).split())
+
+
+def index_terms(names: List[str]) -> set:
+    """Function to get the terms a name can be found by, the whole name and every word it starts a run of
+
+    Args:
+        names (List[str]): names, codes, etc. of an entity
+
+    Returns:
+        set: normalized terms
+    """
+    terms = set()
+    for name in names:
+        words = normalize(name).split()
+        for idx in range(len(words)):
+            terms.add(" ".join(words[idx:]))
+    return terms
+
+
+def index_entity(kind: str, entity_id: str, label: str, names: List[str], pipe=None):
+    """Function to replace what an entity can be found by
+
+    Args:
+        kind (str): user, course or bundle
+        entity_id (str): id of the entity
+        label (str): what is shown for the suggestion
+        names (List[str]): names, codes, etc. to find the entity by
+        pipe (optional): pipeline to queue the commands on, runs them right away if not given
+    """
+    run = pipe is None
+    pipe = pipe or redis_client.redis_client.pipeline()
+    members = [
+        SEPARATOR.join([term, kind, entity_id, label or ""])
+        for term in index_terms(names)
+    ]
+    remove_entity(kind, entity_id, pipe=pipe)
+    if members:
+        pipe.zadd(index_key(kind), {member: 0 for member in members})
+        pipe.sadd(members_key(kind, entity_id), *members)
+    if run:
+        pipe.execute()
+
+
+def remove_entity(kind: str, entity_id: str, pipe=None):
+    run = pipe is None
+    pipe = pipe or redis_client.redis_client.pipeline()
+    old_members = redis_client.redis_client.smembers(members_key(kind, entity_id))
+    if old_members:
+        pipe.zrem(index_key(kind), *old_members)
+    pipe.delete(members_key(kind, entity_id))
+    if run:
+        pipe.execute()
+
+
+def suggest(prefix: str, kinds: List[str] = None, limit: int = 10) -> list:
+    """Function to get entities with a name starting with a prefix
+
+    Args:
+        prefix (str): what has been typed so far
+        kinds (List[str], optional): kinds to suggest, all if not given. Defaults to None.
+        limit (int, optional): max suggestions per kind. Defaults to 10.
+
+    Returns:
+        list: suggestions with their type, id and label
+    """
+    prefix = normalize(prefix)
+    if not prefix:
+        return []
+
+    kinds = kinds or KINDS
+    # 0xff never appears in utf-8 so it sorts after every term starting with the prefix
+    lower = b"[" + prefix.encode()
+    upper = lower + b"\xff"
+    pipe = redis_client.redis_client.pipeline()
+    for kind in kinds:
+        # an entity can match on more than one of its terms so ask for extra to fill the limit
+        pipe.zrangebylex(index_key(kind), lower, upper, start=0, num=limit * 3)
+
+    suggestions = []
+    for kind, members in zip(kinds, pipe.execute()):
+        seen = set()
+        for member in members:
+            _, _, entity_id, label = member.decode().split(SEPARATOR, 3)
+            if entity_id in seen:
+                continue
+            seen.add(entity_id)
+            suggestions.append({"type": kind, "id": entity_id, "label": label})
+            if len(seen) == limit:
+                break
+    return suggestions
+
+
+USER_QUERY = """
+    SELECT user_id, first_name, last_name, email FROM users
+"""
+COURSE_QUERY = """
+    SELECT course_id, course_name, course_code FROM courses
+"""
+BUNDLE_QUERY = """
+    SELECT bundle_id, bundle_name FROM course_bundles
+"""
+
+
+def index_user_row(user, pipe=None):
+    name = f"{user['first_name'] or ''} {user['last_name'] or ''}".strip()
+    index_entity("user", user['user_id'], name, [name, user['email'] or ""], pipe=pipe)
+
+
+def index_course_row(course, pipe=None):
+    names = [course['course_name'] or ""]
+    if course['course_code']:
+        names.append(course['course_code'])
+    index_entity("course", course['course_id'], course['course_name'], names, pipe=pipe)
+
+
+def index_bundle_row(bundle, pipe=None):
+    index_entity("bundle", bundle['bundle_id'], bundle['bundle_name'], [bundle['bundle_name'] or ""], pipe=pipe)
+
+
+async def refresh_entity(kind: str, entity_id: str):
+    """Function to re-index an entity from postgres after it was created or updated
+
+    Args:
+        kind (str): user, course or bundle
+        entity_id (str): id of the entity
+    """
+    query, id_column, index_row = {
+        "user": (USER_QUERY, "user_id", index_user_row),
+        "course": (COURSE_QUERY, "course_id", index_course_row),
+        "bundle": (BUNDLE_QUERY, "bundle_id", index_bundle_row)
+    }[kind]
+    try:
+        db_pool = await get_connection()
+        async with acquire_connection(db_pool) as conn:
+            found = await conn.fetchrow(f"{query} WHERE {id_column} = $1;", entity_id)
+
+        if found:
+            index_row(found)
+        else:
+            remove_entity(kind, entity_id)
+    except Exception:
+        log.exception(f"Failed to update typeahead for {kind} {entity_id}")
+
+
+def forget_entity(kind: str, entity_id: str):
+    try:
+        remove_entity(kind, entity_id)
+    except Exception:
+        log.exception(f"Failed to remove {kind} {entity_id} from typeahead")
+
+
+def forget_entities(kind: str, entity_ids: List[str]):
+    """Function to remove many entities at once, in two round trips no matter how many there are
+
+    Args:
+        kind (str): user, course or bundle
+        entity_ids (List[str]): ids of the entities
+    """
+    if not entity_ids:
+        return
+    try:
+        pipe = redis_client.redis_client.pipeline()
+        for entity_id in entity_ids:
+            pipe.smembers(members_key(kind, entity_id))
+        old_members = set().union(*pipe.execute())
+
+        pipe = redis_client.redis_client.pipeline()
+        if old_members:
+            pipe.zrem(index_key(kind), *old_members)
+        pipe.delete(*[members_key(kind, entity_id) for entity_id in entity_ids])
+        pipe.execute()
+    except Exception:
+        log.exception(f"Failed to remove {len(entity_ids)} {kind}s from typeahead")
+
+
+def clear_index(kind: str):
+    """Function to drop every member of a kind, so entities deleted while the index was out of sync go too
+
+    Args:
+        kind (str): user, course or bundle
+    """
+    pipe = redis_client.redis_client.pipeline()
+    pipe.delete(index_key(kind))
+    for idx, key in enumerate(redis_client.redis_client.scan_iter(match=members_key(kind, "*"), count=REBUILD_BATCH), 1):
+        pipe.delete(key)
+        if idx % REBUILD_BATCH == 0:
+            pipe.execute()
+    pipe.execute()
+
+
+async def rebuild_typeahead(force: bool = False) -> bool:
+    """Function to build the typeahead indexes from postgres
+
+    Args:
+        force (bool, optional): rebuild even if the indexes already exist. Defaults to False.
+
+    Returns:
+        bool: true if the indexes were built
+    """
+    try:
+        if not force and redis_client.get_key("typeahead_built"):
+            return False
+
+        db_pool = await get_connection()
+        async with acquire_connection(db_pool) as conn:
+            for kind, query, index_row in [
+                ("user", USER_QUERY, index_user_row),
+                ("course", COURSE_QUERY, index_course_row),
+                ("bundle", BUNDLE_QUERY, index_bundle_row)
+            ]:
+                clear_index(kind)
+                async with conn.transaction():
+                    pipe = redis_client.redis_client.pipeline()
+                    queued = 0
+                    async for row in conn.cursor(f"{query};"):
+                        index_row(row, pipe=pipe)
+                        queued += 1
+                        if queued % REBUILD_BATCH == 0:
+                            pipe.execute()
+                    pipe.execute()
+
+        redis_client.redis_client.set("typeahead_built", 1)
+        log.info("Built typeahead indexes")
+        return True
+    except Exception:
+        log.exception("Failed to build typeahead indexes")
+    return False
@@ -1,17 +1,53 @@
 import re
 import base64
+import asyncio
 from pyppeteer import launch
 from datetime import datetime
 from dateutil.relativedelta import relativedelta
 import os
 import json
+from typing import List, Tuple, Union
 
 from src import log
 from src.database.sql import get_connection, acquire_connection
 from src.utils.generate_random_code import generate_random_code
-from src.database.sql.user_functions import get_user
+from src.database.sql.user_functions import get_user, get_certificate_by_number
+from src.modules.certificate_artifacts import (
+    ARTIFACT_FORMATS,
+    artifact_etag,
+    artifact_path,
+    cached_artifact,
+    remember_artifact,
+    store_artifact
+)
 from src.api.api_models import global_models
 
+# instructor recorded when a course has none assigned
+DEFAULT_INSTRUCTOR_ID = 'd8adb06f-1db0-43be-8823-bd26460408fb'
+
+INSERT_CERTIFICATE_QUERY = """
+    INSERT INTO user_certificates (
+        user_id,
+        certificate_id,
+        course_id,
+        completion_date,
+        expiration_date,
+        instructor_id,
+        certificate_number,
+        certificate_name
+    )
+    VALUES (
+        $1,
+        $2,
+        $3,
+        $4,
+        $5,
+        $6,
+        $7,
+        $8
+    );
+"""
+
 
 def read_and_encode_image(file_path):
     with open(file_path, 'rb') as image_file:
@@ -21,7 +57,7 @@ def read_and_encode_image(file_path):
     return base64_image
 
 
-async def html_to_png(html_content, output_path):
+async def html_to_png(html_content, output_path, pdf: bool = False):
     try:
         browser = await launch(
             executablePath='/usr/bin/google-chrome-stable',
@@ -51,7 +87,10 @@ async def html_to_png(html_content, output_path):
         await page.setContent(modified_html)
         await page.addStyleTag(path="./src/content/certificates/styles/output.css")
         await page.waitFor(500)
-        screenshot = await page.screenshot()
+        if pdf:
+            screenshot = await page.pdf({'width': '1300px', 'height': '1000px', 'printBackground': True, 'pageRanges': '1'})
+        else:
+            screenshot = await page.screenshot()
         await browser.close()
 
         return screenshot
@@ -70,7 +109,8 @@ async def generate_certificate_func(
     email: str = None,
     phone_number: str = None,
     template: str = None,
-    save: bool = True
+    save: bool = True,
+    pdf: bool = False
 ):
     try:
         if not template:
@@ -96,7 +136,7 @@ async def generate_certificate_func(
         output_path = f"./src/content/user_certificates/{student_full_name.replace(' ', '_')}_{certificate_name}.png"
 
         try:
-            output = await html_to_png(html_content, output_path)
+            output = await html_to_png(html_content, output_path, pdf=pdf)
         except Exception as e:
             raise e
 
@@ -122,85 +162,180 @@ async def generate_certificate_func(
         raise e
 
 
-async def generate_certificate(user: global_models.User, course: dict, certificate: dict = None):
+def certificate_expiration(completion_date: datetime, certificate_length: Union[str, dict, None]) -> Union[datetime, None]:
+    """Function to get when a certificate expires from the length of its certificate
+
+    Args:
+        completion_date (datetime): date the certificate was earned
+        certificate_length (Union[str, dict, None]): years and months the certificate lasts
+
+    Returns:
+        Union[datetime, None]: expiration date or None if the certificate does not expire
+    """
+    if not certificate_length:
+        return None
+    if isinstance(certificate_length, str):
+        certificate_length = json.loads(certificate_length)
+
+    if not certificate_length.get("years") and not certificate_length.get("months"):
+        return None
+    return completion_date + relativedelta(
+        years=certificate_length.get("years") or 0,
+        months=certificate_length.get("months") or 0
+    )
 
-    certificate_number = generate_random_code(15)
 
+async def issue_certificates(
+    user_ids: List[str],
+    course: dict = None,
+    certificate: dict = None,
+    certificate_name: str = None,
+    expiration_date: datetime = None
+) -> Tuple[Union[list, None], list]:
+    """Function to issue certificates to many users at once, either for a course or by name
+
+    Users and their existing certificates are read in two queries and every new certificate
+    is written in one batch, nothing is rendered.
+
+    Args:
+        user_ids (List[str]): users to issue certificates to
+        course (dict, optional): course the certificates are for. Defaults to None.
+        certificate (dict, optional): certificate of the course. Defaults to None.
+        certificate_name (str, optional): name of a certificate that is not for a course. Defaults to None.
+        expiration_date (datetime, optional): expiration of a certificate that is not for a course. Defaults to None.
+
+    Returns:
+        Tuple[Union[list, None], list]: issued certificates, or None if nothing could be saved, and the reason each user was skipped
+    """
+    issued = []
+    failed_users = []
+    user_ids = list(dict.fromkeys(user_ids))
     completion_date = datetime.utcnow()
-    expiration_date = None
-    certificate_name = ""
-    certificate_name += course['courseName']
-    if course.get('courseCode'):
-        certificate_name += f", {course['courseCode']}"
-
-    formatted_values = {
-        "student_full_name": f"{user.firstName} {user.lastName}",
-        "instructor_full_name": (f"{course['instructors'][0]['firstName']} {course['instructors'][0]['lastName']}"
-                                 if course['instructors'] else os.getenv('COMPANY_NAME')),
-        "instructor_id": course['instructors'][0]['userId'] if course['instructors'] else 'd8adb06f-1db0-43be-8823-bd26460408fb',
-        "certificate_name": certificate_name,
-        "completion_date": completion_date,
-    }
 
-    certificate_id = None
-    if certificate:
-        if certificate['certificateId']:
-            certificate_id = certificate['certificateId']
-        if certificate['certificateName']:
-            certificate_name = certificate['certificateName']
-
-        if certificate['certificateLength']:
-            certificate_length = json.loads(certificate['certificateLength'])
-            if certificate_length["years"]:
-                expiration_date = completion_date + relativedelta(years=certificate_length["years"])
-            if certificate_length["months"]:
-                if expiration_date:
-                    expiration_date = expiration_date + relativedelta(months=certificate_length["months"])
-                else:
-                    expiration_date = completion_date + relativedelta(months=certificate_length["months"])
-
-        formatted_values.update({
-            "instructor_full_name": (f"{course['instructors'][0]['firstName']} {course['instructors'][0]['lastName']}"
-                                     if course['instructors'] else os.getenv("COMPANY_NAME")),
-            "certificate_name": certificate_name,
-            "expiration_date": expiration_date
-        })
+    if course:
+        certificate = certificate or {}
+        expiration_date = certificate_expiration(completion_date, certificate.get('certificateLength'))
+        instructor_id = course['instructors'][0]['userId'] if course['instructors'] else DEFAULT_INSTRUCTOR_ID
+        label = course['courseName']
+        existing_query = "SELECT user_id FROM user_certificates WHERE user_id = ANY($1) AND course_id = $2;"
+        existing_value = course['courseId']
+    else:
+        instructor_id = None
+        label = certificate_name
+        existing_query = "SELECT user_id FROM user_certificates WHERE user_id = ANY($1) AND certificate_name = $2;"
+        existing_value = certificate_name
 
     try:
-        certificate = await generate_certificate_func(
-            student_full_name=formatted_values.get('student_full_name'),
-            instructor_full_name=formatted_values.get('instructor_full_name'),
-            certificate_name=formatted_values.get('certificate_name'),
-            completion_date=formatted_values.get('completion_date'),
-            certificate_number=certificate_number,
-            expiration_date=formatted_values.get('expiration_date'),
-            save=False
-        )
-        if not certificate:
-            return False
+        db_pool = await get_connection()
+        async with acquire_connection(db_pool) as conn:
+            users = await conn.fetch(
+                "SELECT user_id, first_name, last_name FROM users WHERE user_id = ANY($1);", user_ids)
+            existing = {row['user_id'] for row in await conn.fetch(existing_query, user_ids, existing_value)}
+
+            found = {user['user_id']: user for user in users}
+            rows = []
+            for user_id in user_ids:
+                user = found.get(user_id)
+                if not user:
+                    failed_users.append(f"User not found for user id {user_id}")
+                    continue
+                if user_id in existing:
+                    failed_users.append(
+                        f"User {user['first_name']} {user['last_name']} already has a certificate for {label}")
+                    continue
+
+                certificate_number = generate_random_code(15)
+                rows.append((
+                    user_id,
+                    certificate.get('certificateId') if course else None,
+                    course['courseId'] if course else None,
+                    completion_date,
+                    expiration_date,
+                    instructor_id,
+                    certificate_number,
+                    None if course else certificate_name
+                ))
+                issued.append({
+                    "userId": user_id,
+                    "certificateNumber": certificate_number
+                })
+
+            if rows:
+                async with conn.transaction():
+                    await conn.executemany(INSERT_CERTIFICATE_QUERY, rows)
+
+        return issued, failed_users
 
     except Exception:
-        log.exception("An exception occured while generating the certificate")
-        return False
+        log.exception(f"An error occurred while issuing certificates for {label}")
 
-    # save certificate to user
-    saved = await save_user_certificate(
-        certificate_number=certificate_number,
-        instructor_id=formatted_values['instructor_id'],
-        completion_date=completion_date,
-        course_id=course["courseId"],
-        user=user,
-        certificate_id=certificate_id,
-        expiration_date=expiration_date
-    )
+    return None, failed_users
 
-    if not saved:
-        return False
 
-    # TODO: NOTIFY USER OF CERTIFICATE GENERATION
-    # DO WE WANT TO EMAIL THEM THE CERTIFICATE OR HAVE THEM LOGIN TO DOWNLOAD IT?
+# renders in progress by certificate number and format, so concurrent downloads of a new certificate render it once
+rendering = {}
 
-    return True
+
+async def get_certificate_artifact(certificate_number: str, artifact_format: str = "png") -> Union[Tuple[str, str], None]:
+    """Function to get the stored render of a certificate, rendering it on the first request
+
+    Args:
+        certificate_number (str): number of the certificate
+        artifact_format (str, optional): png or pdf. Defaults to "png".
+
+    Returns:
+        Union[Tuple[str, str], None]: path to the render and its etag, None if the certificate does not exist
+    """
+    if artifact_format not in ARTIFACT_FORMATS:
+        raise ValueError(f"Unknown certificate format {artifact_format}")
+
+    etag = cached_artifact(certificate_number, artifact_format)
+    if etag:
+        return artifact_path(certificate_number, etag, artifact_format), etag
+
+    certificate = await get_certificate_by_number(certificate_number)
+    if not certificate:
+        return None
+
+    details = {
+        "student_full_name": certificate['student'],
+        "instructor_full_name": certificate['instructor'],
+        "certificate_name": certificate['certificateName'],
+        "completion_date": certificate['completionDate'],
+        "expiration_date": certificate['expirationDate'],
+        "certificate_number": certificate_number
+    }
+    etag = artifact_etag(details, artifact_format)
+    path = artifact_path(certificate_number, etag, artifact_format)
+    if os.path.exists(path):
+        remember_artifact(certificate_number, artifact_format, etag)
+        return path, etag
+
+    key = (certificate_number, artifact_format)
+    lock = rendering.setdefault(key, asyncio.Lock())
+    try:
+        async with lock:
+            if not os.path.exists(path):
+                output = await generate_certificate_func(**details, save=False, pdf=artifact_format == "pdf")
+                store_artifact(certificate_number, artifact_format, etag, output)
+    finally:
+        if not lock.locked():
+            rendering.pop(key, None)
+
+    return path, etag
+
+
+async def render_certificates(issued: List[dict]):
+    """Function to render issued certificates ahead of their first download, meant to run after the request finished
+
+    Args:
+        issued (List[dict]): certificates returned by issue_certificates
+    """
+    for certificate in issued:
+        try:
+            await get_certificate_artifact(certificate['certificateNumber'])
+        except Exception:
+            log.exception(f"Failed to render certificate {certificate['certificateNumber']}")
 
 
 async def save_user_certificate(
@@ -225,33 +360,11 @@ async def save_user_certificate(
     if not user:
         return False
 
-    query = """
-        INSERT INTO user_certificates (
-            user_id,
-            certificate_id,
-            course_id,
-            completion_date,
-            expiration_date,
-            instructor_id,
-            certificate_number,
-            certificate_name
-        )
-        VALUES (
-            $1,
-            $2,
-            $3,
-            $4,
-            $5,
-            $6,
-            $7,
-            $8
-        );
-    """
     try:
         db_pool = await get_connection()
         async with acquire_connection(db_pool) as conn:
             await conn.execute(
-                query,
+                INSERT_CERTIFICATE_QUERY,
                 user.userId,
                 certificate_id,
                 course_id,
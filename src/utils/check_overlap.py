@@ -1,23 +1,33 @@
-import datetime
+import heapq
+from typing import List, Tuple
 
 
-def check_overlap(schedule1, schedule2):
-    """Function to compare if two schedule times overlap
+def find_overlaps(sessions: List[dict]) -> List[Tuple[dict, dict]]:
+    """Function to find every pair of sessions that overlap, using a sort and sweep
+
+    Sessions are sorted by start, then while sweeping the ones still running are
+    kept in a heap by end so each session is only compared to those it overlaps.
 
     Args:
-        schedule1 (str): Time 1 to be compared to Time 2
-        schedule2 (str): Time 1 to be compared to Time 2
+        sessions (List[dict]): sessions with a start_dtm and end_dtm, anything else is passed through
 
     Returns:
-        _type_: _description_
+        List[Tuple[dict, dict]]: each overlapping pair once, the earlier starting session first
     """
+    overlaps = []
+    running = []
+    ordered = sorted(
+        (session for session in sessions if session.get("start_dtm") and session.get("end_dtm")),
+        key=lambda session: (session["start_dtm"], session["end_dtm"])
+    )
+    for idx, session in enumerate(ordered):
+        # sessions that ended by the time this one starts can not overlap anything after it either
+        while running and running[0][0] <= session["start_dtm"]:
+            heapq.heappop(running)
+
+        for _, _, other in running:
+            overlaps.append((other, session))
+
+        heapq.heappush(running, (session["end_dtm"], idx, session))
 
-    startTime = datetime.datetime.strptime(
-        schedule1["startTime"], '%m/%d/%Y  %I:%M %p')
-    endTime = datetime.datetime.strptime(
-        schedule1["endTime"], '%m/%d/%Y %I:%M %p')
-    startTime2 = datetime.datetime.strptime(
-        schedule2["startTime"], '%m/%d/%Y %I:%M %p')
-    endTime2 = datetime.datetime.strptime(
-        schedule2["endTime"], '%m/%d/%Y %I:%M %p')
-    return startTime < endTime2 and endTime > startTime2
+    return overlaps
@@ -0,0 +1,10 @@
+def escape_like(term: str) -> str:
+    """Function to escape a term so LIKE matches it literally
+
+    Args:
+        term (str): term searched for
+
+    Returns:
+        str: term with LIKE wildcards escaped
+    """
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
@@ -80,13 +80,19 @@ def get_session() -> smtplib.SMTP:
     return session
 
 
-def send_email(sender: str = None, receiver: Sequence[str] = None, email_content: dict = None):
+def send_email(
+    sender: str = None,
+    receiver: Sequence[str] = None,
+    email_content: dict = None,
+    session: smtplib.SMTP = None
+):
     """function to send email
 
     Args:
         sender (str, optional): email of whoever is sending the email. Defaults to None.
         receiver (str, optional): email of whoever is meant to receive the email. Defaults to None.
         email_content (dict, optional): content of the email, attachments, etc.. Defaults to None.
+        session (smtplib.SMTP, optional): open session to reuse, left open after sending. Defaults to None.
 
     Returns:
         bool: true if sent successfully, false if failed
@@ -115,6 +121,10 @@ def send_email(sender: str = None, receiver: Sequence[str] = None, email_content
     )
 
     try:
+        if session:
+            session.sendmail(sender, receiver, message.as_string())
+            return True
+
         session = get_session()
         session.sendmail(sender, receiver, message.as_string())
         session.quit()
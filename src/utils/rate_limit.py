@@ -0,0 +1,45 @@
+import time
+
+from fastapi import Request
+
+from src import log, redis_client
+
+
+def client_address(request: Request) -> str:
+    """Function to get the address of the client that made a request
+
+    Behind a reverse proxy this is only the client's own address when uvicorn runs with --proxy-headers
+    and the proxy in --forwarded-allow-ips (FORWARDED_ALLOW_IPS), otherwise it is the proxy's address
+
+    Args:
+        request (Request): incoming request
+
+    Returns:
+        str: client ip
+    """
+    return request.client.host if request.client else "unknown"
+
+
+def is_rate_limited(name: str, identity: str, limit: int, window: int = 60) -> bool:
+    """Function to count a request against a fixed window limit shared by every worker
+
+    Args:
+        name (str): what is being limited
+        identity (str): who is being limited, e.g. a client ip
+        limit (int): requests allowed per window
+        window (int, optional): length of the window in seconds. Defaults to 60.
+
+    Returns:
+        bool: true if the request is over the limit
+    """
+    try:
+        key = f"rate_{name}_{identity}_{int(time.time() // window)}"
+        pipe = redis_client.redis_client.pipeline()
+        pipe.incr(key)
+        pipe.expire(key, window)
+        count, _ = pipe.execute()
+        return count > limit
+    except Exception:
+        # redis being down should not take the route down with it
+        log.exception(f"Failed to check rate limit {name} for {identity}")
+    return False
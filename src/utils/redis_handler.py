@@ -100,3 +100,113 @@ class RedisClient:
         if found_dict:
             return found_dict
         return None
+
+    def push_list(self, redis_key: str = None, value: str = None) -> Union[int, None]:
+        """Function to append a value to a redis list
+
+        Args:
+            redis_key (str, optional): key of the redis list. Defaults to None.
+            value (str, optional): value to append. Defaults to None.
+
+        Returns:
+            Union[int, None]: Returns length of the list or none
+        """
+        if not redis_key or value is None:
+            return None
+
+        return self.redis_client.rpush(redis_key, value)
+
+    def drain_list(self, redis_key: str = None) -> list:
+        """Function to read and remove every value of a redis list atomically
+
+        Args:
+            redis_key (str, optional): key of the redis list. Defaults to None.
+
+        Returns:
+            list: Returns decoded values of the list
+        """
+        if not redis_key:
+            return []
+
+        pipe = self.redis_client.pipeline()
+        pipe.lrange(redis_key, 0, -1)
+        pipe.delete(redis_key)
+        values, _ = pipe.execute()
+        return [value.decode() for value in values]
+
+    def add_set(self, redis_key: str = None, value: str = None) -> Union[int, None]:
+        """Function to add a value to a redis set
+
+        Args:
+            redis_key (str, optional): key of the redis set. Defaults to None.
+            value (str, optional): value to add. Defaults to None.
+
+        Returns:
+            Union[int, None]: Returns 1 if the value was added, 0 if it was already in the set or none
+        """
+        if not redis_key or value is None:
+            return None
+
+        return self.redis_client.sadd(redis_key, value)
+
+    def remove_set(self, redis_key: str = None, value: str = None) -> Union[int, None]:
+        """Function to remove a value from a redis set
+
+        Args:
+            redis_key (str, optional): key of the redis set. Defaults to None.
+            value (str, optional): value to remove. Defaults to None.
+
+        Returns:
+            Union[int, None]: Returns 1 if the value was removed, 0 if it was not in the set or none
+        """
+        if not redis_key or value is None:
+            return None
+
+        return self.redis_client.srem(redis_key, value)
+
+    def in_set(self, redis_key: str = None, value: str = None) -> bool:
+        """Function to check if a value is in a redis set
+
+        Args:
+            redis_key (str, optional): key of the redis set. Defaults to None.
+            value (str, optional): value to look for. Defaults to None.
+
+        Returns:
+            bool: Returns true if the value is in the set
+        """
+        if not redis_key or value is None:
+            return False
+
+        return bool(self.redis_client.sismember(redis_key, value))
+
+    def get_set(self, redis_key: str = None) -> list:
+        """Function to get every value of a redis set
+
+        Args:
+            redis_key (str, optional): key of the redis set. Defaults to None.
+
+        Returns:
+            list: Returns decoded values of the set
+        """
+        if not redis_key:
+            return []
+
+        return [value.decode() for value in self.redis_client.smembers(redis_key)]
+
+    def add_stream(self, redis_key: str = None, entries: list = None) -> list:
+        """Function to append entries to a redis stream in one round trip
+
+        Args:
+            redis_key (str, optional): key of the redis stream. Defaults to None.
+            entries (list, optional): list of dicts to add as stream entries. Defaults to None.
+
+        Returns:
+            list: Returns the ids of the added entries
+        """
+        if not redis_key or not entries:
+            return []
+
+        pipe = self.redis_client.pipeline()
+        for entry in entries:
+            pipe.xadd(redis_key, entry)
+        return [entry_id.decode() for entry_id in pipe.execute()]
@@ -0,0 +1,11 @@
+import os
+
+# src connects lazily and checks its settings on import, these only have to be set for it to load
+os.environ.setdefault("APP_NAME", "test")
+os.environ.setdefault("APP_VERSION", "test")
+os.environ.setdefault("REDIS_URI", "redis://localhost:6379")
+os.environ.setdefault("MONGO_CONNECTION_URI", "mongodb://localhost:27017")
+os.environ.setdefault("MONGO_DATABASE", "test")
+os.environ.setdefault("POSTGRES_DATABASE_HOST", "localhost")
+os.environ.setdefault("POSTGRES_DATABASE_USER", "postgres")
+os.environ.setdefault("POSTGRES_DATABASE_NAME", "postgres")
@@ -0,0 +1,143 @@
+"""Runs tests against a throwaway schema of the postgres database the POSTGRES_DATABASE_* settings point at.
+The tables predate migrations and only exist on the servers, so each test schema gets a copy of the
+columns the code under test uses
+"""
+import asyncio
+import os
+import uuid
+
+import asyncpg
+import pytest
+
+from src.database import sql
+
+TABLES = """
+    CREATE TABLE users (
+        user_id TEXT PRIMARY KEY,
+        first_name TEXT,
+        last_name TEXT,
+        email TEXT,
+        phone_number TEXT,
+        dob TIMESTAMP,
+        head_shot TEXT,
+        other_id TEXT,
+        other_id_photo TEXT,
+        photo_id_photo TEXT,
+        text_notif BOOLEAN DEFAULT false,
+        email_notif BOOLEAN DEFAULT true,
+        digest_notif BOOLEAN NOT NULL DEFAULT false
+    );
+    CREATE TABLE user_role (user_id TEXT, role_id TEXT);
+    CREATE TABLE courses (
+        course_id TEXT PRIMARY KEY,
+        course_name TEXT,
+        course_code TEXT,
+        brief_description TEXT,
+        max_students INTEGER,
+        waitlist_limit INTEGER,
+        is_full BOOLEAN DEFAULT false,
+        waitlist BOOLEAN DEFAULT false
+    );
+    CREATE TABLE course_dates (
+        course_id TEXT,
+        series_number INTEGER,
+        start_dtm TIMESTAMP,
+        end_dtm TIMESTAMP,
+        is_complete BOOLEAN DEFAULT false
+    );
+    CREATE TABLE course_instructor (course_id TEXT, user_id TEXT);
+    CREATE TABLE course_registration (
+        course_id TEXT,
+        user_id TEXT,
+        registration_status TEXT,
+        student_registration_date TIMESTAMP,
+        enroll_date TIMESTAMP,
+        denial_reason TEXT,
+        user_paid BOOLEAN,
+        user_paying_cash BOOLEAN,
+        notes TEXT
+    );
+    CREATE TABLE course_bundles (
+        bundle_id TEXT PRIMARY KEY,
+        bundle_name TEXT,
+        brief_description TEXT,
+        max_students INTEGER,
+        waitlist_limit INTEGER,
+        is_full BOOLEAN DEFAULT false,
+        waitlist BOOLEAN DEFAULT false
+    );
+    CREATE TABLE bundled_courses (bundle_id TEXT, course_id TEXT);
+    CREATE TABLE prerequisites (course_id TEXT, prerequisite TEXT);
+    CREATE TABLE user_certificates (
+        certificate_number TEXT,
+        user_id TEXT,
+        course_id TEXT,
+        instructor_id TEXT,
+        completion_date TIMESTAMP,
+        expiration_date TIMESTAMP
+    );
+    CREATE TABLE certificate_expiry_notices (
+        certificate_number TEXT NOT NULL,
+        window_days INTEGER NOT NULL,
+        sent_dtm TIMESTAMP NOT NULL,
+        PRIMARY KEY (certificate_number, window_days)
+    );
+    CREATE TABLE form_submissions (form_id TEXT, user_id TEXT);
+    CREATE TABLE audit_log (audit_id TEXT, create_dtm TIMESTAMP);
+"""
+
+
+def settings() -> dict:
+    return {
+        "host": os.getenv("POSTGRES_DATABASE_HOST"),
+        "port": os.getenv("POSTGRES_DATABASE_PORT", 5432),
+        "user": os.getenv("POSTGRES_DATABASE_USER"),
+        "password": os.getenv("POSTGRES_DATABASE_PASSWORD"),
+        "database": os.getenv("POSTGRES_DATABASE_NAME")
+    }
+
+
+def postgres_available() -> bool:
+    async def ping():
+        conn = await asyncpg.connect(timeout=1, **settings())
+        await conn.close()
+
+    try:
+        asyncio.run(ping())
+        return True
+    except Exception:
+        return False
+
+
+needs_postgres = pytest.mark.skipif(
+    not postgres_available(), reason=f"no postgres reachable at {os.getenv('POSTGRES_DATABASE_HOST')}")
+
+
+async def connect(schema: str) -> asyncpg.Connection:
+    """Opens a connection of its own to the test schema, e.g. to hold a lock the code under test runs into"""
+    return await asyncpg.connect(server_settings={"search_path": schema}, **settings())
+
+
+def run(test, monkeypatch):
+    """Runs a test with the app's pool on a new schema holding the tables, the schema is dropped afterwards"""
+    schema = f"test_{uuid.uuid4().hex}"
+    monkeypatch.setenv("POSTGRES_DATABSE_SCHEMA", schema)
+    monkeypatch.setattr(sql, "connection_pool", None)
+
+    async def with_schema():
+        admin = await asyncpg.connect(**settings())
+        try:
+            await admin.execute(f"CREATE SCHEMA {schema};")
+            await admin.execute(f"SET search_path TO {schema};")
+            await admin.execute(TABLES)
+            try:
+                await test(schema)
+            finally:
+                if sql.connection_pool:
+                    await sql.connection_pool.close()
+                    sql.connection_pool = None
+                await admin.execute(f"DROP SCHEMA {schema} CASCADE;")
+        finally:
+            await admin.close()
+
+    asyncio.run(with_schema())
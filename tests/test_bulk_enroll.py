@@ -0,0 +1,116 @@
+import fakeredis
+import pytest
+
+from src.api.api_models.courses.enroll import StudentPayload
+from src.database.sql.course_functions import bulk_enroll
+from src.modules import prerequisites
+from tests.postgres import connect, needs_postgres, run
+
+pytestmark = needs_postgres
+
+
+@pytest.fixture
+def enroll(monkeypatch):
+    monkeypatch.setattr(prerequisites.redis_client, "redis_client", fakeredis.FakeRedis())
+
+    def with_data(test, setup: str):
+        async def seeded(schema):
+            conn = await connect(schema)
+            try:
+                await conn.execute("""
+                    INSERT INTO users (user_id, first_name, last_name, email)
+                    SELECT 'u' || n, 'First' || n, 'Last' || n, 'u' || n || '@example.com' FROM generate_series(1, 5) n;
+                """)
+                await conn.execute(setup)
+                await test(conn)
+            finally:
+                await conn.close()
+        run(seeded, monkeypatch)
+    return with_data
+
+
+def student(user_id: str, status: str = "enrolled") -> StudentPayload:
+    return StudentPayload(userId=user_id, registrationStatus=status)
+
+
+async def registrations(conn) -> list:
+    rows = await conn.fetch("SELECT course_id, user_id, registration_status FROM course_registration ORDER BY 1, 2;")
+    return [tuple(row) for row in rows]
+
+
+def test_students_listed_twice_or_already_registered_are_enrolled_once(enroll):
+    async def test(conn):
+        results = await bulk_enroll(
+            [student("u1"), student("u1", "waitlist"), student("u2"), student("missing")], course_id="c1")
+
+        assert [(r["userId"], r["registered"]) for r in results] == [("u1", ["c1"]), ("u2", []), ("missing", [])]
+        assert results[0]["user"].email == "u1@example.com"
+        assert results[2]["user"] is None
+        assert await registrations(conn) == [("c1", "u1", "enrolled"), ("c1", "u2", "pending")]
+
+    enroll(test, """
+        INSERT INTO courses (course_id, max_students) VALUES ('c1', 10);
+        INSERT INTO course_registration (course_id, user_id, registration_status) VALUES ('c1', 'u2', 'pending');
+    """)
+
+
+def test_seat_flags_flip_when_the_course_fills(enroll):
+    async def test(conn):
+        await bulk_enroll([student("u1"), student("u2")], course_id="c1")
+        assert tuple(await conn.fetchrow("SELECT is_full, waitlist FROM courses;")) == (True, True)
+
+        await bulk_enroll([student("u3", "waitlist")], course_id="c1")
+        assert tuple(await conn.fetchrow("SELECT is_full, waitlist FROM courses;")) == (True, False)
+
+    enroll(test, "INSERT INTO courses (course_id, max_students, waitlist_limit, waitlist) VALUES ('c1', 2, 1, true);")
+
+
+def test_bundle_enrolls_in_every_course_and_fills_with_the_fullest(enroll):
+    async def test(conn):
+        results = await bulk_enroll([student("u1"), student("u2")], bundle_id="b1")
+
+        assert [sorted(r["registered"]) for r in results] == [["c1", "c2"], ["c1", "c2"]]
+        assert await conn.fetchval("SELECT is_full FROM course_bundles;")
+        assert dict(await conn.fetch("SELECT course_id, is_full FROM courses;")) == {"c1": True, "c2": False, "c3": False}
+
+    enroll(test, """
+        INSERT INTO courses (course_id, max_students) VALUES ('c1', 3), ('c2', 10), ('c3', 10);
+        INSERT INTO course_bundles (bundle_id, max_students) VALUES ('b1', 2);
+        INSERT INTO bundled_courses (bundle_id, course_id) VALUES ('b1', 'c1'), ('b1', 'c2');
+        INSERT INTO course_registration (course_id, user_id, registration_status) VALUES ('c1', 'u5', 'enrolled');
+    """)
+
+
+def test_prerequisites_inside_a_bundle_do_not_block_it(enroll):
+    async def test(conn):
+        results = await bulk_enroll([student("u1")], bundle_id="b1", check_prerequisites=True)
+        assert results[0]["missingPrerequisites"] == {}
+        assert sorted(results[0]["registered"]) == ["c1", "c2"]
+
+        # a prerequisite from outside the bundle still has to be completed
+        await conn.execute("INSERT INTO prerequisites (course_id, prerequisite) VALUES ('c1', 'c3');")
+        prerequisites.invalidate_prerequisites()
+        results = await bulk_enroll([student("u2")], bundle_id="b1", check_prerequisites=True)
+        assert results[0]["missingPrerequisites"] == {"c1": ["c3"], "c2": ["c3"]}
+        assert results[0]["registered"] == []
+
+    enroll(test, """
+        INSERT INTO courses (course_id, max_students) VALUES ('c1', 10), ('c2', 10), ('c3', 10);
+        INSERT INTO bundled_courses (bundle_id, course_id) VALUES ('b1', 'c1'), ('b1', 'c2');
+        INSERT INTO course_bundles (bundle_id, max_students) VALUES ('b1', 10);
+        INSERT INTO prerequisites (course_id, prerequisite) VALUES ('c2', 'c1');
+    """)
+
+
+def test_single_course_still_needs_its_prerequisites(enroll):
+    async def test(conn):
+        results = await bulk_enroll([student("u1"), student("u2")], course_id="c2", check_prerequisites=True)
+
+        assert [r["missingPrerequisites"] for r in results] == [{"c2": ["c1"]}, {}]
+        assert await registrations(conn) == [("c2", "u2", "enrolled")]
+
+    enroll(test, """
+        INSERT INTO courses (course_id, max_students) VALUES ('c1', 10), ('c2', 10);
+        INSERT INTO prerequisites (course_id, prerequisite) VALUES ('c2', 'c1');
+        INSERT INTO user_certificates (certificate_number, user_id, course_id) VALUES ('cert', 'u2', 'c1');
+    """)
@@ -0,0 +1,95 @@
+import datetime
+
+import pytz
+from hypothesis import given, settings, strategies as st
+
+from src.modules.create_schedule import SCHEDULE_TZ, create_schedule, holidays_in, iter_schedule
+
+# 2am local never exists on the day clocks spring forward, those classes move and are checked apart
+local_times = st.datetimes(
+    min_value=datetime.datetime(2000, 1, 1),
+    max_value=datetime.datetime(2040, 12, 31)
+).filter(lambda dt: dt.hour != 2).map(lambda dt: dt.replace(second=0, microsecond=0))
+
+recurring = st.one_of(
+    st.builds(
+        lambda interval: {"frequency_type": "days", "classes_per_week": interval},
+        st.integers(min_value=1, max_value=14)
+    ),
+    st.builds(
+        lambda days, skip: {"frequency_type": "weeks", "days": days, "skip_weeks": skip},
+        st.lists(st.sampled_from(["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]),
+                 min_size=1, max_size=7, unique=True),
+        st.integers(min_value=1, max_value=4)
+    ),
+    st.builds(
+        lambda days, skip: {"frequency_type": "months", "days": days, "skip_months": skip, "months": None},
+        st.lists(st.integers(min_value=1, max_value=28), min_size=1, max_size=4, unique=True),
+        st.integers(min_value=1, max_value=3)
+    )
+)
+
+
+def first_class(local: datetime.datetime) -> datetime.datetime:
+    return SCHEDULE_TZ.localize(local).astimezone(pytz.utc)
+
+
+def local_dates(schedule: list) -> list:
+    return [start.astimezone(SCHEDULE_TZ).date() for start, _ in schedule]
+
+
+@settings(deadline=None)
+@given(recurring, local_times, st.integers(min_value=1, max_value=150), st.booleans())
+def test_exact_count_in_increasing_order(frequency, local, classes, skip_holidays):
+    schedule = create_schedule(frequency, first_class(local), classes, 60, skip_holidays=skip_holidays)
+
+    assert len(schedule) == classes
+    starts = [start for start, _ in schedule]
+    assert all(earlier < later for earlier, later in zip(starts, starts[1:]))
+    assert all(end - start == datetime.timedelta(minutes=60) for start, end in schedule)
+
+
+@settings(deadline=None)
+@given(recurring, local_times, st.integers(min_value=1, max_value=100), st.data())
+def test_exclusions_and_holidays_are_skipped(frequency, local, classes, data):
+    every_class = local_dates(create_schedule(frequency, first_class(local), classes, 60))
+    exclusions = data.draw(st.lists(st.sampled_from(every_class), unique=True))
+
+    schedule = create_schedule(frequency, first_class(local), classes, 60,
+                               exclusions=exclusions, skip_holidays=True)
+
+    for date in local_dates(schedule or []):
+        assert date not in exclusions
+        assert date not in holidays_in(date.year)
+
+
+@settings(deadline=None)
+@given(recurring, local_times, st.integers(min_value=1, max_value=150))
+def test_wall_clock_time_is_kept_across_dst(frequency, local, classes):
+    for start, _ in create_schedule(frequency, first_class(local), classes, 60):
+        local_start = start.astimezone(SCHEDULE_TZ)
+        assert (local_start.hour, local_start.minute) == (local.hour, local.minute)
+
+
+def test_classes_that_do_not_exist_move_past_the_change():
+    # 2:30am on 2024-03-10 does not exist in new york
+    frequency = {"frequency_type": "days", "classes_per_week": 1}
+    start = first_class(datetime.datetime(2024, 3, 9, 2, 30))
+
+    schedule = create_schedule(frequency, start, 3, 60)
+
+    assert [s.astimezone(SCHEDULE_TZ).strftime("%m-%d %H:%M") for s, _ in schedule] == [
+        "03-09 02:30", "03-10 03:30", "03-11 02:30"
+    ]
+
+
+@settings(deadline=None, max_examples=25)
+@given(st.sampled_from([30, 31]), local_times, st.integers(min_value=2, max_value=1000))
+def test_impossible_rule_terminates(day, local, classes):
+    # february never has a 30th or 31st, only the first class can be produced
+    frequency = {"frequency_type": "months", "days": [day], "skip_months": 1, "months": [2]}
+
+    schedule = create_schedule(frequency, first_class(local), classes, 60)
+
+    assert len(schedule) == 1
+    assert len(list(iter_schedule(frequency, first_class(local), 60))) == 1
@@ -0,0 +1,88 @@
+import asyncio
+import logging
+
+import fakeredis
+import pytest
+
+from src import redis_client
+from src.database.sql import user_functions
+from src.database.sql.user_functions import delete_users
+from tests.postgres import connect, needs_postgres, run
+
+pytestmark = needs_postgres
+
+
+@pytest.fixture
+def users(monkeypatch):
+    monkeypatch.setattr(redis_client, "redis_client", fakeredis.FakeRedis())
+
+    def with_users(test):
+        async def seeded(schema):
+            conn = await connect(schema)
+            try:
+                await conn.execute("""
+                    INSERT INTO users (user_id, first_name, head_shot)
+                    SELECT 'u' || n, 'First' || n, 'u' || n || '.png' FROM generate_series(1, 3) n;
+                    INSERT INTO course_registration (course_id, user_id) SELECT 'c1', 'u' || n FROM generate_series(1, 3) n;
+                    INSERT INTO user_certificates (certificate_number, user_id) VALUES ('cert1', 'u1'), ('cert2', 'u2');
+                    INSERT INTO certificate_expiry_notices VALUES ('cert1', 30, now()), ('cert2', 30, now());
+                """)
+                await test(conn)
+            finally:
+                await conn.close()
+        run(seeded, monkeypatch)
+    return with_users
+
+
+async def remaining(conn, table: str) -> list:
+    return [row[0] for row in await conn.fetch(f"SELECT user_id FROM {table} ORDER BY user_id;")]
+
+
+def test_users_are_deleted_with_everything_that_references_them(users):
+    async def test(conn):
+        failed, err = await delete_users(["u1", "u3", "u1", "missing"])
+
+        assert (failed, err) == ([{"userId": "missing", "reason": "Failed to find user"}], None)
+        assert await remaining(conn, "users") == ["u2"]
+        assert await remaining(conn, "course_registration") == ["u2"]
+        assert await conn.fetchval("SELECT array_agg(certificate_number) FROM certificate_expiry_notices;") == ["cert2"]
+
+    users(test)
+
+
+def test_only_the_user_that_can_not_be_deleted_fails(users):
+    async def test(conn):
+        # something the deletion does not know about still points at u2
+        await conn.execute("""
+            CREATE TABLE payments (user_id TEXT REFERENCES users (user_id));
+            INSERT INTO payments VALUES ('u2');
+        """)
+
+        failed, err = await delete_users(["u1", "u2", "u3"])
+
+        assert (failed, err) == ([{"userId": "u2", "reason": "Failed to delete specific user"}], None)
+        assert await remaining(conn, "users") == ["u2"]
+        # the failed user's transaction was rolled back as a whole
+        assert await remaining(conn, "course_registration") == ["u2"]
+        assert await remaining(conn, "user_certificates") == ["u2"]
+
+    users(test)
+
+
+def test_file_cleanup_errors_are_logged(users, monkeypatch, caplog):
+    def remove_user_files(file_names):
+        raise OSError("read only file system")
+
+    monkeypatch.setattr(user_functions, "remove_user_files", remove_user_files)
+
+    async def test(conn):
+        with caplog.at_level(logging.ERROR):
+            assert await delete_users(["u1"]) == (None, None)
+            for _ in range(100):
+                if "Failed to clean up after deleting users" in caplog.text:
+                    break
+                await asyncio.sleep(0.01)
+
+        assert "read only file system" in caplog.text
+
+    users(test)
@@ -0,0 +1,71 @@
+import fakeredis
+import pytest
+
+from src import redis_client
+from src.database.sql.user_functions import update_user
+from src.modules import digest
+from tests.postgres import connect, needs_postgres, run
+
+pytestmark = needs_postgres
+
+CONTENT = {"subject": "Enrolled", "body": "You are enrolled", "attachments": []}
+
+
+@pytest.fixture
+def users(monkeypatch):
+    monkeypatch.setattr(redis_client, "redis_client", fakeredis.FakeRedis())
+    monkeypatch.setenv("NOTIFICATION_DIGEST_TYPES", "")
+
+    def with_users(test):
+        async def seeded(schema):
+            conn = await connect(schema)
+            try:
+                await conn.execute("""
+                    INSERT INTO users (user_id, first_name, email)
+                    VALUES ('u1', 'First1', 'u1@example.com'), ('u2', 'First2', 'u2@example.com');
+                """)
+                await test(conn)
+            finally:
+                await conn.close()
+        run(seeded, monkeypatch)
+    return with_users
+
+
+def test_preference_survives_a_redis_flush(users):
+    async def test(conn):
+        assert await digest.set_digest_preference("u1", True)
+        assert await digest.queue_digest("u1@example.com", "student_enroll", CONTENT, "First1")
+        assert not await digest.queue_digest("u2@example.com", "student_enroll", CONTENT, "First2")
+
+        redis_client.redis_client.flushall()
+        assert await digest.get_digest_preference("u1")
+        assert await digest.queue_digest("u1@example.com", "student_enroll", CONTENT, "First1")
+
+        assert await digest.set_digest_preference("u1", False)
+        assert not await digest.queue_digest("u1@example.com", "student_enroll", CONTENT, "First1")
+
+    users(test)
+
+
+def test_preference_follows_an_email_change(users):
+    async def test(conn):
+        await digest.set_digest_preference("u1", True)
+        assert await digest.queue_digest("u1@example.com", "student_enroll", CONTENT, "First1")
+
+        assert await update_user("u1", email="new@example.com")
+        assert await digest.get_digest_preference("u1")
+        assert await digest.queue_digest("new@example.com", "student_enroll", CONTENT, "First1")
+        assert not await digest.queue_digest("u1@example.com", "student_enroll", CONTENT, "First1")
+
+    users(test)
+
+
+def test_opt_ins_kept_in_redis_are_moved_to_postgres(users):
+    async def test(conn):
+        redis_client.add_set(digest.LEGACY_DIGEST_USERS_KEY, "u2@example.com")
+
+        assert await digest.queue_digest("u2@example.com", "student_enroll", CONTENT, "First2")
+        assert await conn.fetchval("SELECT digest_notif FROM users WHERE user_id = 'u2';")
+        assert not redis_client.get_set(digest.LEGACY_DIGEST_USERS_KEY)
+
+    users(test)
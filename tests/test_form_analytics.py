@@ -0,0 +1,50 @@
+import pytest
+
+from src.modules import form_analytics
+from tests.test_mongo import MONGO_URI, mongo_available, run
+
+needs_mongo = pytest.mark.skipif(not mongo_available(), reason=f"no mongod reachable at {MONGO_URI}")
+
+
+def submission(correct: bool, score: int) -> dict:
+    return {
+        "formId": "quiz1",
+        "passing": correct,
+        "score": score,
+        "possibleScore": 2,
+        "questions": [{"questionId": "q1", "answer": {"choicePosition": 1}, "correct": correct}]
+    }
+
+
+def test_regrade_only_moves_the_grades():
+    counts = form_analytics.regrade_counts([
+        (submission(False, 0), submission(True, 2)),
+        (submission(True, 2), submission(True, 2))
+    ])
+
+    assert counts == {"passed": 1, "totalScore": 2, "questions.q1.correct": 1}
+
+
+@needs_mongo
+def test_backfill_never_overwrites_recorded_stats(monkeypatch):
+    async def test(client):
+        monkeypatch.setattr(form_analytics, "mongo_client", client)
+        await client.database["quiz_submissions"].insert_many([submission(True, 2), submission(False, 0)])
+
+        assert await form_analytics.backfill_form_stats("quiz1", "quiz")
+        stats = await form_analytics.get_form_stats("quiz1")
+        assert (stats["submissions"], stats["passed"]) == (2, 1)
+
+        # a submission recorded after the backfill is kept by a second one
+        await client.database["quiz_submissions"].insert_one(submission(True, 2))
+        assert await form_analytics.record_submission("quiz1", "quiz", submission(True, 2))
+        await client.database["quiz_submissions"].insert_one(submission(False, 0))
+        assert await form_analytics.backfill_form_stats("quiz1", "quiz")
+        stats = await form_analytics.get_form_stats("quiz1")
+        assert (stats["submissions"], stats["passed"]) == (3, 2)
+
+        assert await form_analytics.record_regrade("quiz1", [(submission(False, 0), submission(True, 2))])
+        stats = await form_analytics.get_form_stats("quiz1")
+        assert (stats["submissions"], stats["passed"], stats["questions"][0]["correct"]) == (3, 3, 3)
+
+    run(test)
@@ -0,0 +1,28 @@
+import asyncio
+
+from src.database.mongo import mongo_functions
+
+QUIZ = {"formId": "quiz1", "formName": "Quiz", "questions": []}
+
+
+def load(monkeypatch, in_postgres: bool):
+    looked_up = []
+
+    async def get_form(form_type, form_id):
+        return {"formId": form_id, "formType": form_type, "active": True} if in_postgres else None
+
+    async def find_one(collection, query, exclude=None):
+        looked_up.append(collection)
+        return dict(QUIZ)
+
+    monkeypatch.setattr(mongo_functions, "get_form", get_form)
+    monkeypatch.setattr(mongo_functions.mongo_client, "find_one", find_one)
+    return asyncio.run(mongo_functions.get_form_from_mongo("quiz", "quiz1")), looked_up
+
+
+def test_form_removed_from_postgres_is_not_served_from_mongo(monkeypatch):
+    assert load(monkeypatch, in_postgres=False) == (None, [])
+
+
+def test_form_in_postgres_is_read_from_its_collection(monkeypatch):
+    assert load(monkeypatch, in_postgres=True) == (QUIZ, ["quiz"])
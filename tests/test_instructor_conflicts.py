@@ -0,0 +1,57 @@
+import datetime
+
+from src.database.sql.course_functions import find_instructor_conflicts
+from tests.postgres import connect, needs_postgres, run
+
+pytestmark = needs_postgres
+
+EST = datetime.timezone(datetime.timedelta(hours=-5))
+
+
+def with_classes(test, monkeypatch):
+    async def seeded(schema):
+        conn = await connect(schema)
+        try:
+            await conn.execute("""
+                INSERT INTO courses (course_id, course_name) VALUES ('c1', 'First'), ('c2', 'Second');
+                INSERT INTO course_instructor (course_id, user_id) VALUES ('c1', 'i1'), ('c2', 'i1');
+                INSERT INTO course_dates (course_id, series_number, start_dtm, end_dtm, is_complete) VALUES
+                    ('c1', 1, '2020-01-01 10:00', '2020-01-01 12:00', true),
+                    ('c1', 2, '2090-01-01 10:00', '2090-01-01 12:00', true),
+                    ('c1', 3, '2090-02-01 08:00', '2090-02-01 09:00', false),
+                    ('c2', 1, '2020-01-01 11:00', '2020-01-01 13:00', false),
+                    ('c2', 2, '2090-01-01 11:00', '2090-01-01 13:00', false),
+                    ('c2', 3, '2090-02-01 15:00', '2090-02-01 16:00', false);
+            """)
+            await test()
+        finally:
+            await conn.close()
+    run(seeded, monkeypatch)
+
+
+def test_classes_that_are_over_or_complete_are_not_double_booked(monkeypatch):
+    async def test():
+        assert await find_instructor_conflicts("c1") == []
+        assert await find_instructor_conflicts("c1", instructor_ids=["i1"]) == []
+
+    with_classes(test, monkeypatch)
+
+
+def test_a_rescheduled_class_is_compared_in_utc(monkeypatch):
+    async def test():
+        # 10:30 eastern is 15:30 utc, in the middle of the other course
+        new_class = {
+            "series_number": 3,
+            "start_dtm": datetime.datetime(2090, 2, 1, 10, 30, tzinfo=EST),
+            "end_dtm": datetime.datetime(2090, 2, 1, 11, 30, tzinfo=EST)
+        }
+        conflicts = await find_instructor_conflicts("c1", new_class=new_class)
+
+        assert [(c["instructorId"], c["seriesNumber"], c["conflictsWith"]["courseId"]) for c in conflicts] == [("i1", 3, "c2")]
+        assert conflicts[0]["startTime"] == "02/01/2090 3:30 PM"
+
+        new_class["start_dtm"] = datetime.datetime(2090, 2, 1, 15, 30, tzinfo=EST)
+        new_class["end_dtm"] = datetime.datetime(2090, 2, 1, 16, 30, tzinfo=EST)
+        assert await find_instructor_conflicts("c1", new_class=new_class) == []
+
+    with_classes(test, monkeypatch)
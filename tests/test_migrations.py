@@ -0,0 +1,149 @@
+import asyncio
+
+import pytest
+
+from src.database.sql import migrations
+from src.database.sql.migrations import MIGRATION_LOCK, check_query_plans, remove_duplicate_registrations, run_migrations
+from tests.postgres import connect, needs_postgres, run
+
+pytestmark = needs_postgres
+
+REGISTRATION_INDEX = "course_registration_course_id_user_id_idx"
+
+
+async def mark_applied(conn, versions: list):
+    await conn.execute("""
+        CREATE TABLE schema_migrations (version INTEGER PRIMARY KEY, name TEXT NOT NULL, applied_dtm TIMESTAMP NOT NULL);
+    """)
+    await conn.executemany(
+        "INSERT INTO schema_migrations (version, name, applied_dtm) VALUES ($1, 'test', now());",
+        [(version,) for version in versions]
+    )
+
+
+async def indexes(conn) -> set:
+    return {row["indexname"] for row in await conn.fetch("SELECT indexname FROM pg_indexes WHERE schemaname = current_schema();")}
+
+
+async def applied(conn) -> list:
+    return [row["version"] for row in await conn.fetch("SELECT version FROM schema_migrations ORDER BY version;")]
+
+
+async def index_exists(conn, name: str) -> bool:
+    return await conn.fetchval("SELECT to_regclass($1) IS NOT NULL;", name)
+
+
+def test_duplicate_registrations_defer_the_unique_index_without_failing(monkeypatch):
+    monkeypatch.setattr(migrations, "MIGRATIONS", migrations.MIGRATIONS + [
+        {"version": 9, "name": "after the registrations", "statements": ["CREATE TABLE later (id INTEGER);"]}
+    ])
+
+    async def test(schema):
+        conn = await connect(schema)
+        try:
+            await mark_applied(conn, [1, 2, 3, 4, 5, 6])
+            await conn.execute("""
+                INSERT INTO course_registration (course_id, user_id, registration_status, user_paid) VALUES
+                    ('c1', 'u1', 'waitlist', false), ('c1', 'u1', 'enrolled', true), ('c1', 'u2', 'enrolled', false);
+            """)
+
+            assert await run_migrations()
+            assert await applied(conn) == [1, 2, 3, 4, 5, 6, 8, 9]
+            assert not await index_exists(conn, REGISTRATION_INDEX)
+
+            duplicates = await remove_duplicate_registrations(apply=True)
+            assert [(d["registrationStatus"], d["kept"]) for d in duplicates] == [("enrolled", True), ("waitlist", False)]
+
+            assert await run_migrations()
+            assert await applied(conn) == [1, 2, 3, 4, 5, 6, 7, 8, 9]
+            assert await index_exists(conn, REGISTRATION_INDEX)
+        finally:
+            await conn.close()
+
+    run(test, monkeypatch)
+
+
+def test_every_migration_applies_once(monkeypatch):
+    async def test(schema):
+        conn = await connect(schema)
+        try:
+            if not await conn.fetchval("SELECT EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm');"):
+                pytest.skip("pg_trgm is not installed on this postgres")
+
+            assert await run_migrations()
+            built = await indexes(conn)
+            assert await applied(conn) == [migration["version"] for migration in migrations.MIGRATIONS]
+
+            # a second deploy has nothing left to do
+            assert await run_migrations()
+            assert await indexes(conn) == built
+        finally:
+            await conn.close()
+
+    run(test, monkeypatch)
+
+
+def test_statements_are_safe_to_run_again(monkeypatch):
+    async def test(schema):
+        conn = await connect(schema)
+        try:
+            # the baseline needs pg_trgm, everything after it only builds indexes on the tables
+            await mark_applied(conn, [1])
+            assert await run_migrations()
+            built = await indexes(conn)
+
+            # like a run that built its indexes and died before recording them
+            await conn.execute("DELETE FROM schema_migrations WHERE version > 1;")
+            assert await run_migrations()
+            assert await indexes(conn) == built
+            assert await applied(conn) == [migration["version"] for migration in migrations.MIGRATIONS]
+        finally:
+            await conn.close()
+
+    run(test, monkeypatch)
+
+
+def test_second_runner_returns_at_once_while_the_lock_is_held(monkeypatch):
+    async def test(schema):
+        holder = await connect(schema)
+        conn = await connect(schema)
+        try:
+            await mark_applied(conn, [1])
+            await holder.execute("SELECT pg_advisory_lock($1);", MIGRATION_LOCK)
+
+            assert not await asyncio.wait_for(run_migrations(), timeout=5)
+            assert await applied(conn) == [1]
+
+            await holder.execute("SELECT pg_advisory_unlock($1);", MIGRATION_LOCK)
+            assert await run_migrations()
+            assert await applied(conn) == [migration["version"] for migration in migrations.MIGRATIONS]
+        finally:
+            await holder.close()
+            await conn.close()
+
+    run(test, monkeypatch)
+
+
+def test_plan_check_fails_on_a_sequential_scan_of_a_large_table(monkeypatch):
+    monkeypatch.setattr(migrations, "HOT_QUERIES", [
+        {"name": "user by email", "query": "SELECT user_id FROM users WHERE email = $1;", "args": [""]},
+        {"name": "user by first name", "query": "SELECT user_id FROM users WHERE first_name = $1;", "args": [""]}
+    ])
+
+    async def test(schema):
+        conn = await connect(schema)
+        try:
+            await conn.execute("""
+                INSERT INTO users (user_id, first_name, email)
+                SELECT 'u' || n, 'First' || n, 'u' || n || '@example.com' FROM generate_series(1, 20000) n;
+                CREATE INDEX users_email_idx ON users (email);
+                ANALYZE users;
+            """)
+
+            assert await check_query_plans(min_rows=10000) == [{"name": "user by first name", "tables": ["users"]}]
+            # small tables are left to the planner
+            assert await check_query_plans(min_rows=50000) == []
+        finally:
+            await conn.close()
+
+    run(test, monkeypatch)
@@ -0,0 +1,120 @@
+import asyncio
+import logging
+import os
+import uuid
+
+import pymongo
+import pytest
+
+from src.database.mongo import MONGO_INDEXES
+from src.database.mongo.mongo import MongoConnect
+
+MONGO_URI = os.getenv("MONGO_CONNECTION_URI")
+
+
+def mongo_available() -> bool:
+    try:
+        pymongo.MongoClient(MONGO_URI, serverSelectionTimeoutMS=500).admin.command("ping")
+        return True
+    except Exception:
+        return False
+
+
+pytestmark = pytest.mark.skipif(not mongo_available(), reason=f"no mongod reachable at {MONGO_URI}")
+
+
+def run(test):
+    """Runs a test against a throwaway database that is dropped afterwards"""
+    async def with_database():
+        database = f"test_{uuid.uuid4().hex}"
+        client = MongoConnect(log=logging.getLogger("test"), database=database)
+        try:
+            await test(client)
+        finally:
+            await client.client.drop_database(database)
+            client.close()
+    asyncio.run(with_database())
+
+
+def index_keys(info: dict) -> dict:
+    return {name: (list(index["key"]), bool(index.get("unique"))) for name, index in info.items()}
+
+
+def test_startup_creates_every_index():
+    async def test(client):
+        assert await client.ensure_indexes(MONGO_INDEXES)
+        # running again on every startup must leave the same indexes
+        assert await client.ensure_indexes(MONGO_INDEXES)
+
+        for collection, models in MONGO_INDEXES.items():
+            info = await client.database[collection].index_information()
+            expected = {
+                model.document["name"]: (list(model.document["key"].items()), bool(model.document.get("unique")))
+                for model in models
+            }
+            expected["_id_"] = ([("_id", 1)], False)
+            assert index_keys(info) == expected
+
+    run(test)
+
+
+def test_duplicate_id_is_only_an_earlier_try():
+    async def test(client):
+        await client.ensure_indexes(MONGO_INDEXES)
+        quiz = client.database["quiz"]
+        await quiz.insert_one({"_id": 1, "formId": "a"})
+
+        with pytest.raises(pymongo.errors.DuplicateKeyError) as same_id:
+            await quiz.insert_one({"_id": 1, "formId": "b"})
+        with pytest.raises(pymongo.errors.DuplicateKeyError) as same_form:
+            await quiz.insert_one({"_id": 2, "formId": "a"})
+
+        assert client.duplicate_id(same_id.value.details)
+        assert not client.duplicate_id(same_form.value.details)
+
+    run(test)
+
+
+def test_insert_fails_on_a_unique_index():
+    async def test(client):
+        await client.ensure_indexes(MONGO_INDEXES)
+
+        assert await client.insert("quiz", {"formId": "a"})
+        assert not await client.insert("quiz", {"formId": "a"})
+        assert await client.database["quiz"].count_documents({}) == 1
+
+    run(test)
+
+
+def test_insert_bulk_fails_on_a_unique_index_and_keeps_the_rest():
+    async def test(client):
+        await client.ensure_indexes(MONGO_INDEXES)
+        await client.insert("quiz_submissions", {"responseId": "taken", "formId": "a", "userId": "u"})
+
+        submissions = [
+            {"responseId": f"r{idx}", "formId": "a", "userId": "u"} for idx in range(5)
+        ] + [{"responseId": "taken", "formId": "a", "userId": "u"}]
+
+        assert not await client.insert_bulk("quiz_submissions", submissions)
+        assert await client.database["quiz_submissions"].count_documents({}) == 6
+
+    run(test)
+
+
+def test_bulk_write_errors_tell_retries_from_conflicts():
+    async def test(client):
+        await client.ensure_indexes(MONGO_INDEXES)
+        submissions = client.database["quiz_submissions"]
+        await submissions.insert_one({"_id": 1, "responseId": "a"})
+
+        with pytest.raises(pymongo.errors.BulkWriteError) as failed:
+            await submissions.bulk_write([
+                pymongo.InsertOne({"_id": 1, "responseId": "b"}),
+                pymongo.InsertOne({"_id": 2, "responseId": "a"})
+            ], ordered=False)
+
+        errors = {error["index"]: error for error in failed.value.details["writeErrors"]}
+        assert client.duplicate_id(errors[0])
+        assert not client.duplicate_id(errors[1])
+
+    run(test)
@@ -0,0 +1,72 @@
+import asyncio
+import logging
+
+import fakeredis
+import pytest
+from fastapi import Request
+from uvicorn.middleware.proxy_headers import ProxyHeadersMiddleware
+
+from src import redis_client
+from src.utils import rate_limit
+from src.utils.rate_limit import client_address, is_rate_limited
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    fake = fakeredis.FakeRedis()
+    monkeypatch.setattr(redis_client, "redis_client", fake)
+    monkeypatch.setattr(rate_limit.time, "time", lambda: 1200.5)
+    return fake
+
+
+def test_requests_over_the_limit_are_limited(redis):
+    assert [is_rate_limited("verify", "203.0.113.7", 2) for _ in range(3)] == [False, False, True]
+    # every client has a limit of its own
+    assert not is_rate_limited("verify", "203.0.113.8", 2)
+
+
+def test_window_is_keyed_by_its_start_and_expires_with_it(redis, monkeypatch):
+    is_rate_limited("verify", "203.0.113.7", 2, window=60)
+
+    assert redis.keys() == [b"rate_verify_203.0.113.7_20"]
+    assert 0 < redis.ttl("rate_verify_203.0.113.7_20") <= 60
+
+    # the next window starts counting again
+    is_rate_limited("verify", "203.0.113.7", 2, window=60)
+    is_rate_limited("verify", "203.0.113.7", 2, window=60)
+    monkeypatch.setattr(rate_limit.time, "time", lambda: 1260.0)
+    assert not is_rate_limited("verify", "203.0.113.7", 2, window=60)
+    assert int(redis.get("rate_verify_203.0.113.7_21")) == 1
+
+
+def test_limit_is_not_enforced_while_redis_is_down(monkeypatch, caplog):
+    server = fakeredis.FakeServer()
+    server.connected = False
+    monkeypatch.setattr(redis_client, "redis_client", fakeredis.FakeRedis(server=server))
+
+    with caplog.at_level(logging.ERROR):
+        assert not is_rate_limited("verify", "203.0.113.7", 0)
+    assert "Failed to check rate limit verify for 203.0.113.7" in caplog.text
+
+
+def client_seen_through(trusted: str) -> str:
+    """Runs a request from a proxy at 10.0.0.2 the way uvicorn --proxy-headers --forwarded-allow-ips hands it on"""
+    seen = []
+
+    async def app(scope, receive, send):
+        seen.append(client_address(Request(scope)))
+
+    scope = {
+        "type": "http", "scheme": "http", "method": "GET", "path": "/", "query_string": b"",
+        "headers": [(b"x-forwarded-for", b"203.0.113.7")], "client": ("10.0.0.2", 50000)
+    }
+    asyncio.run(ProxyHeadersMiddleware(app, trusted_hosts=trusted)(scope, None, None))
+    return seen[0]
+
+
+def test_client_behind_a_trusted_proxy_is_seen_by_its_own_address():
+    assert client_seen_through("10.0.0.2") == "203.0.113.7"
+
+
+def test_forwarded_address_from_an_untrusted_peer_is_ignored():
+    assert client_seen_through("127.0.0.1") == "10.0.0.2"
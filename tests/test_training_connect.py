@@ -0,0 +1,379 @@
+import asyncio
+import os
+import shutil
+import signal
+import time
+
+import pytest
+
+from src.modules import training_connect
+from src.modules.training_connect import TrainingConnect
+from tests.training_connect_mock import TrainingConnectMock
+
+CHROME = os.getenv("TRAINING_CONNECT_CHROME") or next(
+    (path for path in map(shutil.which, ["google-chrome-stable", "google-chrome", "chromium", "chromium-browser"]) if path),
+    None
+)
+needs_chrome = pytest.mark.skipif(not CHROME or not os.path.exists(CHROME), reason="no chrome to drive the mock with")
+
+STUDENTS = [
+    {"id": str(idx), "first_name": f"Student{idx}", "last_name": "Tester", "phone": f"(212) 555-010{idx}",
+     "email": f"student{idx}@example.com", "dob": "01/02/1990"}
+    for idx in range(3)
+]
+COURSE = "OSHA 30 Hour Construction"
+
+
+def certificate_row(student: dict, position: int = 1, rows: int = 1) -> dict:
+    return {
+        "upload_info": {"upload_type": "certificate", "position": position, "max": rows, "upload_id": "upload"},
+        "first_name": student["first_name"],
+        "last_name": student["last_name"],
+        "phone_number": student["phone"],
+        "email": student["email"],
+        "date_of_birth": "1990-01-02 00:00:00",
+        "issue_date": "2024-01-01 00:00:00",
+        "expiry_date": "2029-01-01 00:00:00",
+        "course_name": COURSE,
+        "instructor": "Instructor Name",
+        "certificate_id": f"CERT{student['id']}"
+    }
+
+
+class FakePage:
+    def __init__(self, browser):
+        self.browser = browser
+
+    async def close(self):
+        pass
+
+
+class FakeBrowser:
+    """Stands in for chrome in tests of how pages and relaunches are shared between rows"""
+
+    def __init__(self, launches: list):
+        self.closed = False
+        self.dead = False
+        launches.append(self)
+
+    async def newPage(self):
+        # give other rows a chance to run in between, like the real devtools round trip
+        await asyncio.sleep(0)
+        if self.dead or self.closed:
+            raise ConnectionError("browser is gone")
+        return FakePage(self)
+
+    async def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def fake_chrome(monkeypatch):
+    launches = []
+    logins = []
+
+    async def launch(**kwargs):
+        return FakeBrowser(launches)
+
+    async def login(self, page):
+        logins.append(page)
+        self.logged_in = True
+
+    monkeypatch.setattr(training_connect, "launch", launch)
+    monkeypatch.setattr(TrainingConnect, "login", login)
+    return launches, logins
+
+
+def test_rows_share_one_browser(fake_chrome):
+    launches, _ = fake_chrome
+
+    async def test():
+        worker = TrainingConnect(parallelism=5)
+        pages = await asyncio.gather(*[worker.get_page() for _ in range(5)])
+        assert all(page.browser is launches[0] for page in pages)
+        assert len(launches) == 1
+
+    asyncio.run(test())
+
+
+def test_relogin_stays_on_the_failing_rows_page(fake_chrome):
+    launches, logins = fake_chrome
+
+    async def test():
+        worker = TrainingConnect()
+        other_row = await worker.get_page()
+        retried_row = await worker.get_page(relogin=True)
+
+        assert logins[-1] is retried_row
+        assert len(launches) == 1
+        assert not other_row.browser.closed
+
+    asyncio.run(test())
+
+
+def test_dead_browser_is_relaunched_once(fake_chrome):
+    launches, _ = fake_chrome
+
+    async def test():
+        worker = TrainingConnect(parallelism=5)
+        await worker.get_page()
+        launches[0].dead = True
+
+        pages = await asyncio.gather(*[worker.get_page() for _ in range(5)])
+
+        assert len(launches) == 2
+        assert worker.browser_generation == 2
+        assert all(page.browser is launches[1] for page in pages)
+
+    asyncio.run(test())
+
+
+@pytest.fixture
+def mock_site(monkeypatch):
+    with TrainingConnectMock(students=STUDENTS, courses=[COURSE]) as site:
+        async def certificate(**kwargs):
+            return b"certificate"
+
+        monkeypatch.setattr(training_connect, "TRAINING_CONNECT_URL", site.url)
+        monkeypatch.setattr(training_connect, "CHROME_PATH", CHROME)
+        monkeypatch.setattr(training_connect, "generate_certificate_func", certificate)
+        monkeypatch.setattr(training_connect, "training_connect_failure_notification", lambda **kwargs: None)
+        monkeypatch.setenv("TRAINING_CONNECT_EMAIL", site.username)
+        monkeypatch.setenv("TRAINING_CONNECT_PASSWORD", site.password)
+        yield site
+
+
+async def wait_for_certificates(site: TrainingConnectMock, amount: int, timeout: float = 10):
+    deadline = time.monotonic() + timeout
+    while len(site.certificates) < amount and time.monotonic() < deadline:
+        await asyncio.sleep(0.1)
+
+
+@needs_chrome
+def test_certificate_is_added_to_the_matched_student(mock_site):
+    async def test():
+        worker = TrainingConnect()
+        try:
+            row = await worker.run_queue_item(certificate_row(STUDENTS[0]))
+            await wait_for_certificates(mock_site, 1)
+        finally:
+            await worker.close_browser()
+
+        assert row.users == [{"user": certificate_row(STUDENTS[0]), "failed": False}]
+        assert len(mock_site.certificates) == 1
+        certificate = mock_site.certificates[0]
+        assert certificate["studentId"] == "0"
+        assert certificate["course"] == COURSE
+        assert certificate["certificateNumber"] == "CERT0"
+        assert certificate["issuedDate"] == "2024-01-01"
+        assert certificate["expirationDate"] == "2029-01-01"
+        assert certificate["file"] == b"certificate"
+
+    asyncio.run(test())
+
+
+@needs_chrome
+def test_expired_session_does_not_relaunch_chrome_under_other_rows(mock_site):
+    async def test():
+        worker = TrainingConnect(parallelism=len(STUDENTS))
+        try:
+            await worker.get_page()
+            mock_site.expire_sessions()
+
+            rows = await asyncio.gather(*[
+                worker.run_queue_item(certificate_row(student, idx + 1, len(STUDENTS)))
+                for idx, student in enumerate(STUDENTS)
+            ])
+            await wait_for_certificates(mock_site, len(STUDENTS))
+        finally:
+            await worker.close_browser()
+
+        assert worker.browser_generation == 1
+        assert all(not user["failed"] for row in rows for user in row.users)
+        assert sorted(c["studentId"] for c in mock_site.certificates) == ["0", "1", "2"]
+
+    asyncio.run(test())
+
+
+def test_sigterm_runs_the_cleanup(monkeypatch):
+    stopped = []
+
+    async def start_system(self):
+        os.kill(os.getpid(), signal.SIGTERM)
+        await asyncio.sleep(10)
+
+    async def shutdown(self):
+        stopped.append(self)
+
+    monkeypatch.setattr(TrainingConnect, "start_system", start_system)
+    monkeypatch.setattr(TrainingConnect, "shutdown", shutdown)
+
+    asyncio.run(asyncio.wait_for(training_connect.main(), timeout=5))
+
+    assert len(stopped) == 1
+
+
+@pytest.fixture
+def stream_worker(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    monkeypatch.setattr(training_connect, "CLAIM_IDLE", 300)
+
+    async def start():
+        worker = TrainingConnect()
+        worker.redis = fakeredis.FakeAsyncRedis()
+        await worker.create_group()
+        return worker
+    return start
+
+
+def test_running_row_is_not_claimed_by_another_worker(stream_worker):
+    async def test():
+        worker = await stream_worker()
+        entry_id = await worker.redis.xadd(training_connect.TRAINING_CONNECT_STREAM, {"row": "{}"})
+        await worker.redis.xreadgroup(
+            training_connect.TRAINING_CONNECT_GROUP, worker.consumer, {training_connect.TRAINING_CONNECT_STREAM: ">"})
+
+        claim = asyncio.create_task(worker.keep_claim(entry_id))
+        try:
+            for _ in range(5):
+                await asyncio.sleep(0.2)
+                other = TrainingConnect()
+                other.redis, other.consumer = worker.redis, "other"
+                assert await other.claim_stale(10) == []
+        finally:
+            claim.cancel()
+
+        # once the row is no longer being worked on it can be taken over
+        await asyncio.sleep(0.4)
+        assert [entry for entry, _ in await other.claim_stale(10)] == [entry_id]
+
+    asyncio.run(test())
+
+
+def test_row_that_ran_twice_is_counted_once(stream_worker, monkeypatch):
+    notified = []
+
+    async def notify_upload(self, upload_id):
+        notified.append(upload_id)
+
+    monkeypatch.setattr(TrainingConnect, "notify_upload", notify_upload)
+
+    async def test():
+        worker = await stream_worker()
+        rows = [certificate_row(student, idx + 1, 2) for idx, student in enumerate(STUDENTS[:2])]
+        await worker.redis.hset(training_connect.upload_key("upload"), mapping={"max": 2, "done": 0})
+
+        row = training_connect.TrainingConnectRow(page=None, cuid_generator=worker.cuid_generator)
+        await worker.record_result(row, rows[0], b"1-0")
+        await worker.record_result(row, rows[0], b"1-0")
+        assert notified == []
+
+        await worker.record_result(row, rows[1], b"1-1")
+        assert notified == ["upload"]
+
+    asyncio.run(test())
+
+
+def profile(student: dict) -> list:
+    # field values of a profile page like the mock's details page
+    return [student["first_name"], "", student["last_name"], "", "", student["phone"], student["email"], student["dob"]]
+
+
+def test_match_key_ignores_case_and_spacing_but_needs_more_than_a_name():
+    row = certificate_row(STUDENTS[0])
+    same = dict(row, first_name=f"  {row['first_name'].upper()} ", date_of_birth="01/02/1990")
+
+    assert training_connect.MatchCache.key(row) == training_connect.MatchCache.key(same)
+    assert training_connect.MatchCache.key(row) != training_connect.MatchCache.key(certificate_row(STUDENTS[1]))
+    assert training_connect.MatchCache.key(dict(row, date_of_birth=None)) is None
+    assert training_connect.MatchCache.key(dict(row, date_of_birth=None, osha_id="123")) is not None
+
+
+def test_cached_profile_must_still_belong_to_the_student():
+    row = certificate_row(STUDENTS[0])
+
+    assert training_connect.profile_matches(row, profile(STUDENTS[0]))
+    assert not training_connect.profile_matches(row, profile(STUDENTS[1]))
+    # same name but nothing else in common is someone else
+    assert not training_connect.profile_matches(row, profile(dict(STUDENTS[1], first_name="Student0", dob="03/04/1985")))
+    assert training_connect.profile_matches(dict(row, email=None, phone_number=None), profile(STUDENTS[0]))
+    assert not training_connect.profile_matches(row, [])
+
+
+@pytest.fixture
+def cached_row(stream_worker):
+    """Row with a cached profile url for the first student, the profile page shows the given student"""
+    async def start(shown: dict, upload_failure: str = None):
+        worker = await stream_worker()
+        cache = training_connect.MatchCache(worker.redis)
+        row = training_connect.TrainingConnectRow(page=None, cuid_generator=worker.cuid_generator, match_cache=cache)
+        row.match_key = cache.key(certificate_row(STUDENTS[0]))
+        await cache.set(row.match_key, "http://tc/Students/Details/1")
+        row.uploads = []
+
+        async def profile_fields(url):
+            return profile(shown)
+
+        async def update_user(user, url, upload_type):
+            row.uploads.append(url)
+            row.users.append({"user": user, "failed": bool(upload_failure), "reason": upload_failure})
+
+        row.profile_fields = profile_fields
+        row.update_user = update_user
+        return row, cache
+    return start
+
+
+def test_cached_profile_of_someone_else_is_forgotten_before_uploading(cached_row):
+    async def test():
+        row, cache = await cached_row(STUDENTS[1])
+
+        assert not await row.use_cached_match(certificate_row(STUDENTS[0]), "http://tc/Students/Details/1", "certificate")
+        assert row.uploads == [] and row.users == []
+        assert await cache.get(row.match_key) is None
+
+    asyncio.run(test())
+
+
+def test_cached_profile_is_used_and_kept(cached_row):
+    async def test():
+        row, cache = await cached_row(STUDENTS[0])
+
+        assert await row.use_cached_match(certificate_row(STUDENTS[0]), "http://tc/Students/Details/1", "certificate")
+        assert row.uploads == ["http://tc/Students/Details/1"]
+        assert await cache.get(row.match_key) == "http://tc/Students/Details/1"
+
+    asyncio.run(test())
+
+
+def test_any_failed_upload_forgets_the_cached_profile(cached_row):
+    async def test():
+        row, cache = await cached_row(STUDENTS[0], upload_failure="Tried to add certificate for an incorrect course name.")
+
+        assert await row.use_cached_match(certificate_row(STUDENTS[0]), "http://tc/Students/Details/1", "certificate")
+        # the failure is reported once, the row is not uploaded a second time
+        assert row.uploads == ["http://tc/Students/Details/1"]
+        assert [user["failed"] for user in row.users] == [True]
+        assert await cache.get(row.match_key) is None
+
+    asyncio.run(test())
+
+
+@needs_chrome
+def test_cached_profile_of_another_student_is_not_uploaded_to(mock_site, stream_worker):
+    async def test():
+        worker = await stream_worker()
+        worker.match_cache = training_connect.MatchCache(worker.redis)
+        row = certificate_row(STUDENTS[0])
+        await worker.match_cache.set(worker.match_cache.key(row), f"{mock_site.url}/Students/Details/1")
+        try:
+            await worker.run_queue_item(row)
+            await wait_for_certificates(mock_site, 1)
+        finally:
+            await worker.close_browser()
+
+        assert [c["studentId"] for c in mock_site.certificates] == ["0"]
+        assert await worker.match_cache.get(worker.match_cache.key(row)) == f"{mock_site.url}/Students/Details/0"
+
+    asyncio.run(test())
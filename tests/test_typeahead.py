@@ -0,0 +1,66 @@
+import fakeredis
+import pytest
+
+from src import redis_client
+from src.modules import typeahead
+from tests.postgres import connect, needs_postgres, run
+
+
+@pytest.fixture(autouse=True)
+def fake_redis(monkeypatch):
+    monkeypatch.setattr(redis_client, "redis_client", fakeredis.FakeRedis())
+
+
+def test_terms_are_every_run_of_words_to_the_end():
+    assert typeahead.index_terms(["Jane  O'Neil-Smith", "JS-101"]) == {"jane o neil-smith", "o neil-smith", "neil-smith", "js-101"}
+    assert typeahead.index_terms(["", None]) == set()
+
+
+def test_suggest_only_matches_the_prefix():
+    typeahead.index_entity("course", "c1", "First Aid", ["First Aid"])
+    typeahead.index_entity("course", "c2", "Firearms", ["Firearms"])
+    typeahead.index_entity("course", "c3", "Fire", ["Fire"])
+    typeahead.index_entity("course", "c4", "Fir", ["Fir"])
+
+    assert [s["id"] for s in typeahead.suggest("fire", ["course"])] == ["c3", "c2"]
+    assert [s["id"] for s in typeahead.suggest("FIRST", ["course"])] == ["c1"]
+    assert typeahead.suggest("aid", ["course"]) == [{"type": "course", "id": "c1", "label": "First Aid"}]
+    assert typeahead.suggest("firez", ["course"]) == []
+    assert typeahead.suggest("  ", ["course"]) == []
+
+
+def test_suggest_lists_an_entity_once_and_stops_at_the_limit():
+    typeahead.index_entity("user", "u1", "Sam Sampson", ["Sam Sampson", "sam@example.com"])
+    for idx in range(2, 6):
+        typeahead.index_entity("user", f"u{idx}", f"Sam {idx}", [f"Sam {idx}"])
+
+    suggestions = typeahead.suggest("sam", ["user"])
+    assert sorted(s["id"] for s in suggestions) == ["u1", "u2", "u3", "u4", "u5"]
+    assert len(typeahead.suggest("sam", ["user"], limit=2)) == 2
+
+    typeahead.forget_entity("user", "u1")
+    assert "u1" not in [s["id"] for s in typeahead.suggest("sam", ["user"])]
+
+
+@needs_postgres
+def test_forced_rebuild_drops_entities_deleted_from_postgres(monkeypatch):
+    async def test(schema):
+        conn = await connect(schema)
+        try:
+            await conn.execute("""
+                INSERT INTO courses (course_id, course_name, course_code) VALUES ('c1', 'First Aid', 'FA-1'), ('c2', 'Fire Safety', NULL);
+            """)
+            assert await typeahead.rebuild_typeahead()
+            assert not await typeahead.rebuild_typeahead()
+
+            # deleted without the index hearing about it
+            await conn.execute("DELETE FROM courses WHERE course_id = 'c2';")
+            assert await typeahead.rebuild_typeahead(force=True)
+
+            assert [s["id"] for s in typeahead.suggest("fi", ["course"])] == ["c1"]
+            assert [s["id"] for s in typeahead.suggest("fa-1", ["course"])] == ["c1"]
+            assert not redis_client.redis_client.exists(typeahead.members_key("course", "c2"))
+        finally:
+            await conn.close()
+
+    run(test, monkeypatch)
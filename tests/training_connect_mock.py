@@ -0,0 +1,291 @@
+"""Local copy of the Training Connect pages the upload worker uses, with just enough markup and
+script for its selectors, run with TRAINING_CONNECT_URL pointed at it
+"""
+import html
+import threading
+import uuid
+from email.parser import BytesParser
+from email.policy import default
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+LOGIN_ALERT = '<div class="alert alert-success alert-dismissible fade show">You are logged in</div>'
+LOOKUP_FIELDS = {"StudentName": "name", "CardId": "sstid", "OshaId": "osha_id"}
+
+# selectize shows its dropdown while the typed text matches an option and keeps enter from submitting
+SELECTIZE = """
+<script>
+function selectize(id, options) {
+    const input = document.getElementById(id + "-selectized");
+    const dropdown = document.getElementById(id + "-dropdown");
+    input.addEventListener("input", () => {
+        const match = options.find(option => input.value && option.toLowerCase().startsWith(input.value.toLowerCase()));
+        dropdown.style.display = match ? "block" : "none";
+        document.getElementById(id).value = match || "";
+    });
+    input.addEventListener("keydown", event => {
+        if (event.key === "Enter") {
+            event.preventDefault();
+            dropdown.style.display = "none";
+        }
+    });
+}
+</script>
+"""
+
+
+def page(body: str) -> str:
+    return f"<!DOCTYPE html><html><head><title>Training Connect</title></head><body>{body}</body></html>"
+
+
+def selectize_field(field: str, options: list) -> str:
+    return f"""
+        <input id="{field}-selectized" type="text" autocomplete="off">
+        <input id="{field}" name="{field}" type="hidden">
+        <div id="{field}-dropdown" class="selectize-dropdown single searchable" style="display: none"></div>
+        <script>selectize("{field}", {list(options)!r});</script>
+    """
+
+
+class TrainingConnectMock:
+    """Serves the pages on a free local port and records what the worker submits
+
+    Args:
+        students (list): students on the site, dicts with id, first_name, last_name, phone, email, dob (mm/dd/YYYY),
+            and optionally sstid and osha_id
+        courses (list): names of the courses certificates can be added for
+    """
+
+    def __init__(self, students: list, courses: list, username: str = "provider", password: str = "secret"):
+        self.students = {student["id"]: student for student in students}
+        self.courses = courses
+        self.username = username
+        self.password = password
+        self.sessions = set()
+        self.logins = 0
+        self.certificates = []
+        self.created = []
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self.handler())
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def expire_sessions(self):
+        with self.lock:
+            self.sessions.clear()
+
+    def handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def respond(self, body: str, status: int = 200, headers: dict = None):
+                content = page(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(content)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(content)
+
+            def redirect(self, location: str, headers: dict = None):
+                self.send_response(302)
+                self.send_header("Location", location)
+                self.send_header("Content-Length", "0")
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+
+            def logged_in(self) -> bool:
+                cookies = dict(
+                    cookie.strip().split("=", 1)
+                    for cookie in (self.headers.get("Cookie") or "").split(";") if "=" in cookie
+                )
+                with mock.lock:
+                    return cookies.get("session") in mock.sessions
+
+            def form(self) -> dict:
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                content_type = self.headers.get("Content-Type") or ""
+                if content_type.startswith("multipart/form-data"):
+                    message = BytesParser(policy=default).parsebytes(
+                        f"Content-Type: {content_type}\r\n\r\n".encode() + body)
+                    return {
+                        part.get_param("name", header="content-disposition"): (
+                            part.get_payload(decode=True) if part.get_filename() else part.get_content()
+                        )
+                        for part in message.iter_parts()
+                    }
+                return {key: values[0] for key, values in parse_qs(body.decode()).items()}
+
+            def do_GET(self):
+                self.route("GET")
+
+            def do_POST(self):
+                self.route("POST")
+
+            def route(self, method: str):
+                url = urlparse(self.path)
+                parts = [part for part in url.path.split("/") if part]
+                query = {key: values[0] for key, values in parse_qs(url.query).items()}
+
+                if url.path == "/Saml/InitiateSingleSignOn":
+                    return self.login_page()
+                if url.path == "/Saml/Login" and method == "POST":
+                    return self.login(self.form())
+
+                # like the real site every other page sends a logged out browser to sign in
+                if not self.logged_in():
+                    return self.redirect("/Saml/InitiateSingleSignOn")
+
+                if parts[:2] == ["CourseProviders", "StudentLookup"]:
+                    return self.lookup(query.get("type", "StudentName"), self.form() if method == "POST" else None)
+                if parts[:2] == ["Students", "Details"]:
+                    return self.details(parts[2])
+                if parts[:2] == ["Students", "AddCertificate"]:
+                    return self.add_certificate(parts[2], self.form() if method == "POST" else None)
+                if parts[:2] == ["Students", "Create"]:
+                    return self.create(self.form() if method == "POST" else None)
+                self.respond("<h1>Not found</h1>", status=404)
+
+            def login_page(self):
+                if self.logged_in():
+                    return self.respond(LOGIN_ALERT)
+                self.respond("""
+                    <form method="post" action="/Saml/Login">
+                        <input name="username" type="text">
+                        <input name="password" type="password">
+                        <input type="submit" value="Sign in">
+                    </form>
+                """)
+
+            def login(self, form: dict):
+                if form.get("username") != mock.username or form.get("password") != mock.password:
+                    return self.respond('<div class="alert alert-danger">Invalid login</div>', status=401)
+
+                session = uuid.uuid4().hex
+                with mock.lock:
+                    mock.sessions.add(session)
+                    mock.logins += 1
+                self.redirect("/Saml/InitiateSingleSignOn", headers={"Set-Cookie": f"session={session}; Path=/"})
+
+            def lookup(self, lookup_type: str, form: dict = None):
+                field = LOOKUP_FIELDS[lookup_type]
+                results = ""
+                if form is not None:
+                    value = (form.get(lookup_type) or "").strip().lower()
+                    for student in mock.students.values():
+                        found = f"{student['first_name']} {student['last_name']}" if field == "name" else student.get(field)
+                        if value and str(found or "").lower() == value:
+                            results += f'<a role="button" class="btn" href="/Students/Details/{student["id"]}">View</a>'
+                self.respond(f"""
+                    <form method="post">
+                        <input id="{lookup_type}" name="{lookup_type}" type="text">
+                        <input type="submit" value="Search">
+                    </form>
+                    {results}
+                """)
+
+            def details(self, student_id: str):
+                student = mock.students.get(student_id)
+                if not student:
+                    return self.respond("<h1>Not found</h1>", status=404)
+
+                # phone, email and birth date are the 6th, 7th and 8th fields like on the real profile
+                values = [
+                    student["first_name"], "", student["last_name"], "", "",
+                    student["phone"], student["email"], student["dob"]
+                ]
+                fields = "".join(f'<span class="sc-field-value"> {html.escape(value)} </span>' for value in values)
+                self.respond(f"""
+                    {fields}
+                    <a class="btn btn-primary" href="/Students/AddCertificate/{student_id}">Add Certificate</a>
+                """)
+
+            def add_certificate(self, student_id: str, form: dict = None):
+                if form is not None:
+                    with mock.lock:
+                        mock.certificates.append({
+                            "studentId": student_id,
+                            "course": form.get("CourseId"),
+                            "certificateNumber": form.get("CertificateNumber"),
+                            "issuedDate": form.get("IssuedDate"),
+                            "expirationDate": form.get("ExpirationDate"),
+                            "trainer": form.get("TrainerName"),
+                            "file": form.get("File")
+                        })
+                    return self.redirect(f"/Students/Details/{student_id}")
+
+                self.respond(f"""
+                    {SELECTIZE}
+                    <form method="post" enctype="multipart/form-data">
+                        {selectize_field("CourseId", mock.courses)}
+                        <input id="CertificateNumber" name="CertificateNumber" type="text">
+                        <input id="IssuedDate" name="IssuedDate" type="date">
+                        <input id="ExpirationDate" name="ExpirationDate" type="date">
+                        <input id="TrainerName" name="TrainerName" type="text">
+                        <input name="File" type="file">
+                        <input type="submit" value="Save">
+                    </form>
+                """)
+
+            def create(self, form: dict = None):
+                if form is not None:
+                    missing = [field for field in ("FirstName", "LastName", "DateOfBirth", "State") if not form.get(field)]
+                    if missing:
+                        errors = "".join(f'<span class="text-danger field-validation-error">{field} is required</span>' for field in missing)
+                        return self.respond(f'<div class="col-auto">{errors}</div>')
+
+                    with mock.lock:
+                        mock.created.append({key: value for key, value in form.items() if key != "Photo"})
+                    return self.respond('<div class="col-auto">Student created</div>')
+
+                options = {
+                    "Height": ["5' 10\"", "6' 0\""],
+                    "Gender": ["Male", "Female"],
+                    "EyeColor": ["Brown", "Blue"]
+                }
+                selects = "".join(
+                    f'<select id="{field}" name="{field}">'
+                    + "".join(f'<option value="{idx}">{html.escape(option)}</option>' for idx, option in enumerate(values))
+                    + "</select>"
+                    for field, values in options.items()
+                )
+                self.respond(f"""
+                    {SELECTIZE}
+                    <form method="post" enctype="multipart/form-data">
+                        <div class="col-auto">
+                            <input id="FirstName" name="FirstName" type="text">
+                            <input id="MiddleName" name="MiddleName" type="text">
+                            <input id="LastName" name="LastName" type="text">
+                            <input id="Suffix" name="Suffix" type="text">
+                            <input id="DateOfBirth" name="DateOfBirth" type="date">
+                            <input name="Photo" type="file">
+                            <input id="AddressNumber" name="AddressNumber" type="text">
+                            <input id="AddressName" name="AddressName" type="text">
+                            <input id="City" name="City" type="text">
+                            {selectize_field("State", ["New York", "New Jersey"])}
+                            <input id="ZipCode" name="ZipCode" type="text">
+                            <input id="Email" name="Email" type="text">
+                            <input id="Phone" name="Phone" type="text">
+                            {selects}
+                            <input type="submit" value="Create">
+                        </div>
+                    </form>
+                """)
+
+        return Handler